@@ -0,0 +1,43 @@
+import xml4h
+
+
+def build_deep_document(adapter_class, depth, root_name='DeepRoot',
+        name='Deep', leaf_text=None):
+    """
+    Return an xml4h document with elements nested to the given depth below
+    the root, built with the underlying library's own methods since parsers
+    may limit nesting depth and adapter methods are too slow at this depth.
+    """
+    if adapter_class == xml4h.LXMLAdapter:
+        from lxml import etree
+        root = parent = etree.Element(root_name)
+        # Hold on to every element proxy while building, otherwise lxml
+        # walks the ancestors of each discarded proxy to free it
+        elements = [root]
+        for i in range(depth):
+            parent = etree.SubElement(parent, name)
+            elements.append(parent)
+        parent.text = leaf_text
+        impl_doc = etree.ElementTree(root)
+    elif issubclass(adapter_class, xml4h.ElementTreeAdapter):
+        ET = adapter_class.ET
+        root = parent = ET.Element(root_name)
+        for i in range(depth):
+            parent = ET.SubElement(parent, name)
+        parent.text = leaf_text
+        impl_doc = ET.ElementTree(root)
+    else:
+        import xml.dom.minidom
+        impl_doc = xml.dom.minidom.getDOMImplementation().createDocument(
+            None, root_name, None)
+        # Build from the leaf upwards and attach the result last, since
+        # minidom walks the ancestors of any node appended within a document
+        child = impl_doc.createElement(name)
+        if leaf_text is not None:
+            child.appendChild(impl_doc.createTextNode(leaf_text))
+        for i in range(depth - 1):
+            parent = impl_doc.createElement(name)
+            parent.appendChild(child)
+            child = parent
+        impl_doc.documentElement.appendChild(child)
+    return adapter_class.wrap_document(impl_doc)
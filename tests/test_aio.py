@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import six
+
+import xml4h
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+class SlowStreamWriter(object):
+    """
+    Sink like :class:`asyncio.StreamWriter` that takes a moment to drain
+    """
+
+    def __init__(self, fail_after=None):
+        self.chunks = []
+        self.drains = 0
+        self.fail_after = fail_after
+
+    def write(self, data):
+        if self.fail_after is not None and len(self.chunks) >= self.fail_after:
+            raise IOError('Connection lost')
+        self.chunks.append(data)
+
+    def drain(self):
+        self.drains += 1
+        return asyncio.sleep(0.001)
+
+
+class CoroutineWriter(object):
+    """
+    Sink whose write method returns an awaitable
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return asyncio.sleep(0)
+
+
+class AsyncChunks(object):
+    """
+    Asynchronous iterable over the given chunks
+    """
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = asyncio.get_event_loop().create_future()
+        if self.chunks:
+            future.set_result(self.chunks.pop(0))
+        else:
+            future.set_exception(StopAsyncIteration())
+        return future
+
+
+class BaseAsyncioTest(object):
+
+    xml_bytes = (
+        b'<?xml version="1.0" encoding="utf-8"?>\n'
+        b'<Films xmlns:x="urn:x">\n'
+        + b''.join(
+            b'  <Film id="%d"><x:Title>Film \xc3\xa9 %d</x:Title></Film>\n'
+            % (i, i) for i in range(500))
+        + b'</Films>')
+
+    def setUp(self):
+        if asyncio is None or six.PY2:
+            self.skipTest("asyncio is not available")
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def check_doc(self, doc):
+        self.assertIsInstance(doc, xml4h.nodes.Document)
+        self.assertEqual(self.adapter, type(doc.adapter))
+        films = doc.find('Film')
+        self.assertEqual(500, len(films))
+        self.assertEqual(u'Film é 499', films[-1].children[0].text)
+        self.assertEqual('urn:x', films[0].children[0].namespace_uri)
+
+    def test_aparse_stream_reader(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(self.xml_bytes)
+        reader.feed_eof()
+        doc = self.loop.run_until_complete(
+            xml4h.aparse(reader, adapter=self.adapter, chunk_size=100))
+        self.check_doc(doc)
+
+    def test_aparse_async_iterable(self):
+        chunks = [self.xml_bytes[i:i + 333]
+                  for i in range(0, len(self.xml_bytes), 333)]
+        doc = self.loop.run_until_complete(
+            xml4h.aparse(AsyncChunks(chunks), adapter=self.adapter))
+        self.check_doc(doc)
+        doc = self.loop.run_until_complete(xml4h.aparse(
+            AsyncChunks([b'<a>  <b/>', b'</a>']),
+            ignore_whitespace_text_nodes=False, adapter=self.adapter))
+        self.assertEqual(2, len(doc.root.children))
+
+    def test_aparse_other_sources(self):
+        doc = self.loop.run_until_complete(
+            xml4h.aparse(self.xml_bytes, adapter=self.adapter))
+        self.check_doc(doc)
+        doc = self.loop.run_until_complete(xml4h.aparse(
+            'tests/data/monty_python_films.xml', adapter=self.adapter))
+        self.assertEqual(7, len(doc.find('Film')))
+
+    def test_aparse_error(self):
+        self.assertRaises(Exception, self.loop.run_until_complete,
+            xml4h.aparse(AsyncChunks([b'<a><b>', b'</a>']),
+                adapter=self.adapter))
+
+    def test_awrite_in_chunks(self):
+        doc = xml4h.parse(self.xml_bytes, adapter=self.adapter)
+        writer = SlowStreamWriter()
+        self.loop.run_until_complete(doc.awrite(
+            writer, indent=2, chunk_size=1024, max_pending_chunks=2))
+        self.assertTrue(len(writer.chunks) > 10)
+        self.assertEqual(len(writer.chunks), writer.drains)
+        self.assertTrue(all(len(c) < 2048 for c in writer.chunks))
+        self.assertEqual(doc.xml(indent=2).encode('utf-8'),
+            b''.join(writer.chunks))
+        # Write text chunks to a coroutine sink
+        writer = CoroutineWriter()
+        film = doc.find_first('Film')
+        self.loop.run_until_complete(xml4h.awrite_node(
+            film, writer, encoding=None))
+        self.assertEqual(film.xml(encoding=None, indent=0),
+            ''.join(writer.chunks))
+
+    def test_awrite_sink_failure(self):
+        doc = xml4h.parse(self.xml_bytes, adapter=self.adapter)
+        writer = SlowStreamWriter(fail_after=3)
+        self.assertRaises(IOError, self.loop.run_until_complete,
+            doc.awrite(writer, chunk_size=256, max_pending_chunks=1))
+        self.assertEqual(3, len(writer.chunks))
+
+
+class TestXmlDomAsyncio(BaseAsyncioTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.XmlDomImplAdapter
+
+
+class TestLXMLEtreeAsyncio(BaseAsyncioTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.LXMLAdapter.is_available():
+            self.skipTest("lxml library is not installed")
+        return xml4h.LXMLAdapter
+
+
+class TestElementTreeAsyncio(BaseAsyncioTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.ElementTreeAdapter.is_available():
+            self.skipTest(
+                "ElementTree library is not installed or is outdated")
+        return xml4h.ElementTreeAdapter
+
+
+class TestcElementTreeAsyncio(BaseAsyncioTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.cElementTreeAdapter.is_available():
+            self.skipTest(
+                "cElementTree library is not installed or is outdated")
+        return xml4h.cElementTreeAdapter
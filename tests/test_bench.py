@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import six
+import sys
+import tempfile
+import unittest
+
+import xml4h
+from xml4h import bench
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_make_sample_xml(self):
+        doc = xml4h.parse(bench.make_sample_xml(records=3))
+        self.assertEqual(3, len(doc.find('Record')))
+        self.assertEqual('r2', doc.find('Record')[-1]['id'])
+
+    def test_whitespace_benchmark(self):
+        out = six.StringIO()
+        bench.main(['whitespace', '--records', '5', '--repeat', '1'], out)
+        report = out.getvalue()
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    def test_decompress_benchmark(self):
+        out = six.StringIO()
+        bench.main(['decompress', '--records', '5', '--repeat', '1'], out)
+        report = out.getvalue()
+        self.assertTrue('.gz ' in report)
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    def test_navigate_benchmark(self):
+        out = six.StringIO()
+        bench.main(['navigate', '--records', '5', '--repeat', '1'], out)
+        report = out.getvalue()
+        self.assertTrue('hit rate' in report)
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    def test_attributes_benchmark(self):
+        out = six.StringIO()
+        bench.main(['attributes', '--records', '5', '--repeat', '1'], out)
+        report = out.getvalue()
+        self.assertTrue('us per lookup' in report)
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    def test_stream_benchmark(self):
+        out = six.StringIO()
+        bench.main(['stream', '--records', '5', '--repeat', '1'], out)
+        report = out.getvalue()
+        self.assertTrue('split_documents' in report)
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    @unittest.skipIf(sys.version_info < (3, 4),
+        'Memory is traced with tracemalloc, from Python 3.4')
+    def test_memory_benchmark(self):
+        out = six.StringIO()
+        bench.main(['memory', '--records', '5'], out)
+        report = out.getvalue()
+        self.assertTrue('bytes per node' in report)
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    def test_import_benchmark(self):
+        out = six.StringIO()
+        bench.main(['import', '--repeat', '1'], out)
+        report = out.getvalue()
+        self.assertTrue('import xml4h ' in report)
+        for adapter in bench.available_adapters():
+            self.assertTrue(adapter.__name__ in report)
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+        'Module attributes can only be looked up lazily in Python 3.7+')
+    def test_import_is_lazy(self):
+        # Guard against slow imports creeping back into `import xml4h`
+        elapsed, modules = bench.import_time('import xml4h')
+        self.assertEqual([], [m for m in bench.SLOW_IMPORT_MODULES
+                              if m in modules])
+        # Adapter libraries are imported on first use, only as needed
+        elapsed, modules = bench.import_time(
+            'import xml4h; xml4h.parse(b"<a/>", adapter=xml4h.%s)'
+            % xml4h.XmlDomImplAdapter.__name__)
+        self.assertTrue('xml.dom.minidom' in modules)
+        self.assertFalse('lxml.etree' in modules)
+        self.assertFalse('xml.etree.ElementTree' in modules)
+
+    def test_adapters_benchmark(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        profile_path = os.path.join(tmp_dir, 'adapters.json')
+        out = six.StringIO()
+        bench.main(['adapters', '--records', '5', '--repeat', '1',
+                    '--save', profile_path], out)
+        report = out.getvalue()
+        self.assertTrue(profile_path in report)
+        adapter_names = sorted(
+            adapter.__name__ for adapter in bench.available_adapters())
+        profile = xml4h.AdapterProfile.load(profile_path)
+        for workload in xml4h.AdapterProfile.WORKLOADS:
+            self.assertEqual(adapter_names,
+                sorted(profile.ranking(workload)))
+            self.assertTrue('Best for %s' % workload in report)
+        # The profile is not saved without a path
+        os.remove(profile_path)
+        bench.main(['adapters', '--records', '5', '--repeat', '1',
+                    '--save', ''], six.StringIO())
+        self.assertFalse(os.path.exists(profile_path))
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import xml4h
+
+
+class BaseParseCacheTest(object):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, xml_bytes, mtime=None):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(xml_bytes)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_parse_bytes_by_content(self):
+        cache = xml4h.ParseCache()
+        doc1 = xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache)
+        doc2 = xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache)
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(doc1.xml(), doc2.xml())
+        # Different content, or different parse options, are cached apart
+        xml4h.parse(b'<a><c/></a>', adapter=self.adapter, cache=cache)
+        xml4h.parse(b'<a><b/></a>', ignore_whitespace_text_nodes=False,
+            adapter=self.adapter, cache=cache)
+        self.assertEqual(3, cache.misses)
+        self.assertEqual(3, len(cache))
+        # Buffers and text are keyed on content too
+        xml4h.parse(bytearray(b'<a><b/></a>'), adapter=self.adapter,
+            cache=cache)
+        xml4h.parse(u'<a><b/></a>', adapter=self.adapter, cache=cache)
+        self.assertEqual(3, cache.hits)
+
+    def test_returns_independent_copies(self):
+        cache = xml4h.ParseCache()
+        doc1 = xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache)
+        doc1.root.add_element('c')
+        doc1.root.b.set_attributes({'x': '1'})
+        doc2 = xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache)
+        self.assertEqual(['b'], [n.name for n in doc2.root.children])
+        self.assertEqual({}, dict(doc2.root.b.attributes))
+        self.assertIsInstance(doc2, xml4h.nodes.Document)
+        self.assertEqual(self.adapter, type(doc2.adapter))
+
+    def test_parse_path_by_mtime_and_size(self):
+        cache = xml4h.ParseCache()
+        path = self.write_file('doc.xml', b'<a><b/></a>', mtime=1000000)
+        xml4h.parse(path, adapter=self.adapter, cache=cache)
+        doc = xml4h.parse(path, adapter=self.adapter, cache=cache)
+        self.assertEqual((1, 1), (cache.misses, cache.hits))
+        self.assertEqual(['b'], [n.name for n in doc.root.children])
+        # A changed file is parsed again
+        self.write_file('doc.xml', b'<a><c/></a>', mtime=2000000)
+        doc = xml4h.parse(path, adapter=self.adapter, cache=cache)
+        self.assertEqual((2, 1), (cache.misses, cache.hits))
+        self.assertEqual(['c'], [n.name for n in doc.root.children])
+
+    def test_file_objects_are_not_cached(self):
+        cache = xml4h.ParseCache()
+        path = self.write_file('doc.xml', b'<a><b/></a>')
+        for i in range(2):
+            with open(path, 'rb') as f:
+                doc = xml4h.parse(f, adapter=self.adapter, cache=cache)
+            self.assertEqual('a', doc.root.name)
+        self.assertEqual((0, 0, 0), (cache.misses, cache.hits, len(cache)))
+
+    def test_evict_least_recently_used(self):
+        cache = xml4h.ParseCache(max_entries=2)
+        for xml_bytes in (b'<a/>', b'<b/>', b'<a/>', b'<c/>'):
+            xml4h.parse(xml_bytes, adapter=self.adapter, cache=cache)
+        self.assertEqual(2, len(cache))
+        # The recently used <a/> document was kept, while <b/> was evicted
+        xml4h.parse(b'<a/>', adapter=self.adapter, cache=cache)
+        self.assertEqual(2, cache.hits)
+        xml4h.parse(b'<b/>', adapter=self.adapter, cache=cache)
+        self.assertEqual(4, cache.misses)
+
+    def test_evict_to_bound_bytes(self):
+        cache = xml4h.ParseCache(max_bytes=20)
+        xml4h.parse(b'<aaaa/>', adapter=self.adapter, cache=cache)
+        xml4h.parse(b'<bbbb/>', adapter=self.adapter, cache=cache)
+        self.assertEqual(14, cache.total_bytes)
+        xml4h.parse(b'<cccc/>', adapter=self.adapter, cache=cache)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(14, cache.total_bytes)
+        # Documents larger than the whole cache are never cached
+        xml4h.parse(b'<' + b'd' * 30 + b'/>', adapter=self.adapter,
+            cache=cache)
+        self.assertEqual(2, len(cache))
+
+    def test_limits_are_enforced_for_cached_documents(self):
+        cache = xml4h.ParseCache()
+        xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache)
+        self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+            xml4h.parse, b'<a><b/></a>', adapter=self.adapter, cache=cache,
+            limits=xml4h.ParseLimits(max_depth=1))
+        limits = xml4h.ParseLimits(max_depth=2)
+        xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache,
+            limits=limits)
+        xml4h.parse(b'<a><b/></a>', adapter=self.adapter, cache=cache,
+            limits=xml4h.ParseLimits(max_depth=2))
+        self.assertEqual((1, 3), (cache.hits, cache.misses))
+
+    def test_stats(self):
+        cache = xml4h.ParseCache()
+        self.assertEqual(0.0, cache.stats['hit_rate'])
+        for i in range(4):
+            xml4h.parse(b'<a/>', adapter=self.adapter, cache=cache)
+        self.assertEqual(
+            {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'entries': 1,
+             'total_bytes': 4},
+            cache.stats)
+        cache.clear()
+        self.assertEqual((0, 0, 0), (cache.hits, cache.misses, len(cache)))
+
+
+class TestXmlDomParseCache(BaseParseCacheTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.XmlDomImplAdapter
+
+
+class TestLXMLEtreeParseCache(BaseParseCacheTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.LXMLAdapter.is_available():
+            self.skipTest("lxml library is not installed")
+        return xml4h.LXMLAdapter
+
+
+class TestElementTreeParseCache(BaseParseCacheTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.ElementTreeAdapter.is_available():
+            self.skipTest(
+                "ElementTree library is not installed or is outdated")
+        return xml4h.ElementTreeAdapter
+
+
+class TestcElementTreeParseCache(BaseParseCacheTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.cElementTreeAdapter.is_available():
+            self.skipTest(
+                "cElementTree library is not installed or is outdated")
+        return xml4h.cElementTreeAdapter
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
+import gc
 import types
+import weakref
 try:
     import unittest2 as unittest
 except ImportError:
     import unittest
 
 import xml4h
+from tests import build_deep_document
 
 
 class BaseTestNodes(object):
@@ -167,6 +170,47 @@ class BaseTestNodes(object):
         self.assertEqual([], self.xml4h_root.children[0].siblings_before)
         self.assertEqual([], self.xml4h_root.children[-1].siblings_after)
 
+    def test_iter_descendants(self):
+        self.assertEqual(
+            [self.elem1, self.elem2, self.elem3, self.elem2_second,
+             self.elem4, self.elem3_second],
+            [n.impl_node for n in self.xml4h_root.iter_descendants()
+             if n.is_element])
+        # CDATA is only distinguished from Text nodes by minidom
+        if self.adapter_class == xml4h.XmlDomImplAdapter:
+            cdata_class = xml4h.nodes.CDATA
+        else:
+            cdata_class = xml4h.nodes.Text
+        self.assertEqual(
+            [xml4h.nodes.Element, xml4h.nodes.Text,
+             xml4h.nodes.Element, cdata_class,
+             xml4h.nodes.Element, xml4h.nodes.Element, xml4h.nodes.Comment,
+             xml4h.nodes.Element, xml4h.nodes.Element,
+             xml4h.nodes.ProcessingInstruction],
+            [n.__class__ for n in self.xml4h_root.iter_descendants()])
+        # Document descendants include the root element
+        self.assertEqual(self.root_elem,
+            next(self.xml4h_doc.iter_descendants()).impl_node)
+        # Nodes without children have no descendants
+        self.assertEqual([], list(self.xml4h_text.iter_descendants()))
+
+    def test_iter_descendants_of_deep_document(self):
+        depth = 50000
+        doc = build_deep_document(self.adapter_class, depth, leaf_text='leaf')
+        descendants = list(doc.root.iter_descendants())
+        self.assertEqual(depth + 1, len(descendants))
+        self.assertEqual('Deep', descendants[-2].name)
+        self.assertTrue(descendants[-1].is_text)
+        self.assertEqual('leaf', descendants[-1].value)
+
+    def test_ignore_whitespace_text_nodes_in_deep_document(self):
+        depth = 50000
+        doc = build_deep_document(self.adapter_class, depth, leaf_text='  ')
+        self.adapter_class.ignore_whitespace_text_nodes(doc)
+        descendants = list(doc.root.iter_descendants())
+        self.assertEqual(depth, len(descendants))
+        self.assertEqual([], descendants[-1].children)
+
     def test_namespace_data(self):
         # Namespace data for element without namespace
         wrapped_elem = self.adapter_class.wrap_node(self.elem1, self.doc)
@@ -206,6 +250,91 @@ class BaseTestNodes(object):
         self.assertEqual('urn:ns1',
             wrapped_elem.attributes.namespace_uri('ns1:b'))
 
+    def test_attribute_keyed_lookups(self):
+        adapter = self.xml4h_doc.adapter
+        # Each attribute is found by its name and namespace, as it is among
+        # all the element's attributes
+        for attr in adapter.get_node_attributes(self.elem1):
+            local_name = adapter.get_node_local_name(attr)
+            ns_uri = adapter.get_node_namespace_uri(attr)
+            if ns_uri is None:
+                local_name = adapter.get_node_name(attr)
+            self.assertEqual(adapter.get_node_value(attr),
+                adapter.get_node_attribute_value(
+                    self.elem1, local_name, ns_uri))
+            self.assertTrue(
+                adapter.has_node_attribute(self.elem1, local_name, ns_uri))
+            attr_node = adapter.get_node_attribute_node(
+                self.elem1, local_name, ns_uri)
+            self.assertEqual(adapter.get_node_name(attr),
+                adapter.get_node_name(attr_node))
+            self.assertEqual(ns_uri, adapter.get_node_namespace_uri(attr_node))
+        for name, ns_uri in (('c', None), ('b', None), ('a', 'urn:ns1')):
+            self.assertIsNone(
+                adapter.get_node_attribute_value(self.elem1, name, ns_uri))
+            self.assertFalse(
+                adapter.has_node_attribute(self.elem1, name, ns_uri))
+            self.assertIsNone(
+                adapter.get_node_attribute_node(self.elem1, name, ns_uri))
+        # Lookups through element nodes
+        elem1 = self.xml4h_root.children[0]
+        self.assertEqual('1', elem1['a'])
+        self.assertEqual('2', elem1['ns1:b'])
+        self.assertEqual('2', elem1['{urn:ns1}b'])
+        self.assertEqual('urn:ns1', elem1['xmlns:ns1'])
+        self.assertTrue('ns1:b' in elem1.attributes)
+        self.assertFalse('c' in elem1.attributes)
+        self.assertRaises(KeyError, lambda: elem1['c'])
+        self.assertEqual('ns1:b',
+            elem1.attribute_node('b', ns_uri='urn:ns1').name)
+
+    def test_attribute_dict_live_view(self):
+        adapter = self.xml4h_doc.adapter
+        elem1 = self.xml4h_root.children[0]
+        attributes = elem1.attributes
+        # Attributes are iterated in the element's own order
+        names = [adapter.get_node_name(a)
+                 for a in adapter.iter_node_attributes(self.elem1)]
+        self.assertEqual(names, list(attributes))
+        self.assertEqual(names, attributes.keys())
+        self.assertEqual(len(names), len(attributes))
+        self.assertEqual(len(names),
+            adapter.get_node_attribute_count(self.elem1))
+        self.assertEqual(0, adapter.get_node_attribute_count(self.elem2))
+        # Namespace declarations are counted once, like any attribute
+        doc = (xml4h.build('DocRoot', ns_uri='urn:default',
+                adapter=self.adapter_class)
+            .ns_prefix('testns', 'urn:test')
+            .element('Elem1', ns_uri='urn:elem1').up()
+            .element('Attrs').attributes(
+                {'testns:a': '1', 'b': '2'}).document)
+        for element in [doc.root] + doc.root.children:
+            self.assertEqual(len(element.attributes.keys()),
+                len(element.attributes))
+        # Counting attributes does not make attribute nodes
+        def no_attribute_nodes(element):
+            raise AssertionError('Attribute nodes made to count attributes')
+        adapter.iter_node_attributes = no_attribute_nodes
+        adapter.get_node_attributes = no_attribute_nodes
+        try:
+            self.assertEqual(len(names), len(attributes))
+        finally:
+            del adapter.iter_node_attributes
+            del adapter.get_node_attributes
+        self.assertEqual(
+            [adapter.get_node_value(a)
+             for a in adapter.iter_node_attributes(self.elem1)],
+            attributes.values())
+        self.assertEqual(sorted(zip(names, attributes.values())),
+            attributes.items())
+        # The view reflects later changes to the element
+        elem1.set_attributes({'c': '3'})
+        self.assertEqual(len(names) + 1, len(attributes))
+        self.assertEqual('3', attributes['c'])
+        self.assertTrue('c' in list(attributes))
+        del attributes['c']
+        self.assertEqual(names, list(attributes))
+
     def test_name(self):
         wrapped_node = self.adapter_class.wrap_node(self.elem1, self.doc)
         self.assertEqual(u'元素1', wrapped_node.name)
@@ -410,6 +539,138 @@ class BaseTestNodes(object):
         self.assertEqual(self.elem2,
                 self.xml4h_root.find_first('Element2').impl_node)
 
+    def test_iter_find(self):
+        results = self.xml4h_root.iter_find('Element2')
+        self.assertIsInstance(results, types.GeneratorType)
+        self.assertEqual(self.elem2, next(results).impl_node)
+        # Results match those found by filtering every descendant
+        descendants = [n for n in self.xml4h_doc.iter_descendants()
+                       if n.is_element]
+        for name in (None, 'Element2', 'Element3', u'元素1', 'NoMatch'):
+            for ns_uri in (None, 'urn:ns1', 'urn:ns2', 'urn:test'):
+                expected = [n for n in descendants
+                            if name in (None, n.local_name)
+                            and ns_uri in (None, n.namespace_uri)]
+                self.assertEqual(expected,
+                    list(self.xml4h_doc.iter_find(name, ns_uri=ns_uri)))
+                self.assertEqual(expected,
+                    self.xml4h_doc.find(name, ns_uri=ns_uri))
+                self.assertEqual(expected[0] if expected else None,
+                    self.xml4h_doc.find_first(name, ns_uri=ns_uri))
+
+    def test_build_index(self):
+        searches = [(name, ns_uri)
+            for name in (None, 'Element2', 'Element3', u'元素1', 'NoMatch')
+            for ns_uri in (None, 'urn:ns1', 'urn:ns2', 'urn:test')]
+        search_nodes = [self.xml4h_doc] + self.xml4h_doc.find()
+
+        def search_all():
+            return [(node.find(name, ns_uri=ns_uri),
+                     list(node.iter_find(name, ns_uri=ns_uri)),
+                     node.find_first(name, ns_uri=ns_uri))
+                    for node in search_nodes for name, ns_uri in searches]
+
+        expected = search_all()
+        index = self.xml4h_doc.build_index()
+        self.assertIs(index, self.xml4h_doc.adapter.element_index)
+        self.assertTrue(index.is_current)
+        self.assertEqual(7, len(index))
+        self.assertEqual(expected, search_all())
+        # Searches from other nodes' documents use the same index
+        self.assertEqual(index, self.xml4h_root.document.adapter.element_index)
+        self.assertEqual(self.xml4h_doc.find('Element2'),
+            self.xml4h_root.Element3.find_doc('Element2'))
+        # Changes made through nodes outdate the index
+        new_elem = self.xml4h_root.add_element('Element2')
+        self.assertFalse(index.is_current)
+        self.assertEqual(new_elem, self.xml4h_doc.find('Element2')[-1])
+        self.assertTrue(index.is_current)
+        new_elem.delete()
+        self.assertFalse(index.is_current)
+        self.assertEqual(expected, search_all())
+        self.xml4h_doc.drop_index()
+        self.assertIsNone(self.xml4h_doc.adapter.element_index)
+        self.assertEqual(expected, search_all())
+
+    def test_build_index_follows_transplant(self):
+        self.xml4h_doc.build_index()
+        elem3 = self.xml4h_root.Element3
+        elem4 = self.xml4h_root.Element4
+        self.assertEqual([], elem3.find('Element3'))
+        elem3.transplant_node(elem4)
+        self.assertEqual(['Element4', 'Element3'],
+            [n.local_name for n in elem3.find(ns_uri='urn:ns1')
+             + elem3.find(ns_uri='urn:ns2')])
+        self.assertEqual(
+            self.xml4h_doc.find(), self.xml4h_doc.find(ns_uri='*'))
+        self.assertEqual(
+            [n.local_name for n in self.xml4h_doc.find()],
+            [n.local_name for n in self.xml4h_doc.iter_descendants()
+             if n.is_element])
+
+    def test_index_attribute(self):
+        elem2 = self.xml4h_root.Element2
+        elem3 = self.xml4h_root.Element3
+        elem2_second = elem3.Element2
+        elem2.set_attributes({'key': 'two', 'rank': '10'})
+        elem2_second.set_attributes({'key': 'two', 'rank': '2.5'})
+        self.xml4h_root.Element4.set_attributes({'key': 'four', 'rank': 'x'})
+        searches = [('key', 'two', None), ('key', 'four', None),
+                    ('key', 'none', None), ('a', '1', None),
+                    ('b', '2', 'urn:ns1'), ('b', '2', None)]
+        search_nodes = [self.xml4h_doc, self.xml4h_root, elem3]
+
+        def search_all():
+            return [(node.find_by_attr(name, value, ns_uri=ns_uri),
+                     node.find_by_attr(name, value, ns_uri=ns_uri,
+                                       first_only=True),
+                     node.find_by_attr_range('rank', 2, 10),
+                     node.find_by_attr_range('rank', min_value=3),
+                     node.find_by_attr_range('rank', max_value=3))
+                    for node in search_nodes
+                    for name, value, ns_uri in searches]
+
+        expected = search_all()
+        self.assertEqual([elem2, elem2_second],
+            self.xml4h_doc.find_by_attr('key', 'two'))
+        self.assertEqual([elem2_second, elem2],
+            sorted(self.xml4h_doc.find_by_attr_range('rank', 2, 10),
+                   key=lambda n: float(n['rank'])))
+        self.assertEqual([self.elem1],
+            [n.impl_node for n in
+             self.xml4h_doc.find_by_attr('b', '2', ns_uri='urn:ns1')])
+        for name, value, ns_uri in searches:
+            self.xml4h_doc.index_attribute(name, ns_uri=ns_uri)
+        index = self.xml4h_doc.index_attribute('rank', numeric=True)
+        self.assertTrue(index.is_current)
+        self.assertEqual(expected, search_all())
+        # Changes to attributes made through nodes outdate the index
+        elem2.attributes['rank'] = '3'
+        self.assertFalse(index.is_current)
+        self.assertEqual([elem2],
+            self.xml4h_doc.find_by_attr_range('rank', 3, 3))
+        self.assertTrue(index.is_current)
+        elem2.set_attributes(rank='10')
+        self.assertEqual(expected, search_all())
+        self.xml4h_doc.drop_index()
+        self.assertEqual({}, self.xml4h_doc.adapter.attribute_indexes)
+        self.assertEqual(expected, search_all())
+
+    def test_get_by_id(self):
+        elem2 = self.xml4h_root.Element2
+        elem4 = self.xml4h_root.Element4
+        elem2.set_attributes({'id': 'e2'})
+        elem4.set_attributes({'id': 'e4'})
+        self.assertEqual(elem2, self.xml4h_doc.get_by_id('e2'))
+        self.assertEqual(elem4, self.xml4h_doc.get_by_id('e4'))
+        self.assertIsNone(self.xml4h_doc.get_by_id('e3'))
+        # xml:id identifiers take precedence
+        elem4.set_attributes({'id': 'e2'}, ns_uri=xml4h.nodes.Node.XML_URI)
+        self.assertEqual(elem4, self.xml4h_doc.get_by_id('e2'))
+        elem4.delete()
+        self.assertEqual(elem2, self.xml4h_doc.get_by_id('e2'))
+        self.assertIsNone(self.xml4h_doc.get_by_id('e4'))
+
     def test_has_feature(self):
         # Adapter and node has_feature tests must agree
         self.assertEqual(
@@ -608,6 +869,51 @@ class BaseTestNodes(object):
         self.assertEqual('2',
             self.xml4h_doc.DocRoot.child(u'元素1')['ns1:b'])
 
+    def test_wrapper_identity_cache(self):
+        doc = xml4h.parse(b'<DocRoot><Elem>Text</Elem><Elem/></DocRoot>',
+            adapter=self.adapter_class)
+        stats = doc.adapter.wrapper_cache_stats
+        root = doc.root
+        elem = root.children[0]
+        # Navigating to a node again returns its existing wrapper
+        self.assertTrue(elem.parent is root)
+        self.assertTrue(root.children[0] is elem)
+        self.assertTrue(doc.find_first('Elem') is elem)
+        text = elem.children[0]
+        self.assertTrue(elem.children[0] is text)
+        self.assertTrue(text.parent is elem)
+        new_stats = doc.adapter.wrapper_cache_stats
+        self.assertTrue(new_stats['hits'] >= stats['hits'] + 5)
+        self.assertTrue(0 < new_stats['hit_rate'] < 1)
+        # Changed text gets a new wrapper
+        elem.text = 'Changed'
+        self.assertEqual('Changed', elem.children[0].value)
+        # Wrappers no longer in use are not kept
+        entries = new_stats['entries']
+        del text
+        gc.collect()
+        self.assertTrue(
+            doc.adapter.wrapper_cache_stats['entries'] < entries)
+        doc.adapter.clear_caches()
+        self.assertEqual(0, doc.adapter.wrapper_cache_stats['hits'])
+
+    def test_wrappers_have_no_instance_dict(self):
+        doc = xml4h.parse(b'<DocRoot a="1"><Elem>Text</Elem></DocRoot>',
+            adapter=self.adapter_class)
+        elem = doc.root.Elem
+        wrappers = [doc, doc.root, elem, elem.children[0],
+                    doc.root.attribute_node('a'), doc.root.attributes]
+        # Including the objects adapters make for nodes their XML library
+        # has no objects for
+        impl_nodes = [n for n in (elem.children[0].impl_node,
+                                  doc.root.attribute_node('a').impl_node)
+                      if type(n).__module__.startswith('xml4h.')]
+        for obj in wrappers + impl_nodes:
+            self.assertFalse(hasattr(obj, '__dict__'), obj)
+        # Child element lookups by attribute name still work
+        self.assertEqual('Text', doc.root.Elem.text)
+        self.assertRaises(AttributeError, getattr, doc.root, 'Missing')
+
 
 class TestMinidomNodes(BaseTestNodes, unittest.TestCase):
 
@@ -782,6 +1088,49 @@ class TestElementTreeNodes(BaseTestNodes, unittest.TestCase):
         self.assertFalse(self.elem3_second in
             xml4h_elem3_second.adapter.CACHED_ANCESTRY_DICT)
 
+    def test_ancestry_dict_follows_changes(self):
+        xml4h_elem4 = self.adapter_class.wrap_node(self.elem4, self.doc)
+        index = xml4h_elem4.adapter.CACHED_ANCESTRY_DICT
+        self.assertEqual(self.root_elem, xml4h_elem4.parent.impl_node)
+        # Nodes added natively aren't seen, since the index isn't rebuilt
+        native_elem = self.elem4.makeelement('Native', {})
+        self.elem4.append(native_elem)
+        self.assertEqual(None,
+            self.adapter_class.wrap_node(native_elem, self.doc).parent)
+        self.elem4.remove(native_elem)
+        # Nodes added, moved or removed by xml4h are
+        new_elem = xml4h_elem4.add_element('New')
+        new_child = new_elem.add_element('NewChild')
+        self.assertEqual(xml4h_elem4, new_elem.parent)
+        self.assertEqual(new_elem, new_child.parent)
+        self.xml4h_root.transplant_node(new_elem)
+        moved_elem = self.xml4h_root.children[-1]
+        self.assertEqual(self.xml4h_root, moved_elem.parent)
+        self.assertEqual(moved_elem, moved_elem.children[0].parent)
+        self.assertEqual(None, new_elem.parent)
+        self.assertFalse(new_elem.impl_node in index)
+        # Other adapters for the same document share the index
+        other = self.adapter_class.wrap_node(moved_elem.impl_node, self.doc)
+        self.assertFalse(other.adapter is moved_elem.adapter)
+        self.assertEqual(self.xml4h_root, other.parent)
+        moved_elem.delete()
+        self.assertEqual(None, other.parent)
+
+    def test_ancestry_dict_does_not_keep_removed_nodes(self):
+        xml4h_elem4 = self.adapter_class.wrap_node(self.elem4, self.doc)
+        index = xml4h_elem4.adapter.CACHED_ANCESTRY_DICT
+        removed = xml4h_elem4.add_element('Removed')
+        removed.add_element('RemovedChild')
+        removed_ref = weakref.ref(removed.impl_node)
+        self.assertEqual(xml4h_elem4, removed.parent)
+        size = len(index)
+        # Removed natively, so the index isn't told about it
+        self.elem4.remove(removed.impl_node)
+        del removed
+        gc.collect()
+        self.assertEqual(None, removed_ref())
+        self.assertEqual(size - 2, len(index))
+
 
 # Note this class extends TestElementTreeNodes class, which performs tests
 # against ElementTree/cElementTree implementations depending on name of class.
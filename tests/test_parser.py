@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
 import six
+import gzip
 import unittest
 import os
 import re
+import mmap
+import shutil
+import sys
+import tempfile
 
 import xml4h
 
 
+def root_name_and_size(doc):
+    """
+    Module-level extraction function for parse_many() tests, since it must
+    be picklable.
+    """
+    return doc.root.name, len(doc.root.find())
+
+
 class TestParserBasics(unittest.TestCase):
 
     @property
@@ -23,6 +36,65 @@ class TestParserBasics(unittest.TestCase):
         self.assertEqual(8, len(dom.find()))
         self.assertEqual(xml4h.best_adapter, dom.adapter_class)
 
+    def test_split_documents(self):
+        xml_datas = [
+            b'<?xml version="1.0" encoding="utf-8"?>\n<!-- a > b -->'
+            b'<a x=">" y=\'/>\'><b/><![CDATA[</a>]]><?pi </a>?></a>',
+            b'<e/>',
+            b'<!DOCTYPE r [<!ENTITY x "y">]><r>&x;</r>',
+            b'<n:a xmlns:n="urn:n">t<n:b>u</n:b></n:a>',
+            ]
+        data = b'\n'.join(xml_datas) + b'\n<!-- trailing comment -->\n'
+        # Documents are found however the data is split into reads
+        for read_size in (1, 2, 3, 7, 64, 1024):
+            self.assertEqual(xml_datas, list(xml4h.streaming.split_documents(
+                six.BytesIO(data), read_size)))
+            self.assertEqual([d.decode('utf-8') for d in xml_datas],
+                list(xml4h.streaming.split_documents(
+                    six.StringIO(data.decode('utf-8')), read_size)))
+        self.assertEqual([], list(xml4h.streaming.split_documents(
+            six.BytesIO(b' \n '))))
+        # Malformed data is passed on for the parser to report
+        self.assertEqual([b'<a><b></a> stray <c'],
+            list(xml4h.streaming.split_documents(
+                six.BytesIO(b'<a><b></a> stray <c'), 3)))
+        # Lines are split into documents, or scanned if they are not
+        # exactly one document
+        xml_datas = [
+            b'<?xml version="1.0"?><a x="/>"><ab/>t</a>',
+            b'<a><a/></a>',
+            b'<a/>',
+            b'<b/>',
+            b'<c>\n<d/>\n</c>',
+            b'<!-- c -->\n<e>&gt;</e>',
+            ]
+        data = (b'  <?xml version="1.0"?><a x="/>"><ab/>t</a>\r\n\n'
+                b'<a><a/></a>\n<a/><b/>\n<c>\n<d/>\n</c>\n'
+                b'<!-- c -->\n<e>&gt;</e>  ')
+        for read_size in (1, 5, 1024):
+            self.assertEqual(xml_datas, list(xml4h.streaming.split_documents(
+                six.BytesIO(data), read_size)))
+        # A long document is split as it is read, whether or not it is on one
+        # line
+        for separator in (b'', b'\n'):
+            xml_data = (b'<r>' + separator.join([b'<i>text</i>'] * 5000)
+                        + b'</r>')
+            self.assertEqual([xml_data, b'<e/>'],
+                list(xml4h.streaming.split_documents(
+                    six.BytesIO(xml_data + b'\n<e/>'), 64)))
+
+
+class _UnsizedReader(object):
+    """
+    Readable stream of unknown size that cannot be rewound, like a socket.
+    """
+
+    def __init__(self, data):
+        self._data = six.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(size)
+
 
 class BaseParserTest(object):
     """
@@ -112,6 +184,542 @@ class BaseParserTest(object):
         self.assertEqual(u'tvö',
             doc.find_first(u'yếutố2').attributes[u'důl:עודתכונה'])
 
+    def test_ignore_whitespace_text_nodes(self):
+        xml_bytes = (b'<Doc>\n    <Empty>  </Empty>\n'
+                     b'    <Mixed>text <Child/> </Mixed>\n</Doc>')
+        doc = self.parse(xml_bytes)
+        self.assertEqual(['Empty', 'Mixed'],
+            [n.name for n in doc.root.children])
+        self.assertEqual([], doc.Doc.Empty.children)
+        self.assertEqual(None, doc.Doc.Empty.text)
+        # Non-whitespace text in mixed content is retained
+        self.assertEqual(['#text', 'Child'],
+            [n.name for n in doc.Doc.Mixed.children])
+        self.assertEqual('text ', doc.Doc.Mixed.children[0].value)
+        # Whitespace nodes are retained if requested
+        doc = xml4h.parse(xml_bytes, ignore_whitespace_text_nodes=False,
+            adapter=self.adapter)
+        self.assertEqual(['#text', 'Empty'],
+            [n.name for n in doc.root.children][:2])
+        self.assertEqual('  ', doc.Doc.Empty.text)
+
+    def test_iterparse(self):
+        films_xml_file_path = os.path.join(
+            os.path.dirname(__file__), 'data/monty_python_films.ns.xml')
+        if not self.adapter.has_feature('iterparse'):
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.iterparse, films_xml_file_path, adapter=self.adapter)
+            return
+        films = []
+        for film in xml4h.iterparse(
+                films_xml_file_path, tag='Film', adapter=self.adapter):
+            self.assertIsInstance(film, xml4h.nodes.Element)
+            # Yielded elements are complete, with whitespace stripped
+            self.assertEqual(['Title', 'Description'],
+                [n.name for n in film.children])
+            films.append((film.name, film['year'], film.Title.text))
+            # Ancestry is available while the document is still being parsed
+            self.assertEqual(film, film.Title.parent)
+            self.assertEqual('MontyPythonFilms', film.parent.name)
+            root = film.root
+        self.assertEqual(7, len(films))
+        self.assertEqual(
+            ('work:Film', '1971',
+             'And Now for Something Completely Different'),
+            films[0])
+        self.assertEqual('2012', films[-1][1])
+        # Processed elements have been freed from the document, leaving
+        # only the empty shell of the last one
+        self.assertEqual('MontyPythonFilms', root.name)
+        self.assertEqual(['Film'], [n.local_name for n in root.find()])
+        # Filter by namespace URI, with or without a name constraint
+        self.assertEqual(7, len(list(xml4h.iterparse(
+            films_xml_file_path, ns_uri='uri:artistic-work',
+            adapter=self.adapter))))
+        self.assertEqual([], list(xml4h.iterparse(
+            films_xml_file_path, tag='Film', ns_uri='uri:monty-python',
+            adapter=self.adapter)))
+        # Literal XML data, yielding every element in document order of
+        # completion
+        self.assertEqual(['c', 'b', 'd', 'a'],
+            [n.name for n in xml4h.iterparse(
+                '<a><b><c/></b><d/></a>', adapter=self.adapter)])
+        self.assertEqual(['c', 'b', 'd', 'a'],
+            [n.name for n in xml4h.iterparse(
+                b'<a><b><c/></b><d/></a>', adapter=self.adapter)])
+
+    def test_feed_parser(self):
+        if not self.adapter.has_feature('feed_parser'):
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.FeedParser, adapter=self.adapter)
+            return
+        xml_bytes = open(self.small_xml_file_path, 'rb').read()
+        # Feed the document in small chunks that split the markup
+        parser = xml4h.FeedParser(adapter=self.adapter)
+        for i in range(0, len(xml_bytes), 7):
+            parser.feed(xml_bytes[i:i + 7])
+        self.assertEqual([], list(parser.read_elements()))
+        doc = parser.close()
+        self.assertIsInstance(doc, xml4h.nodes.Document)
+        self.assertEqual(
+            self.adapter.parse_bytes(xml_bytes).xml(), doc.xml())
+        # Text chunks are also accepted
+        parser = xml4h.FeedParser(adapter=self.adapter)
+        parser.feed(u'<a><b>caf')
+        parser.feed(u'\xe9</b>\n  </a>')
+        doc = parser.close()
+        self.assertEqual(u'caf\xe9', doc.root.b.text)
+        self.assertEqual(['b'], [n.name for n in doc.root.children])
+
+    def test_feed_parser_emits_elements(self):
+        if not self.adapter.has_feature('feed_parser'):
+            return
+        films_xml_file_path = os.path.join(
+            os.path.dirname(__file__), 'data/monty_python_films.ns.xml')
+        xml_bytes = open(films_xml_file_path, 'rb').read()
+        parser = xml4h.FeedParser(
+            emit_elements=True, tag='Film', adapter=self.adapter)
+        films = []
+        for i in range(0, len(xml_bytes), 100):
+            parser.feed(xml_bytes[i:i + 100])
+            for film in parser.read_elements():
+                # Emitted elements are complete, with whitespace stripped
+                self.assertEqual(['Title', 'Description'],
+                    [n.name for n in film.children])
+                self.assertEqual('MontyPythonFilms', film.parent.name)
+                films.append(film['year'])
+        doc = parser.close()
+        self.assertEqual(
+            ['1971', '1974', '1979', '1982', '1983', '2009', '2012'], films)
+        # Emitted elements remain in the document
+        self.assertEqual(7, len(doc.find(name='Film')))
+        # Filter by namespace URI
+        parser = xml4h.FeedParser(emit_elements=True,
+            ns_uri='uri:artistic-work', adapter=self.adapter)
+        parser.feed(xml_bytes)
+        self.assertEqual(7, len(list(parser.read_elements())))
+        parser.close()
+
+    def test_parse_buffers(self):
+        xml_bytes = open(self.small_xml_file_path, 'rb').read()
+        expected_xml = self.adapter.parse_bytes(xml_bytes).xml()
+        for xml_buffer in (bytearray(xml_bytes), memoryview(xml_bytes)):
+            doc = xml4h.parse(xml_buffer, adapter=self.adapter)
+            self.assertEqual(expected_xml, doc.xml())
+        with open(self.small_xml_file_path, 'rb') as f:
+            xml_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                doc = xml4h.parse(xml_mmap, adapter=self.adapter)
+                self.assertEqual(expected_xml, doc.xml())
+            finally:
+                xml_mmap.close()
+
+    def test_parse_with_source_type(self):
+        xml_bytes = open(self.small_xml_file_path, 'rb').read()
+        expected_xml = self.adapter.parse_bytes(xml_bytes).xml()
+        for to_parse, source_type in (
+                (xml_bytes, 'bytes'),
+                (bytearray(xml_bytes), 'buffer'),
+                (self.small_xml_file_path, 'file')):
+            doc = xml4h.parse(
+                to_parse, source_type=source_type, adapter=self.adapter)
+            self.assertEqual(expected_xml, doc.xml())
+        doc = xml4h.parse(
+            u'<a><b/></a>', source_type='string', adapter=self.adapter)
+        self.assertEqual(['b'], [n.name for n in doc.root.children])
+        self.assertRaises(ValueError, xml4h.parse, xml_bytes,
+            source_type='unknown', adapter=self.adapter)
+
+    def test_parse_compressed(self):
+        import gzip
+        import bz2
+        films_xml_file_path = os.path.join(
+            os.path.dirname(__file__), 'data/monty_python_films.xml')
+        xml_bytes = open(films_xml_file_path, 'rb').read()
+        compressors = [('.gz', gzip), ('.bz2', bz2)]
+        try:
+            import lzma
+            compressors.append(('.xz', lzma))
+        except ImportError:
+            pass
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for extension, module in compressors:
+                compressed_bytes = module.compress(xml_bytes)
+                path = os.path.join(temp_dir, 'films.xml' + extension)
+                with open(path, 'wb') as f:
+                    f.write(compressed_bytes)
+                # Recognised by file extension, or by leading magic bytes
+                with open(path, 'rb') as f:
+                    for to_parse in (path, compressed_bytes, f):
+                        doc = xml4h.parse(to_parse, adapter=self.adapter)
+                        self.assertEqual(7, len(doc.find('Film')))
+                if self.adapter.has_feature('iterparse'):
+                    self.assertEqual(7, len(list(xml4h.iterparse(
+                        path, tag='Film', adapter=self.adapter))))
+            # Paths given as bytes are recognised too
+            gz_path = os.path.join(temp_dir, 'films.xml.gz')
+            doc = xml4h.parse(gz_path.encode(sys.getfilesystemencoding()),
+                adapter=self.adapter)
+            self.assertEqual(7, len(doc.find('Film')))
+            # Paths are recognised by content, not extension
+            plain_path = os.path.join(temp_dir, 'plain.xml.gz')
+            with open(plain_path, 'wb') as f:
+                f.write(xml_bytes)
+            renamed_path = os.path.join(temp_dir, 'films.dat')
+            shutil.copy(gz_path, renamed_path)
+            for path in (plain_path, renamed_path):
+                doc = xml4h.parse(path, adapter=self.adapter)
+                self.assertEqual(7, len(doc.find('Film')))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_parse_with_keep(self):
+        xml_bytes = (
+            b'<?xml version="1.0"?>\n'
+            b'<catalog xmlns:p="urn:p">\n'
+            b'  <meta><price>0</price></meta>\n'
+            b'  <product id="1"><name>A</name><price cur="EUR">1</price>'
+            b'<desc><big>xx</big></desc></product>\n'
+            b'  <product id="2"><name>B</name><price>2</price>'
+            b'<p:price>9</p:price></product>\n'
+            b'</catalog>')
+
+        def parse_and_keep(keep, to_parse=xml_bytes):
+            doc = xml4h.parse(to_parse, keep=keep, adapter=self.adapter)
+            return doc.xml(indent=False, omit_declaration=True)
+
+        # Absolute path, keeping ancestors of matches and their attributes
+        self.assertEqual(
+            '<catalog xmlns:p="urn:p">'
+            '<product id="1"><price cur="EUR">1</price></product>'
+            '<product id="2"><price>2</price><p:price>9</p:price></product>'
+            '</catalog>',
+            parse_and_keep(['/catalog/product/price']))
+        # Relative path matched at any depth
+        self.assertEqual(
+            '<catalog xmlns:p="urn:p">'
+            '<meta><price>0</price></meta>'
+            '<product id="1"><price cur="EUR">1</price></product>'
+            '<product id="2"><price>2</price><p:price>9</p:price></product>'
+            '</catalog>',
+            parse_and_keep(['price']))
+        # Name and namespace tuple, and several filters at once
+        self.assertEqual(
+            '<catalog xmlns:p="urn:p">'
+            '<product id="2"><p:price>9</p:price></product>'
+            '</catalog>',
+            parse_and_keep([('price', 'urn:p')]))
+        # Matching elements are kept whole
+        self.assertEqual(
+            '<catalog xmlns:p="urn:p">'
+            '<meta><price>0</price></meta>'
+            '<product id="1"><desc><big>xx</big></desc></product>'
+            '</catalog>',
+            parse_and_keep(['/catalog/meta', 'product/desc']))
+        # The root element is always kept
+        self.assertEqual(
+            '<catalog xmlns:p="urn:p"/>', parse_and_keep(['/other']))
+        # All kinds of input are filtered
+        expected = parse_and_keep(['/catalog/product/price'])
+        for to_parse in (xml_bytes.decode('utf-8').split('\n', 1)[1],
+                         bytearray(xml_bytes),
+                         six.BytesIO(xml_bytes)):
+            self.assertEqual(expected, parse_and_keep(
+                ['/catalog/product/price'], to_parse))
+        films_xml_file_path = os.path.join(
+            os.path.dirname(__file__), 'data/monty_python_films.xml')
+        doc = xml4h.parse(films_xml_file_path, keep=['Title'],
+            adapter=self.adapter)
+        self.assertEqual(7, len(doc.find('Title')))
+        self.assertEqual([], doc.find('Description'))
+
+    def test_parse_many(self):
+        to_parse_items = [self.small_xml_file_path] + [
+            b'<Doc' + six.b(str(i)) + b'>' + b'<Item/>' * i + (
+                b'</Doc' + six.b(str(i)) + b'>')
+            for i in range(10)]
+        expected = [('DocRoot', len(xml4h.parse(
+            self.small_xml_file_path, adapter=self.adapter).root.find()))] + [
+            ('Doc%d' % i, i) for i in range(10)]
+        # Results are in document order by default, across several chunks
+        self.assertEqual(expected, list(xml4h.parse_many(
+            to_parse_items, root_name_and_size, workers=2, chunksize=3,
+            adapter=self.adapter)))
+        # Unordered results are streamed with each document's index
+        results = list(xml4h.parse_many(
+            to_parse_items, root_name_and_size, workers=2, chunksize=3,
+            ordered=False, adapter=self.adapter))
+        self.assertEqual(list(enumerate(expected)), sorted(results))
+
+    def test_parse_limits(self):
+        xml_bytes = (b'<a x="1" y="2"><b><c/><c/></b><b>'
+                     + b'<d>' * 10 + b'</d>' * 10 + b'</b></a>')
+
+        def exceeded_limit(to_parse, **limits):
+            if callable(to_parse):
+                to_parse = to_parse()
+            try:
+                xml4h.parse(to_parse, adapter=self.adapter,
+                    limits=xml4h.ParseLimits(**limits))
+            except xml4h.exceptions.ParseLimitExceededException as ex:
+                return ex.limit_name, ex.limit
+            return None
+
+        # 15 elements and 2 attributes, up to 12 deep, 111 bytes
+        generous = dict(max_depth=12, max_nodes=17, max_bytes=111,
+            max_seconds=60)
+        for to_parse in (xml_bytes, xml_bytes.decode('utf-8'),
+                         bytearray(xml_bytes),
+                         lambda: six.BytesIO(xml_bytes)):
+            self.assertEqual(None, exceeded_limit(to_parse, **generous))
+            self.assertEqual(
+                ('max_depth', 11), exceeded_limit(to_parse, max_depth=11))
+            self.assertEqual(
+                ('max_nodes', 16), exceeded_limit(to_parse, max_nodes=16))
+            self.assertEqual(
+                ('max_bytes', 110), exceeded_limit(to_parse, max_bytes=110))
+            self.assertEqual(
+                ('max_seconds', -1), exceeded_limit(to_parse, max_seconds=-1))
+        doc = xml4h.parse(xml_bytes, adapter=self.adapter,
+            limits=xml4h.ParseLimits(**generous))
+        self.assertEqual(15, len(doc.find()))
+        # File paths and compressed data are limited too, the latter by
+        # decompressed size
+        self.assertEqual(('max_bytes', 100), exceeded_limit(
+            self.small_xml_file_path, max_bytes=100))
+        self.assertEqual(('max_nodes', 5), exceeded_limit(
+            self.small_xml_file_path, max_nodes=5))
+        self.assertEqual(('max_bytes', 110), exceeded_limit(
+            gzip.compress(xml_bytes) if six.PY3 else xml_bytes,
+            max_bytes=110))
+        # Limits combine with keep
+        self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+            xml4h.parse, xml_bytes, keep=['c'], adapter=self.adapter,
+            limits=xml4h.ParseLimits(max_depth=4))
+
+    def test_streaming_limits(self):
+        xml_bytes = (b'<Records>' + b'<Record id="1"><Name/></Record>' * 20
+                     + b'</Records>')
+        limits = xml4h.ParseLimits(max_nodes=40)
+        if self.adapter.has_feature('iterparse'):
+            records = xml4h.iterparse(xml_bytes, tag='Record',
+                adapter=self.adapter, limits=limits)
+            self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+                list, records)
+            records = xml4h.iterparse(xml_bytes, tag='Record',
+                adapter=self.adapter,
+                limits=xml4h.ParseLimits(max_nodes=61, max_depth=3))
+            self.assertEqual(20, len([r['id'] for r in records]))
+        if self.adapter.has_feature('feed_parser'):
+            parser = xml4h.FeedParser(emit_elements=True, tag='Name',
+                adapter=self.adapter, limits=limits)
+            parser.feed(xml_bytes[:100])
+            self.assertEqual(['Name'] * 3,
+                [n.name for n in parser.read_elements()])
+            self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+                parser.feed, xml_bytes[100:])
+            parser = xml4h.FeedParser(adapter=self.adapter,
+                limits=xml4h.ParseLimits(max_bytes=100))
+            parser.feed(xml_bytes[:100])
+            self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+                parser.feed, xml_bytes[100:])
+        # Errors from worker processes are raised from parse_many
+        self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+            list, xml4h.parse_many([xml_bytes], root_name_and_size,
+                workers=1, adapter=self.adapter, limits=limits))
+
+    def test_max_dom_bytes(self):
+        xml_bytes = (b'<Records>' + b'<Record id="1"><Name/></Record>' * 20
+                     + b'</Records>')
+        size = len(xml_bytes)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        xml_path = os.path.join(tmp_dir, 'records.xml')
+        with open(xml_path, 'wb') as f:
+            f.write(xml_bytes)
+        xml_file = open(xml_path, 'rb')
+        self.addCleanup(xml_file.close)
+        xml_mmap = mmap.mmap(xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.addCleanup(xml_mmap.close)
+        sources = (xml_bytes, xml_bytes.decode('utf-8'),
+            bytearray(xml_bytes), xml_path, xml_mmap, xml_file)
+        # Inputs within the threshold are parsed as usual
+        for to_parse in sources:
+            doc = xml4h.parse(to_parse, adapter=self.adapter,
+                max_dom_bytes=size)
+            self.assertIsInstance(doc, xml4h.nodes.Document)
+            self.assertEqual(41, len(doc.find()))
+            if hasattr(to_parse, 'seek'):
+                to_parse.seek(0)
+        # Larger inputs are refused with guidance by default
+        for to_parse in sources:
+            try:
+                xml4h.parse(to_parse, adapter=self.adapter,
+                    max_dom_bytes=size - 1)
+                self.fail('Expected DocumentTooLargeException')
+            except xml4h.exceptions.DocumentTooLargeException as ex:
+                self.assertEqual(size, ex.size)
+                self.assertEqual(size - 1, ex.max_dom_bytes)
+                self.assertTrue('iterparse' in str(ex))
+        # Inputs of unknown size are not checked
+        self.assertIsInstance(xml4h.parse(_UnsizedReader(xml_bytes), adapter=self.adapter,
+            max_dom_bytes=1), xml4h.nodes.Document)
+        # Unknown actions are refused whatever the size of the input
+        for max_dom_bytes in (1, size):
+            self.assertRaises(ValueError, xml4h.parse, xml_bytes,
+                adapter=self.adapter, max_dom_bytes=max_dom_bytes,
+                on_oversize='strem')
+        # Text is measured by its size in UTF-8
+        xml_text = u'<a>' + u'\u00e9' * 10 + u'</a>'
+        for max_dom_bytes in (16, 20):
+            try:
+                xml4h.parse(xml_text, adapter=self.adapter,
+                    max_dom_bytes=max_dom_bytes)
+                self.fail('Expected DocumentTooLargeException')
+            except xml4h.exceptions.DocumentTooLargeException as ex:
+                self.assertEqual(27, ex.size)
+        self.assertEqual(u'\u00e9' * 10, xml4h.parse(xml_text,
+            adapter=self.adapter, max_dom_bytes=27).root.text)
+        if not self.adapter.has_feature('iterparse'):
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.parse, xml_bytes, adapter=self.adapter,
+                max_dom_bytes=1, on_oversize='stream')
+            return
+        # Or are streamed, in a forward-only pass for each find
+        for to_parse in sources:
+            doc = xml4h.parse(to_parse, adapter=self.adapter,
+                max_dom_bytes=1, on_oversize='stream')
+            self.assertIsInstance(doc, xml4h.StreamingDocument)
+            self.assertTrue(doc.is_streaming)
+            self.assertEqual(self.adapter, doc.adapter_class)
+            self.assertEqual(['1'] * 20, [r['id'] for r in doc.find('Record')])
+            self.assertEqual(['1'] * 20,
+                [r['id'] for r in doc.iter_find('Record')])
+            self.assertEqual('Record', doc.find_first('Record').name)
+            self.assertEqual(None, doc.find_first('Missing'))
+            self.assertEqual(41, len(list(doc)))
+            self.assertRaises(AttributeError, getattr, doc, 'root')
+        # A source that cannot be rewound can only be streamed once
+        doc = xml4h.StreamingDocument(_UnsizedReader(xml_bytes),
+            adapter=self.adapter)
+        self.assertEqual(20, len(list(doc.find('Record'))))
+        self.assertRaises(ValueError, doc.find, 'Record')
+
+    def test_parse_stream_of_documents(self):
+        xml_bytes = b''.join(
+            b'<?xml version="1.0" encoding="utf-8"?>'
+            b'<Event id="%d"><Name> n%d </Name>  </Event>\n' % (i, i)
+            for i in range(50))
+        xml_bytes += b'<!-- Final event --><Event id="50"/>'
+        expected = [str(i) for i in range(51)]
+
+        def event_ids(to_parse, **kwargs):
+            docs = xml4h.parse_stream_of_documents(
+                to_parse, adapter=self.adapter, **kwargs)
+            return [doc.root['id'] for doc in docs]
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        xml_path = os.path.join(tmp_dir, 'events.xml')
+        with open(xml_path, 'wb') as f:
+            f.write(xml_bytes)
+        gz_path = os.path.join(tmp_dir, 'events.xml.gz')
+        with gzip.open(gz_path, 'wb') as f:
+            f.write(xml_bytes)
+        for to_parse in (xml_bytes, bytearray(xml_bytes), xml_path,
+                         gz_path, six.BytesIO(xml_bytes)):
+            self.assertEqual(expected, event_ids(to_parse))
+        # Documents are parsed and stripped of whitespace like any other
+        docs = list(xml4h.parse_stream_of_documents(
+            xml_bytes, adapter=self.adapter))
+        self.assertIsInstance(docs[0], xml4h.nodes.Document)
+        self.assertEqual(self.adapter, docs[0].adapter_class)
+        self.assertEqual(u' n0 ', docs[0].root.Name.text)
+        self.assertEqual(1, len(docs[0].root.children))
+        doc = next(xml4h.parse_stream_of_documents(
+            xml_bytes, ignore_whitespace_text_nodes=False,
+            adapter=self.adapter))
+        self.assertEqual(
+            len(xml4h.parse(xml_bytes.splitlines()[0], adapter=self.adapter,
+                ignore_whitespace_text_nodes=False).root.children),
+            len(doc.root.children))
+        # Lines that are not exactly one document are split by their markup
+        self.assertEqual(['1', '2', '3', '4', '5'], event_ids(
+            b'<Event id="1"/><Event id="2"/>\n'
+            b'<?xml version="1.0"?>\n<Event id="3">\n<Name/>\n</Event>\n'
+            b'<!-- comment -->\n<Event id="4"/>\n<Event id="5"/>'))
+        # Text without encoding declarations is parsed as text
+        self.assertEqual(['1', '2'],
+            event_ids(u'<Event id="1"/>\n<Event id="2"><\u00e9/></Event>'))
+        # Limits are enforced for each document
+        self.assertEqual(expected, event_ids(
+            xml_bytes, limits=xml4h.ParseLimits(max_depth=2)))
+        self.assertRaises(xml4h.exceptions.ParseLimitExceededException,
+            event_ids, xml_bytes, limits=xml4h.ParseLimits(max_depth=1))
+        # Documents are yielded until a malformed one is reached
+        docs = xml4h.parse_stream_of_documents(
+            b'<a/><b></a><c/>', adapter=self.adapter)
+        self.assertEqual('a', next(docs).root.name)
+        self.assertRaises(Exception, next, docs)
+
+    def test_follow(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        log_path = os.path.join(tmp_dir, 'events.xml')
+        if not self.adapter.has_feature('iterparse'):
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.follow, log_path, 'Event', adapter=self.adapter)
+            return
+
+        def write(data, mode='ab'):
+            with open(log_path, mode) as f:
+                f.write(data)
+
+        write(b'<?xml version="1.0"?>\n<Log>\n  <Event id="1"/>\n'
+              b'  <Event id="2"><Message>Started</Message></Ev', 'wb')
+        events = xml4h.follow(log_path, 'Event', poll_interval=0.01,
+            idle_timeout=0.5, adapter=self.adapter)
+        event = next(events)
+        self.assertEqual('1', event['id'])
+        # Records are yielded once they are completely written
+        write(b'ent>\n  <Event id="3"/>')
+        event = next(events)
+        self.assertEqual(('2', 'Started'), (event['id'], event.Message.text))
+        self.assertEqual('Log', event.parent.name)
+        self.assertEqual('3', next(events)['id'])
+        # The rest of a rotated log is read before the new log is followed
+        write(b'\n  <Event id="4"/>')
+        os.rename(log_path, log_path + '.1')
+        write(b'<?xml version="1.0"?>\n<Log>\n  <Event id="5"/>\n', 'wb')
+        self.assertEqual(['4', '5'], [next(events)['id'] for _ in range(2)])
+        # Truncated logs are followed from their start
+        with open(log_path, 'r+b') as f:
+            f.truncate(0)
+            f.write(b'<Log><Event id="6"/>')
+        # Following stops once the log is idle
+        self.assertEqual(['6'], [e['id'] for e in events])
+        # Logs are followed from when they are created, and malformed data
+        # is reported
+        os.remove(log_path)
+        events = xml4h.follow(log_path, 'Event', poll_interval=0.01,
+            idle_timeout=0.5, adapter=self.adapter)
+        write(b'<Log><Event id="7"/>')
+        self.assertEqual('7', next(events)['id'])
+        write(b'<Event></Log>')
+        self.assertRaises(Exception, next, events)
+
+    def test_iterparse_text_with_declared_encoding(self):
+        if not self.adapter.has_feature('iterparse'):
+            return
+        xml_text = (u'<?xml version="1.0" encoding="iso-8859-1"?>'
+                    u'<a><b>caf\xe9</b></a>')
+        self.assertEqual([u'caf\xe9'], [n.text for n in xml4h.iterparse(
+            xml_text, tag='b', adapter=self.adapter)])
+        # Bytes are decoded per the declared encoding
+        self.assertEqual([u'caf\xe9'], [n.text for n in xml4h.iterparse(
+            xml_text.encode('iso-8859-1'), tag='b', adapter=self.adapter)])
+
 
 class TestXmlDomParser(unittest.TestCase, BaseParserTest):
 
@@ -138,6 +746,17 @@ class TestElementTreeEtreeParser(unittest.TestCase, BaseParserTest):
                 "ElementTree library is not installed or is outdated")
         return xml4h.ElementTreeAdapter
 
+    def test_iterparse_parent_lookup_is_local(self):
+        xml_bytes = b'<Records>' + b'<Record><Name/></Record>' * 50 + (
+            b'</Records>')
+        for record in xml4h.iterparse(
+                xml_bytes, tag='Record', adapter=self.adapter):
+            self.assertEqual('Records', record.parent.name)
+            self.assertEqual(record, record.Name.parent)
+            # Ancestry covers only the open elements and the current record,
+            # not the whole of the partly-parsed document
+            self.assertEqual(2, len(record.adapter.CACHED_ANCESTRY_DICT))
+
 
 class TestcElementTreeEtreeParser(unittest.TestCase, BaseParserTest):
 
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import xml4h
+
+
+class TestAdapterProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        # Rank the least-preferred adapter first for every workload, so
+        # profiled choices differ from the best adapter
+        self.adapters = xml4h._available_adapters()
+        self.timings = dict(
+            (workload, dict((adapter.__name__, float(-i))
+                            for i, adapter in enumerate(self.adapters)))
+            for workload in xml4h.AdapterProfile.WORKLOADS)
+        self.timings['find']['NotARealAdapter'] = -100.0
+        self.profile = xml4h.AdapterProfile(self.timings)
+        original_profile = xml4h.adapter_profile
+
+        def restore_profile():
+            xml4h.adapter_profile = original_profile
+        self.addCleanup(restore_profile)
+
+    def test_ranking_and_preferred_adapter(self):
+        self.assertEqual(
+            [adapter.__name__ for adapter in reversed(self.adapters)],
+            self.profile.ranking('parse'))
+        self.assertEqual(self.adapters[-1],
+            self.profile.preferred_adapter('parse'))
+        # Adapters that are not available are skipped
+        self.assertEqual('NotARealAdapter', self.profile.ranking('find')[0])
+        self.assertEqual(self.adapters[-1],
+            self.profile.preferred_adapter('find'))
+        self.assertEqual(None,
+            xml4h.AdapterProfile({}).preferred_adapter('parse'))
+
+    def test_save_and_load(self):
+        path = os.path.join(self.tmp_dir, 'adapters.json')
+        self.profile.save(path)
+        loaded = xml4h.AdapterProfile.load(path)
+        self.assertEqual(self.timings, loaded.timings)
+        with open(path, 'w') as f:
+            f.write('{"version": 999, "timings": {}}')
+        self.assertRaises(ValueError, xml4h.AdapterProfile.load, path)
+
+    def test_from_environment(self):
+        path = os.path.join(self.tmp_dir, 'adapters.json')
+        self.profile.save(path)
+        variable = xml4h.AdapterProfile.PATH_ENVIRONMENT_VARIABLE
+        original = os.environ.pop(variable, None)
+        try:
+            self.assertEqual(None, xml4h.AdapterProfile.from_environment())
+            os.environ[variable] = path
+            self.assertEqual(self.timings,
+                xml4h.AdapterProfile.from_environment().timings)
+        finally:
+            os.environ.pop(variable, None)
+            if original is not None:
+                os.environ[variable] = original
+
+    def test_select_adapter(self):
+        xml4h.adapter_profile = None
+        for workload in (None, ) + xml4h.AdapterProfile.WORKLOADS:
+            self.assertEqual(xml4h.best_adapter,
+                xml4h.select_adapter(workload))
+        self.assertRaises(ValueError, xml4h.select_adapter, 'juggle')
+        xml4h.adapter_profile = self.profile
+        self.assertEqual(xml4h.best_adapter, xml4h.select_adapter())
+        for workload in xml4h.AdapterProfile.WORKLOADS:
+            self.assertEqual(self.adapters[-1],
+                xml4h.select_adapter(workload))
+
+    def test_parse_and_build_use_profile(self):
+        xml4h.adapter_profile = xml4h.AdapterProfile({
+            'parse': {self.adapters[-1].__name__: 1.0},
+            'build': {self.adapters[0].__name__: 1.0},
+            })
+        self.assertEqual(self.adapters[-1],
+            xml4h.parse(b'<a/>').adapter_class)
+        self.assertEqual(self.adapters[0],
+            xml4h.build('a').document.adapter_class)
+        # Explicit adapters are always used
+        self.assertEqual(self.adapters[0],
+            xml4h.parse(b'<a/>', adapter=self.adapters[0]).adapter_class)
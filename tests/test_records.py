@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import xml4h
+from xml4h import records
+
+
+class BaseRecordIndexTest(object):
+
+    xml_bytes = (
+        b'<?xml version="1.0" encoding="utf-8"?>\n'
+        b'<db xmlns="urn:d" xmlns:a="urn:a">\n'
+        b'  <rec id="r1" note="a&gt;b > c"/>\n'
+        b'  <rec id="r2"><a:v>2</a:v><rec id="inner"/></rec >\n'
+        b'  <group xmlns:b="urn:b">\n'
+        b'    <rec id="r3" xmlns:a="urn:a2"><b:x a:y="1">  </b:x></rec>\n'
+        b'  </group>\n'
+        b'  <a:rec id="r4"/>\n'
+        b'</db>')
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = self.write_file('records.xml', self.xml_bytes)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, xml_bytes):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(xml_bytes)
+        return path
+
+    def test_build_and_get_by_position(self):
+        index = xml4h.RecordIndex.build(
+            self.path, 'rec', ns_uri='urn:d', adapter=self.adapter)
+        self.assertEqual(3, len(index))
+        self.assertTrue(os.path.exists(self.path + '.xml4h-index'))
+        self.assertEqual(b'<rec id="r1" note="a&gt;b > c"/>',
+            index.get_bytes(0))
+        self.assertEqual(
+            b'<rec id="r2"><a:v>2</a:v><rec id="inner"/></rec >',
+            index.get_bytes(1))
+        record = index.get(1)
+        self.assertIsInstance(record, xml4h.nodes.Element)
+        self.assertEqual(self.adapter, type(record.adapter))
+        self.assertEqual('r2', record['id'])
+        self.assertEqual('urn:d', record.namespace_uri)
+        # Namespaces declared outside the record are in scope
+        self.assertEqual('urn:a', record.children[0].namespace_uri)
+        self.assertEqual(['v', 'rec'], [n.local_name for n in record.children])
+        self.assertEqual('r3', index.get(-1)['id'])
+        self.assertRaises(IndexError, index.get, 3)
+        self.assertRaises(KeyError, index.get, 'r1')
+
+    def test_get_by_key(self):
+        index = xml4h.RecordIndex.build(
+            self.path, 'rec', key_attr='id', adapter=self.adapter)
+        self.assertEqual(['r1', 'r2', 'r3', 'r4'], index.keys())
+        record = index.get('r3')
+        self.assertEqual(2, index.position('r3'))
+        self.assertEqual('urn:d', record.namespace_uri)
+        child = record.children[0]
+        self.assertEqual('urn:b', child.namespace_uri)
+        # The record's own declaration overrides the outer one
+        self.assertEqual('urn:a2', child.attribute_node('a:y').namespace_uri)
+        # Whitespace is stripped, as when parsing
+        self.assertEqual([], child.children)
+        self.assertEqual('urn:a', index['r4'].namespace_uri)
+        self.assertRaises(KeyError, index.get, 'inner')
+
+    def test_load_sidecar(self):
+        index_path = os.path.join(self.temp_dir, 'custom.idx')
+        xml4h.RecordIndex.build(self.path, 'rec', key_attr='id',
+            index_path=index_path, adapter=self.adapter)
+        index = xml4h.RecordIndex.load(
+            self.path, index_path=index_path, adapter=self.adapter)
+        self.assertEqual(4, len(index))
+        self.assertEqual('r4', index.get(3)['id'])
+        self.assertEqual('r2', index.get('r2')['id'])
+        # A changed file needs a new index
+        time.sleep(0.01)
+        self.write_file('records.xml', self.xml_bytes + b'\n')
+        self.assertRaises(ValueError, xml4h.RecordIndex.load,
+            self.path, index_path=index_path, adapter=self.adapter)
+
+    def test_scan_across_reads(self):
+        original_read_size = records._RecordScanner.READ_SIZE
+        records._RecordScanner.READ_SIZE = 3
+        try:
+            index = xml4h.RecordIndex.build(
+                self.path, 'rec', key_attr='id', adapter=self.adapter)
+        finally:
+            records._RecordScanner.READ_SIZE = original_read_size
+        self.assertEqual(4, len(index))
+        self.assertEqual(b'<a:rec id="r4"/>', index.get_bytes('r4'))
+
+    def test_declared_encoding(self):
+        xml_bytes = (
+            u'<?xml version="1.0" encoding="iso-8859-1"?>\n'
+            u'<r>%s</r>' % ''.join(
+                u'<e k="%d">café %d</e>' % (n, n) for n in range(50))
+            ).encode('iso-8859-1')
+        path = self.write_file('latin1.xml', xml_bytes)
+        index = xml4h.RecordIndex.build(
+            path, 'e', key_attr='k', adapter=self.adapter)
+        self.assertEqual(50, len(index))
+        self.assertEqual(u'café 42', index.get('42').text)
+
+
+class TestXmlDomRecordIndex(BaseRecordIndexTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.XmlDomImplAdapter
+
+
+class TestLXMLEtreeRecordIndex(BaseRecordIndexTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.LXMLAdapter.is_available():
+            self.skipTest("lxml library is not installed")
+        return xml4h.LXMLAdapter
+
+
+class TestElementTreeRecordIndex(BaseRecordIndexTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.ElementTreeAdapter.is_available():
+            self.skipTest(
+                "ElementTree library is not installed or is outdated")
+        return xml4h.ElementTreeAdapter
+
+
+class TestcElementTreeRecordIndex(BaseRecordIndexTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.cElementTreeAdapter.is_available():
+            self.skipTest(
+                "cElementTree library is not installed or is outdated")
+        return xml4h.cElementTreeAdapter
@@ -4,6 +4,7 @@ import functools
 import six
 
 import xml4h
+from tests import build_deep_document
 
 
 class BaseWriterTest(object):
@@ -130,6 +131,28 @@ class BaseWriterTest(object):
             u'</DocRoot>\t'.encode('utf-8'),
             self.iobytes.getvalue())
 
+    def test_preserve_attribute_order(self):
+        elem = (self.my_builder('DocRoot')
+            .attributes(zebra='1').attributes(apple='2')
+            .attributes(mango='3 & 4'))
+        self.assertEqual(
+            '<DocRoot apple="2" mango="3 &amp; 4" zebra="1"/>',
+            elem.dom_element.xml(indent=False))
+        self.assertEqual(
+            '<DocRoot zebra="1" apple="2" mango="3 &amp; 4"/>',
+            elem.dom_element.xml(indent=False,
+                preserve_attribute_order=True))
+
+    def test_write_deep_document(self):
+        depth = 50000
+        doc = build_deep_document(self.adapter, depth,
+            root_name='DocRoot', name='E', leaf_text='leaf')
+        xml = doc.xml(indent=False, omit_declaration=True)
+        self.assertEqual(
+            '<DocRoot>' + '<E>' * depth + 'leaf' + '</E>' * depth
+            + '</DocRoot>',
+            xml)
+
 
 class TestXmlDomBuilder(BaseWriterTest, unittest.TestCase):
     """
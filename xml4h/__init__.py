@@ -1,13 +1,28 @@
+import collections
+import contextlib
+import functools
+import importlib
+import itertools
+import mmap
+import os
+import sys
+
 import six
 
 import xml4h
+# Keep the node classes and adapter interface available as before adapters
+# were imported lazily, since they are light to import
+import xml4h.impls.interface
+import xml4h.nodes
 
 # Make commonly-used classes and functions available in xml4h module
-from xml4h.impls.xml_dom_minidom import XmlDomImplAdapter
-from xml4h.impls.xml_etree_elementtree import (
-    ElementTreeAdapter, cElementTreeAdapter)
-from xml4h.impls.lxml_etree import LXMLAdapter
 from xml4h.builder import Builder
+from xml4h.feed import FeedParser
+from xml4h.cache import ParseCache
+from xml4h.limits import ParseLimits
+from xml4h.profile import AdapterProfile
+from xml4h.records import RecordIndex
+from xml4h.streaming import StreamingDocument, follow
 from xml4h.writer import write_node
 
 
@@ -15,65 +30,635 @@ __title__ = 'xml4h'
 __version__ = '1.0'
 
 
-# List of xml4h adapter classes, in order of preference
-_ADAPTER_CLASSES = [
-    LXMLAdapter,
-    cElementTreeAdapter,
-    ElementTreeAdapter,
-    XmlDomImplAdapter]
+# Names of the xml4h adapter classes, in order of preference, and of the
+# module defining each. Adapter modules import their XML library, so they
+# are only imported when an adapter is first used to keep `import xml4h`
+# fast.
+_ADAPTER_CLASS_MODULES = collections.OrderedDict([
+    ('LXMLAdapter', 'xml4h.impls.lxml_etree'),
+    ('cElementTreeAdapter', 'xml4h.impls.xml_etree_elementtree'),
+    ('ElementTreeAdapter', 'xml4h.impls.xml_etree_elementtree'),
+    ('XmlDomImplAdapter', 'xml4h.impls.xml_dom_minidom'),
+    ])
 
-_ADAPTERS_AVAILABLE = []
-_ADAPTERS_UNAVAILABLE = []
+# Other names made available in xml4h module on first use, and the module
+# defining each
+_LAZY_NAME_MODULES = {}
+if six.PY3:
+    _LAZY_NAME_MODULES.update(aparse='xml4h.aio', awrite_node='xml4h.aio')
+
+
+def _import_lazy_name(name):
+    """
+    Import the adapter class or other lazily-imported object with the given
+    name, and make it a module attribute so later lookups are direct.
+    """
+    module_name = _ADAPTER_CLASS_MODULES.get(name) or _LAZY_NAME_MODULES[name]
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def _find_best_adapter():
+    """
+    Return the first available adapter class in order of preference,
+    without importing the libraries of less-preferred adapters.
+    """
+    for name in _ADAPTER_CLASS_MODULES:
+        adapter = getattr(xml4h, name)
+        if adapter.is_available():
+            return adapter
+    raise xml4h.exceptions.Xml4hImplementationBug(
+        'No xml4h adapter is available')
+
+
+_AVAILABLE_ADAPTERS = None
+
+
+def _available_adapters():
+    """
+    Return the adapter classes available in the Python environment, in
+    order of preference.
+    """
+    global _AVAILABLE_ADAPTERS
+    if _AVAILABLE_ADAPTERS is None:
+        _AVAILABLE_ADAPTERS = [
+            adapter for adapter in
+            (getattr(xml4h, name) for name in _ADAPTER_CLASS_MODULES)
+            if adapter.is_available()]
+    return list(_AVAILABLE_ADAPTERS)
 
-for impl_class in _ADAPTER_CLASSES:
-    if impl_class.is_available():
-        _ADAPTERS_AVAILABLE.append(impl_class)
-    else:
-        _ADAPTERS_UNAVAILABLE.append(impl_class)
 
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        """
+        Import adapter classes, find the best adapter, and load the adapter
+        profile on first use.
+        """
+        if name in _ADAPTER_CLASS_MODULES or name in _LAZY_NAME_MODULES:
+            return _import_lazy_name(name)
+        elif name == 'best_adapter':
+            global best_adapter
+            best_adapter = _find_best_adapter()
+            return best_adapter
+        elif name == 'adapter_profile':
+            global adapter_profile
+            adapter_profile = AdapterProfile.from_environment()
+            return adapter_profile
+        raise AttributeError(
+            "module '%s' has no attribute '%s'" % (__name__, name))
+else:
+    # Module attributes cannot be looked up lazily before Python 3.7
+    for _name in list(_ADAPTER_CLASS_MODULES) + list(_LAZY_NAME_MODULES):
+        _import_lazy_name(_name)
 
-best_adapter = _ADAPTERS_AVAILABLE[0]
-"""
-The :ref:`best adapter available <best-adapter>` in the Python environment.
-This adapter is the default when parsing or creating XML documents,
-unless overridden by passing a specific adapter class.
-"""
+    best_adapter = _find_best_adapter()
+    """
+    The :ref:`best adapter available <best-adapter>` in the Python
+    environment. This adapter is the default when parsing or creating XML
+    documents, unless overridden by passing a specific adapter class.
+
+    With Python 3.7 and later, the best adapter is found when it is first
+    used rather than when *xml4h* is imported.
+    """
+
+    adapter_profile = AdapterProfile.from_environment()
+    """
+    The :class:`~xml4h.AdapterProfile` used by :func:`select_adapter` to
+    choose adapters for each kind of workload, or *None* to use
+    :attr:`best_adapter` for all workloads. This is loaded from the path in
+    the ``XML4H_ADAPTER_PROFILE`` environment variable, if it is set.
+    """
+
+
+def select_adapter(workload=None):
+    """
+    Return the adapter class best suited to a kind of workload, according
+    to the :attr:`adapter_profile` if there is one, otherwise return
+    :attr:`best_adapter`.
+
+    :param workload: one of the :attr:`AdapterProfile.WORKLOADS` the adapter
+        will mostly be used for: ``'parse'``, ``'find'``, ``'write'`` or
+        ``'build'``. If *None*, :attr:`best_adapter` is returned.
+    :type workload: string or None
+
+    :raise: ValueError for an unknown workload.
+
+    :func:`parse` and :func:`build` select their default adapters for the
+    ``'parse'`` and ``'build'`` workloads respectively. To choose an
+    adapter for other work on parsed documents, pass it to :func:`parse`::
+
+        doc = xml4h.parse(path, adapter=xml4h.select_adapter('find'))
+    """
+    if workload is None:
+        return xml4h.best_adapter
+    if workload not in AdapterProfile.WORKLOADS:
+        raise ValueError("Unknown workload '%s'" % workload)
+    if xml4h.adapter_profile is not None:
+        adapter = xml4h.adapter_profile.preferred_adapter(workload)
+        if adapter is not None:
+            return adapter
+    return xml4h.best_adapter
 
 
 def parse(
-    to_parse, ignore_whitespace_text_nodes=True, adapter=None
+    to_parse, ignore_whitespace_text_nodes=True, adapter=None,
+    source_type=None, cache=None, keep=None, limits=None,
+    max_dom_bytes=None, on_oversize='raise'
 ):
     """
     Parse an XML document into an *xml4h*-wrapped DOM representation
     using an underlying XML library implementation.
 
-    :param to_parse: an XML document file, document bytes, or the
-        path to an XML file. If a bytes value is given that contains
-        a ``<`` character it is treated as literal XML data, otherwise
-        a bytes value is treated as a file path.
-    :type to_parse: a file-like object or string
+    :param to_parse: an XML document file, document bytes, the
+        path to an XML file, or a ``bytearray``, ``memoryview`` or
+        ``mmap.mmap`` buffer of document bytes. If a bytes value is given
+        that contains a ``<`` character it is treated as literal XML data,
+        otherwise a bytes value is treated as a file path.
+        Buffers are parsed without copying their data where the adapter
+        allows it. Files, paths and bytes compressed with gzip, bzip2 or
+        xz are decompressed as a stream while parsing.
+    :type to_parse: a file-like object, string or buffer
     :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
         nodes are stripped from the parsed document, since these are
         usually noise introduced by XML docs serialized to be human-friendly.
     :param adapter: the *xml4h* implementation adapter class used to parse
         the document and to interact with the resulting nodes.
-        If None, :attr:`best_adapter` will be used.
+        If None, the adapter selected for the ``'parse'`` workload by
+        :func:`select_adapter` will be used.
     :type adapter: adapter class or None
+    :param source_type: the kind of data in ``to_parse``, one of
+        ``'bytes'``, ``'string'``, ``'buffer'`` or ``'file'`` for a file or
+        file path. If None the kind is detected, which for bytes and strings
+        means searching the data for a ``<`` character, so set this to skip
+        that search for large inputs.
+    :type source_type: string or None
+    :param cache: a cache to return a copy of an already parsed document
+        from, or to add the parsed document to.
+    :type cache: :class:`~xml4h.cache.ParseCache` or None
+    :param keep: element paths or ``(name, ns_uri)`` tuples of the elements
+        to keep, discarding all other elements while parsing except the
+        ancestors of those kept. A path starting with ``/`` is matched from
+        the root element, otherwise paths are matched at any depth.
+        If None the whole document is kept.
+    :type keep: list or None
+    :param limits: resource limits to enforce while parsing, raising
+        :class:`~xml4h.exceptions.ParseLimitExceededException` as soon as
+        the document exceeds one.
+    :type limits: :class:`~xml4h.ParseLimits` or None
+    :param max_dom_bytes: the size in bytes of the largest input to build
+        a whole document from, to avoid running out of memory. This is only
+        checked for inputs whose size is known before parsing: file paths,
+        seekable files, bytes, text and buffers. The size of a compressed
+        input is its compressed size.
+        If None, documents of any size are built.
+    :type max_dom_bytes: int or None
+    :param string on_oversize: what to do with an input larger than
+        ``max_dom_bytes``: ``'raise'`` to raise a
+        :class:`~xml4h.exceptions.DocumentTooLargeException`, or
+        ``'stream'`` to return a :class:`~xml4h.streaming.StreamingDocument`
+        that finds elements in forward-only passes over the input instead.
 
     :return: an :class:`xml4h.nodes.Document` node representing the
-        parsed document.
+        parsed document, or a :class:`~xml4h.streaming.StreamingDocument`
+        for an oversized input with ``on_oversize='stream'``.
 
-    Delegates to an adapter's :meth:`~xml4h.impls.interface.parse_string` or
+    Delegates to an adapter's :meth:`~xml4h.impls.interface.parse_string`,
+    :meth:`~xml4h.impls.interface.parse_bytes`,
+    :meth:`~xml4h.impls.interface.parse_buffer` or
     :meth:`~xml4h.impls.interface.parse_file` implementation.
     """
     if adapter is None:
-        adapter = best_adapter
+        adapter = select_adapter('parse')
+    if max_dom_bytes is not None:
+        if on_oversize not in ('raise', 'stream'):
+            raise ValueError("Unknown on_oversize '%s'" % on_oversize)
+        if _is_source_larger_than(to_parse, source_type, max_dom_bytes):
+            if on_oversize == 'stream':
+                return StreamingDocument(to_parse,
+                    ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+                    adapter=adapter, limits=limits)
+            raise xml4h.exceptions.DocumentTooLargeException(
+                _known_source_size(to_parse, source_type), max_dom_bytes)
+    if cache is not None:
+        return cache.parse(to_parse, ignore_whitespace_text_nodes,
+            adapter=adapter, source_type=source_type, keep=keep,
+            limits=limits)
+    if source_type in (None, 'bytes', 'file'):
+        compressed_file = _open_decompressed(to_parse)
+        if compressed_file is not None:
+            with contextlib.closing(compressed_file):
+                return adapter.parse_file(
+                    compressed_file, ignore_whitespace_text_nodes, keep=keep,
+                    limits=limits)
+    if source_type is None:
+        source_type = _detect_source_type(to_parse)
+    if source_type == 'bytes':
+        return adapter.parse_bytes(
+            to_parse, ignore_whitespace_text_nodes, keep=keep, limits=limits)
+    elif source_type == 'string':
+        return adapter.parse_string(
+            to_parse, ignore_whitespace_text_nodes, keep=keep, limits=limits)
+    elif source_type == 'buffer':
+        return adapter.parse_buffer(
+            to_parse, ignore_whitespace_text_nodes, keep=keep, limits=limits)
+    elif source_type == 'file':
+        return adapter.parse_file(
+            to_parse, ignore_whitespace_text_nodes, keep=keep, limits=limits)
+    else:
+        raise ValueError("Unknown source_type '%s'" % source_type)
+
+
+def _known_source_size(to_parse, source_type=None):
+    """
+    Return the size in bytes of the given input for :func:`parse`, or None
+    if it cannot be known without reading the input.
+    """
+    if isinstance(to_parse, mmap.mmap):
+        return len(to_parse) - to_parse.tell()
+    if hasattr(to_parse, 'read'):
+        try:
+            return os.fstat(to_parse.fileno()).st_size - to_parse.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+    if source_type is None:
+        source_type = _detect_source_type(to_parse)
+    if source_type == 'file':
+        try:
+            return os.path.getsize(to_parse)
+        except (IOError, OSError):
+            return None
+    if isinstance(to_parse, six.text_type):
+        return _utf8_size(to_parse)
+    return memoryview(to_parse).nbytes
+
+
+def _is_source_larger_than(to_parse, source_type, max_bytes):
+    """
+    Return True if the given input for :func:`parse` is known to be larger
+    than ``max_bytes``.
+    """
+    if source_type is None and not hasattr(to_parse, 'read'):
+        source_type = _detect_source_type(to_parse)
+    if source_type == 'string':
+        # Each character is one to four bytes in UTF-8, which decides the
+        # size of most text without measuring it
+        if len(to_parse) > max_bytes:
+            return True
+        elif len(to_parse) * 4 <= max_bytes:
+            return False
+    size = _known_source_size(to_parse, source_type)
+    return size is not None and size > max_bytes
+
+
+_SIZE_SLICE_LENGTH = 1024 * 1024
+
+
+def _utf8_size(text):
+    """
+    Return the size in bytes of the given text encoded as UTF-8, encoding it
+    a slice at a time rather than copying the whole text.
+    """
+    return sum(len(text[i:i + _SIZE_SLICE_LENGTH].encode('utf-8'))
+               for i in range(0, len(text), _SIZE_SLICE_LENGTH))
+
+
+def _detect_source_type(to_parse):
+    """
+    Return the ``source_type`` for :func:`parse` that suits the given data.
+    """
+    if isinstance(to_parse, (bytearray, memoryview, mmap.mmap)):
+        return 'buffer'
+    elif isinstance(to_parse, six.binary_type) and b'<' in to_parse:
+        return 'bytes'
+    elif isinstance(to_parse, six.string_types) and '<' in to_parse:
+        return 'string'
+    else:
+        return 'file'
+
+
+def iterparse(
+    to_parse, tag=None, ns_uri=None, ignore_whitespace_text_nodes=True,
+    adapter=None, limits=None
+):
+    """
+    Incrementally parse an XML document, yielding *xml4h*-wrapped
+    :class:`~xml4h.nodes.Element` nodes as each matching element is
+    completed. This lets you process huge documents made up of many
+    repeated records without building the whole DOM in memory.
+
+    Each yielded element is cleared, along with its preceding siblings,
+    once you move on to the next one so you must extract any data you need
+    from an element before advancing the iterator.
+
+    :param to_parse: an XML document file, document bytes, the path to
+        an XML file, or a buffer of document bytes, as for :func:`parse`.
+        A text string of literal XML is parsed as text, so any encoding it
+        declares is ignored. Compressed data is decompressed as it is parsed.
+    :type to_parse: a file-like object, string or buffer
+    :param tag: only yield elements with this local name.
+        If *None* all element names are matched.
+    :type tag: string or None
+    :param ns_uri: only yield elements within this namespace URI.
+        If *None* all elements are matched, regardless of namespace.
+    :type ns_uri: string or None
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from each yielded element.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the document and to interact with the resulting nodes.
+        If None, :attr:`best_adapter` will be used.
+    :type adapter: adapter class or None
+    :param limits: resource limits to enforce across the whole document,
+        raising :class:`~xml4h.exceptions.ParseLimitExceededException`
+        from the generator as soon as the document exceeds one.
+    :type limits: :class:`~xml4h.ParseLimits` or None
+
+    :return: a generator of :class:`xml4h.nodes.Element` nodes.
+
+    :raise: :class:`~xml4h.exceptions.FeatureUnavailableException` if the
+        adapter does not support iterative parsing.
+
+    Delegates to an adapter's :meth:`~xml4h.impls.interface.iterparse`
+    implementation.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    if not adapter.has_feature('iterparse'):
+        raise xml4h.exceptions.FeatureUnavailableException('iterparse')
+    compressed_file = _open_decompressed(to_parse)
+    if compressed_file is not None:
+        return _close_when_done(
+            adapter.iterparse(compressed_file, tag=tag, ns_uri=ns_uri,
+                ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+                limits=limits),
+            compressed_file)
     if isinstance(to_parse, six.binary_type) and b'<' in to_parse:
-        return adapter.parse_bytes(to_parse, ignore_whitespace_text_nodes)
+        to_parse = six.BytesIO(to_parse)
+    elif isinstance(to_parse, six.string_types) and '<' in to_parse:
+        to_parse = six.StringIO(to_parse)
+    elif isinstance(to_parse, (bytearray, memoryview)):
+        to_parse = _BufferReader(to_parse)
+    return adapter.iterparse(to_parse, tag=tag, ns_uri=ns_uri,
+        ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+        limits=limits)
+
+
+# Leading "magic" bytes and usual file extensions of compressed data formats,
+# and the module that can decompress each format as a stream
+_COMPRESSION_FORMATS = [
+    (b'\x1f\x8b', '.gz', 'gzip'),
+    (b'BZh', '.bz2', 'bz2'),
+    (b'\xfd7zXZ\x00', '.xz', 'lzma'),
+    ]
+
+
+def _open_decompressed(to_parse):
+    """
+    Return a file object that decompresses the given data as it is read, if
+    it is compressed with a supported format, otherwise return None.
+
+    Compression is recognised by leading magic bytes, which are read from the
+    start of the file for file paths given as text or bytes, so a file's
+    extension does not matter. File-like objects must support ``peek`` or
+    ``seek`` to be recognised.
+    """
+    path = None
+    if hasattr(to_parse, 'read'):
+        if hasattr(to_parse, 'peek'):
+            head = to_parse.peek(8)[:8]
+        elif hasattr(to_parse, 'seek'):
+            position = to_parse.tell()
+            head = to_parse.read(8)
+            to_parse.seek(position)
+        else:
+            return None
+        if not isinstance(head, six.binary_type):
+            return None
+    elif isinstance(to_parse, six.binary_type):
+        head = to_parse[:8]
+        if b'<' not in to_parse and not any(
+                head.startswith(magic) for magic, _, _ in _COMPRESSION_FORMATS):
+            path = os.fsdecode(to_parse) if six.PY3 else to_parse
+    elif isinstance(to_parse, six.string_types) and '<' not in to_parse:
+        path = to_parse
+    else:
+        return None
+    if path is not None:
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(8)
+        except (IOError, OSError):
+            # Leave the parser to report a missing or unreadable file
+            return None
+    for magic, _, module_name in _COMPRESSION_FORMATS:
+        if not head.startswith(magic):
+            continue
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            return None
+        if path is not None:
+            return module.open(path, 'rb')
+        if isinstance(to_parse, six.binary_type):
+            to_parse = six.BytesIO(to_parse)
+        return module.open(to_parse, 'rb')
+    return None
+
+
+class _BufferReader(object):
+    """
+    Read-only file-like view of a buffer, which reads slices of the buffer
+    without copying the whole of it up front.
+    """
+
+    def __init__(self, xml_buffer):
+        self._view = memoryview(xml_buffer).cast('B') if six.PY3 else (
+            memoryview(xml_buffer))
+        self._position = 0
+
+    def read(self, size=-1):
+        start = self._position
+        if size is None or size < 0:
+            end = len(self._view)
+        else:
+            end = min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    def seek(self, position):
+        self._position = position
+
+    def tell(self):
+        return self._position
+
+
+def _close_when_done(generator, file_obj):
+    """
+    Yield the items of the given generator then close the given file.
+    """
+    try:
+        for item in generator:
+            yield item
+    finally:
+        file_obj.close()
+
+
+def parse_stream_of_documents(
+    to_parse, ignore_whitespace_text_nodes=True, adapter=None, limits=None
+):
+    """
+    Parse a stream of concatenated XML documents, such as a file with one
+    document per line or a log of documents appended one after another,
+    yielding each document as it is parsed.
+
+    The stream is read in a single pass. Each line is passed straight to
+    the parser as a document, and only lines that are not exactly one
+    document have their markup scanned to find where documents end. Where
+    the adapter's XML library allows it, as lxml does, one parser is reused
+    for all the documents instead of setting up a new parser for each::
+
+        for doc in xml4h.parse_stream_of_documents('events.xmll'):
+            print(doc.root.name)
+
+    :param to_parse: a file of concatenated documents, their bytes, the
+        path to such a file, or a buffer of document bytes.
+        Compressed data is decompressed as it is read.
+    :type to_parse: a file-like object, string or buffer
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from each parsed document.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the documents and to interact with the resulting nodes.
+        If None, :attr:`best_adapter` will be used.
+    :type adapter: adapter class or None
+    :param limits: resource limits to enforce for each document.
+    :type limits: :class:`~xml4h.ParseLimits` or None
+
+    :return: a generator of :class:`xml4h.nodes.Document` nodes.
+
+    Documents must be in an ASCII-compatible encoding such as UTF-8, though
+    each can declare its own such encoding. Any XML declaration, comments
+    or processing instructions between documents are parsed as part of the
+    document that follows them, unless they are on the same line as the
+    end of the document before them.
+
+    Run ``python -m xml4h.bench stream`` to compare this with calling
+    :func:`parse` for each line of a stream.
+
+    Delegates to an adapter's :meth:`~xml4h.impls.interface.parse_documents`
+    implementation.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    opened_file = _open_decompressed(to_parse)
+    if opened_file is not None:
+        xml_file = opened_file
+    elif hasattr(to_parse, 'read'):
+        xml_file = to_parse
+    elif isinstance(to_parse, six.binary_type) and b'<' in to_parse:
+        xml_file = six.BytesIO(to_parse)
     elif isinstance(to_parse, six.string_types) and '<' in to_parse:
-        return adapter.parse_string(to_parse, ignore_whitespace_text_nodes)
+        xml_file = six.StringIO(to_parse)
+    elif isinstance(to_parse, (bytearray, memoryview)):
+        xml_file = _BufferReader(to_parse)
     else:
-        return adapter.parse_file(to_parse, ignore_whitespace_text_nodes)
+        xml_file = opened_file = open(to_parse, 'rb')
+    documents = xml4h.streaming._parse_documents(xml_file,
+        ignore_whitespace_text_nodes, adapter=adapter, limits=limits)
+    if opened_file is None:
+        return documents
+    return _close_when_done(documents, opened_file)
+
+
+def parse_many(
+    to_parse_items, fn, workers=None, chunksize=16, ordered=True,
+    ignore_whitespace_text_nodes=True, adapter=None, limits=None
+):
+    """
+    Parse many XML documents in parallel on a pool of worker processes,
+    applying a function to each parsed document to extract the data you
+    need from it.
+
+    Parsed documents cannot be passed between processes, so the result of
+    the given function for each document is returned instead.
+
+    :param to_parse_items: an iterable of XML document file paths or
+        document bytes, as for :func:`parse`.
+    :param fn: a function that takes an :class:`xml4h.nodes.Document` node
+        and returns the data to extract from it. The function and its result
+        must be picklable, so the function must be defined at the top level
+        of a module.
+    :param workers: the number of worker processes.
+        If *None* the number of CPUs in the system is used.
+    :type workers: int or None
+    :param int chunksize: the number of documents sent to a worker process
+        at a time. Larger chunks reduce inter-process overhead for many
+        small documents.
+    :param bool ordered: if ``True`` results are returned in the same order
+        as the documents. If ``False`` each result is returned as soon as
+        its chunk is finished, as an ``(index, result)`` pair where
+        ``index`` is the position of the document in ``to_parse_items``.
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from the parsed documents.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the documents. If None, :attr:`best_adapter` will be used.
+    :type adapter: adapter class or None
+    :param limits: resource limits to enforce while parsing each document.
+        A :class:`~xml4h.exceptions.ParseLimitExceededException` for any
+        document is raised from the generator.
+    :type limits: :class:`~xml4h.ParseLimits` or None
+
+    :return: a generator of the function's results, which streams results
+        as they are available while further documents are parsed.
+
+    Requires the :mod:`concurrent.futures` module, which must be installed
+    as the `futures` backport package for Python 2.
+    """
+    import multiprocessing
+    from concurrent.futures import (
+        ProcessPoolExecutor, FIRST_COMPLETED, wait)
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    parse_chunk = functools.partial(
+        _parse_many_chunk, fn, ignore_whitespace_text_nodes, adapter, limits)
+    indexed_items = enumerate(to_parse_items)
+    chunks = iter(
+        lambda: list(itertools.islice(indexed_items, chunksize)), [])
+    with ProcessPoolExecutor(workers) as executor:
+        # Submit chunks lazily to keep a bounded number in flight, so huge
+        # inputs are not all queued for the workers up front
+        pending = collections.deque(
+            executor.submit(parse_chunk, chunk)
+            for chunk in itertools.islice(chunks, workers * 2))
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done = wait(pending, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(executor.submit(parse_chunk, chunk))
+                for index, result in future.result():
+                    if ordered:
+                        yield result
+                    else:
+                        yield index, result
+
+
+def _parse_many_chunk(fn, ignore_whitespace_text_nodes, adapter, limits,
+        chunk):
+    """
+    Parse each ``(index, to_parse)`` item in a chunk within a worker process
+    for :func:`parse_many` and return ``(index, fn(document))`` pairs.
+    """
+    return [
+        (index, fn(parse(to_parse, ignore_whitespace_text_nodes, adapter,
+                         limits=limits)))
+        for index, to_parse in chunk]
 
 
 def build(tagname_or_element, ns_uri=None, adapter=None):
@@ -91,14 +676,15 @@ def build(tagname_or_element, ns_uri=None, adapter=None):
     :type ns_uri: string or None
     :param adapter: the *xml4h* implementation adapter class used to
         interact with the document DOM nodes.
-        If None, :attr:`best_adapter` will be used.
+        If None, the adapter selected for the ``'build'`` workload by
+        :func:`select_adapter` will be used.
     :type adapter: adapter class or None
 
     :return: a :class:`~xml4h.builder.Builder` instance that represents an
         :class:`~xml4h.nodes.Element` node in an XML DOM.
     """
     if adapter is None:
-        adapter = best_adapter
+        adapter = select_adapter('build')
     if isinstance(tagname_or_element, six.string_types):
         doc = adapter.create_document(
             tagname_or_element, ns_uri=ns_uri)
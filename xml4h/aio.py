@@ -0,0 +1,241 @@
+"""
+Parse and write XML documents from asyncio code without blocking the
+event loop.
+
+The parsing and serialization work is done on a bounded pool of threads
+while the event loop reads input from, or writes output to, asynchronous
+streams.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+
+import xml4h
+
+
+DEFAULT_MAX_WORKERS = 4
+"""
+The number of threads in the executor shared by :func:`aparse` and
+:func:`awrite_node` calls that are not given their own executor.
+"""
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_default_executor = None
+
+
+def _get_default_executor():
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=DEFAULT_MAX_WORKERS)
+    return _default_executor
+
+
+async def aparse(source, ignore_whitespace_text_nodes=True, adapter=None,
+        executor=None, chunk_size=DEFAULT_CHUNK_SIZE, limits=None):
+    """
+    Coroutine to parse an XML document without blocking the event loop::
+
+        reader, writer = await asyncio.open_connection(host, port)
+        doc = await xml4h.aparse(reader)
+
+    :param source: an asynchronous stream of XML data, being either an
+        object like :class:`asyncio.StreamReader` whose ``read`` method is a
+        coroutine, or an asynchronous iterable of bytes or text chunks.
+        Any other source is parsed with :func:`xml4h.parse`.
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from the parsed document.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the document and to interact with the resulting nodes.
+        If None, :attr:`xml4h.best_adapter` will be used.
+    :type adapter: adapter class or None
+    :param executor: the executor on which parsing is done.
+        If *None* a shared pool of :data:`DEFAULT_MAX_WORKERS` threads
+        is used.
+    :type executor: :class:`concurrent.futures.Executor` or None
+    :param int chunk_size: the number of bytes to read from a stream
+        at a time.
+    :param limits: resource limits to enforce while parsing.
+    :type limits: :class:`~xml4h.ParseLimits` or None
+
+    :return: an :class:`xml4h.nodes.Document` node representing the
+        parsed document.
+
+    Each chunk read from a stream is passed to an :class:`xml4h.FeedParser`
+    on the executor while the event loop reads the next chunk. If the
+    adapter does not support feed parsing the whole stream is read, then
+    parsed.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    if executor is None:
+        executor = _get_default_executor()
+    loop = asyncio.get_event_loop()
+    if hasattr(source, '__aiter__'):
+        chunks = source.__aiter__()
+        next_chunk = functools.partial(_next_or_empty, chunks)
+    elif inspect.iscoroutinefunction(getattr(source, 'read', None)):
+        next_chunk = functools.partial(source.read, chunk_size)
+    else:
+        return await loop.run_in_executor(executor, functools.partial(
+            xml4h.parse, source,
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            adapter=adapter, limits=limits))
+
+    if not adapter.has_feature('feed_parser'):
+        # Enforce the size limit before holding the whole stream in memory
+        tracker = None if limits is None else limits.tracker()
+        data = []
+        while True:
+            chunk = await next_chunk()
+            if not chunk:
+                break
+            if tracker is not None:
+                tracker.add_bytes(len(chunk))
+            data.append(chunk)
+        return await loop.run_in_executor(executor, functools.partial(
+            xml4h.parse, data[0][:0].join(data) if data else b'',
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            adapter=adapter, limits=limits))
+
+    def parse_chunks():
+        # Parsers may only be used in the thread that created them, so
+        # the whole parse runs in one call on the executor, which fetches
+        # each chunk from the event loop while feeding the previous one
+        parser = xml4h.FeedParser(
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            adapter=adapter, limits=limits)
+        reading = asyncio.run_coroutine_threadsafe(next_chunk(), loop)
+        try:
+            while True:
+                chunk = reading.result()
+                if not chunk:
+                    break
+                reading = asyncio.run_coroutine_threadsafe(next_chunk(), loop)
+                parser.feed(chunk)
+        finally:
+            reading.cancel()
+        return parser.close()
+
+    return await loop.run_in_executor(executor, parse_chunks)
+
+
+async def _next_or_empty(chunks):
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return b''
+
+
+async def awrite_node(node, writer, encoding='utf-8', indent=0, newline='',
+        omit_declaration=False, node_depth=0, quote_char='"',
+        chunk_size=DEFAULT_CHUNK_SIZE, max_pending_chunks=4, executor=None,
+        preserve_attribute_order=False):
+    """
+    Coroutine to serialize an *xml4h* DOM node and its descendants to an
+    asynchronous *writer* without blocking the event loop.
+
+    :param writer: an asynchronous sink for the serialized output. This can
+        be an object like :class:`asyncio.StreamWriter` with a ``write``
+        method and a ``drain`` coroutine, which is awaited after each chunk
+        is written, or an object whose ``write`` method is a coroutine.
+    :param int chunk_size: the size of the chunks in which output is
+        written to *writer*.
+    :param int max_pending_chunks: the number of serialized chunks that can
+        be waiting to be written before serialization pauses for *writer*
+        to catch up.
+    :param executor: the executor on which serialization is done.
+        If *None* a shared pool of :data:`DEFAULT_MAX_WORKERS` threads
+        is used.
+    :type executor: :class:`concurrent.futures.Executor` or None
+
+    Other arguments are as for :func:`xml4h.writer.write_node`, which does
+    the serializing. Chunks are bytes unless *encoding* is *None*.
+
+    The node must not be changed until writing is complete.
+    """
+    if executor is None:
+        executor = _get_default_executor()
+    loop = asyncio.get_event_loop()
+    queue = asyncio.Queue(maxsize=max_pending_chunks)
+    chunk_writer = _ChunkQueueWriter(loop, queue, chunk_size)
+
+    def serialize():
+        xml4h.write_node(node, chunk_writer, encoding=encoding,
+            indent=indent, newline=newline, omit_declaration=omit_declaration,
+            node_depth=node_depth, quote_char=quote_char,
+            preserve_attribute_order=preserve_attribute_order)
+        chunk_writer.flush()
+
+    def serialize_and_finish():
+        try:
+            serialize()
+        finally:
+            if not chunk_writer.aborted:
+                chunk_writer.put(_END_OF_OUTPUT)
+
+    serializing = loop.run_in_executor(executor, serialize_and_finish)
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _END_OF_OUTPUT:
+                break
+            write_result = writer.write(chunk)
+            if hasattr(writer, 'drain'):
+                await writer.drain()
+            elif inspect.isawaitable(write_result):
+                await write_result
+    except BaseException:
+        # Stop serializing, and unblock the serializer if it is waiting
+        # for room in the queue
+        chunk_writer.aborted = True
+        while not queue.empty():
+            queue.get_nowait()
+        await asyncio.wait([serializing])
+        serializing.exception()
+        raise
+    await serializing
+
+
+_END_OF_OUTPUT = object()
+
+
+class _WriteAborted(Exception):
+    pass
+
+
+class _ChunkQueueWriter(object):
+    """
+    File-like writer that collects serialized output into chunks, and
+    passes each chunk to a queue in the event loop's thread. Writing blocks
+    while the queue is full.
+    """
+
+    def __init__(self, loop, queue, chunk_size):
+        self.aborted = False
+        self._loop = loop
+        self._queue = queue
+        self._chunk_size = chunk_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, data):
+        self._parts.append(data)
+        self._size += len(data)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            chunk = self._parts[0][:0].join(self._parts)
+            self._parts = []
+            self._size = 0
+            self.put(chunk)
+
+    def put(self, item):
+        if self.aborted:
+            raise _WriteAborted()
+        asyncio.run_coroutine_threadsafe(
+            self._queue.put(item), self._loop).result()
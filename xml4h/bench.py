@@ -0,0 +1,491 @@
+"""
+Benchmarks to measure the performance of *xml4h* operations across the
+available XML library adapters.
+
+Run a benchmark from the command line, for example::
+
+    python -m xml4h.bench whitespace --records 5000
+    python -m xml4h.bench import
+    python -m xml4h.bench adapters --save xml4h-adapters.json
+    python -m xml4h.bench navigate
+    python -m xml4h.bench memory
+    python -m xml4h.bench attributes
+    python -m xml4h.bench stream --records 30000
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import six
+
+import xml4h
+
+
+def make_sample_xml(records=1000, indent='    '):
+    """
+    :return: bytes of a pretty-printed XML document containing the given
+        number of repeated ``<Record>`` elements, representative of the
+        machine-generated feeds *xml4h* is often used to process.
+    """
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<Records xmlns="urn:xml4h:bench">']
+    for i in range(records):
+        lines.extend([
+            '%s<Record id="r%d" type="sample">' % (indent, i),
+            '%s<Name>Record number %d</Name>' % (indent * 2, i),
+            '%s<Value units="cm">%d</Value>' % (indent * 2, i * 7),
+            '%s<Tags>' % (indent * 2),
+            '%s<Tag>alpha</Tag>' % (indent * 3),
+            '%s<Tag>beta</Tag>' % (indent * 3),
+            '%s</Tags>' % (indent * 2),
+            '%s</Record>' % indent,
+            ])
+    lines.append('</Records>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def make_sample_stream(records=1000):
+    """
+    :return: bytes of a stream of concatenated XML documents, one
+        ``<Event>`` document of about 300 bytes per line, as written to the
+        logs and message feeds that are parsed as streams of documents.
+    """
+    lines = []
+    for i in range(records):
+        lines.append(
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<Event id="e%d" type="sample" level="info">'
+            '<Time>2020-01-01T00:00:%02dZ</Time>'
+            '<Source host="host%d.example.com" port="%d"/>'
+            '<Name>Event number %d</Name>'
+            '<Value units="ms">%d</Value>'
+            '<Tags><Tag>alpha</Tag><Tag>beta</Tag></Tags>'
+            '</Event>' % (i, i % 60, i % 10, 8000 + i % 100, i, i * 7))
+    return '\n'.join(lines).encode('utf-8') + b'\n'
+
+
+def best_time(fn, repeat=3):
+    """
+    :return: the fastest wall-clock time in seconds of ``repeat`` calls to
+        the given no-argument function.
+    """
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def available_adapters():
+    """
+    :return: a list of the *xml4h* adapter classes available in the Python
+        environment, in order of preference.
+    """
+    return xml4h._available_adapters()
+
+
+def bench_whitespace(args, out):
+    """
+    Compare stripping whitespace text nodes from a parsed document with the
+    original wrapped-node pass against stripping them within the parser.
+    """
+    xml_bytes = make_sample_xml(args.records)
+    out.write('Whitespace stripping, %d records (%d bytes), best of %d\n'
+        % (args.records, len(xml_bytes), args.repeat))
+    out.write('%-22s %12s %12s %9s\n'
+        % ('adapter', 'post-pass', 'in-parser', 'speedup'))
+    for adapter in available_adapters():
+        def post_pass():
+            doc = adapter.parse_bytes(
+                xml_bytes, ignore_whitespace_text_nodes=False)
+            adapter.ignore_whitespace_text_nodes(doc)
+
+        def in_parser():
+            adapter.parse_bytes(xml_bytes, ignore_whitespace_text_nodes=True)
+
+        before = best_time(post_pass, args.repeat)
+        after = best_time(in_parser, args.repeat)
+        out.write('%-22s %11.4fs %11.4fs %8.1fx\n'
+            % (adapter.__name__, before, after, before / after))
+
+
+def peak_memory(fn):
+    """
+    :return: the peak memory in bytes allocated by Python, as traced by
+        :mod:`tracemalloc`, during a call to the given no-argument function.
+        Memory allocated internally by C libraries such as libxml2 is not
+        included.
+    """
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_decompress(args, out):
+    """
+    Compare parsing compressed XML files by decompressing the whole file into
+    memory first against streaming the decompressed data into the parser.
+    """
+    xml_bytes = make_sample_xml(args.records)
+    mb = len(xml_bytes) / (1024.0 * 1024)
+    out.write('Decompression, %d records (%.1f MB uncompressed), best of %d\n'
+        % (args.records, mb, args.repeat))
+    out.write('%-6s %-22s %10s %10s %10s %10s\n'
+        % ('format', 'adapter', 'manual', 'streamed', 'manual', 'streamed'))
+    out.write('%-6s %-22s %10s %10s %10s %10s\n'
+        % ('', '', 'MB/s', 'MB/s', 'peak MB', 'peak MB'))
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for magic, extension, module_name in xml4h._COMPRESSION_FORMATS:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            path = os.path.join(temp_dir, 'sample.xml' + extension)
+            with open(path, 'wb') as f:
+                f.write(module.compress(xml_bytes))
+
+            for adapter in available_adapters():
+                def manual():
+                    with open(path, 'rb') as f:
+                        data = module.decompress(f.read())
+                    adapter.parse_bytes(data)
+
+                def streamed():
+                    xml4h.parse(path, adapter=adapter)
+
+                out.write('%-6s %-22s %10.1f %10.1f %10.1f %10.1f\n' % (
+                    extension, adapter.__name__,
+                    mb / best_time(manual, args.repeat),
+                    mb / best_time(streamed, args.repeat),
+                    peak_memory(manual) / (1024.0 * 1024),
+                    peak_memory(streamed) / (1024.0 * 1024)))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def workload_functions(adapter, records=1000):
+    """
+    :return: a dictionary of no-argument functions that perform each of the
+        :attr:`xml4h.AdapterProfile.WORKLOADS` with the given adapter, on a
+        sample document with the given number of records.
+    """
+    xml_bytes = make_sample_xml(records)
+    doc = xml4h.parse(xml_bytes, adapter=adapter)
+
+    def parse():
+        xml4h.parse(xml_bytes, adapter=adapter)
+
+    def find():
+        # Navigate around each record, as code extracting data does
+        for record in doc.find('Record'):
+            record.find_first('Name').text
+            record.find('Tag')[-1].parent.parent.attributes['id']
+
+    def write():
+        doc.write(six.BytesIO())
+
+    def build():
+        b = xml4h.build('Records', 'urn:xml4h:bench', adapter=adapter)
+        for i in range(records):
+            (b.element('Record').attributes(id='r%d' % i, type='sample')
+                .element('Name').text('Record number %d' % i).up()
+                .element('Value').attributes(units='cm').text(str(i * 7))
+                .up().up())
+
+    return {'parse': parse, 'find': find, 'write': write, 'build': build}
+
+
+def bench_adapters(args, out):
+    """
+    Measure how fast each available adapter performs each kind of workload,
+    and save the results as an :class:`xml4h.AdapterProfile`.
+    """
+    out.write('Adapter workloads, %d records, best of %d, ms\n'
+        % (args.records, args.repeat))
+    workloads = xml4h.AdapterProfile.WORKLOADS
+    out.write('%-22s' % 'adapter'
+        + ''.join(' %10s' % workload for workload in workloads) + '\n')
+    timings = dict((workload, {}) for workload in workloads)
+    for adapter in available_adapters():
+        functions = workload_functions(adapter, args.records)
+        out.write('%-22s' % adapter.__name__)
+        for workload in workloads:
+            elapsed = best_time(functions[workload], args.repeat)
+            timings[workload][adapter.__name__] = elapsed
+            out.write(' %10.1f' % (elapsed * 1000))
+        out.write('\n')
+    profile = xml4h.AdapterProfile(timings)
+    for workload in workloads:
+        out.write('Best for %-6s %s\n' % (workload, profile.ranking(workload)[0]))
+    if args.save:
+        profile.save(args.save)
+        out.write('Saved profile to %s, set %s=%s to use it\n' % (
+            args.save, xml4h.AdapterProfile.PATH_ENVIRONMENT_VARIABLE,
+            args.save))
+
+
+def bench_navigate(args, out):
+    """
+    Measure navigating around each record of a document, and how often a
+    node navigated to already has a wrapper that is reused rather than made
+    anew.
+    """
+    out.write('Navigation, %d records, best of %d\n'
+        % (args.records, args.repeat))
+    out.write('%-22s %10s %12s %12s %9s\n'
+        % ('adapter', 'ms', 'wrappers', 'reused', 'hit rate'))
+    xml_bytes = make_sample_xml(args.records)
+    for adapter in available_adapters():
+        doc = xml4h.parse(xml_bytes, adapter=adapter)
+        records = doc.find('Record')
+
+        def navigate():
+            for record in records:
+                for child in record.children:
+                    child.parent.attributes['id']
+                    child.children
+                record.find_first('Name').text
+
+        elapsed = best_time(navigate, args.repeat)
+        stats = doc.adapter.wrapper_cache_stats
+        out.write('%-22s %10.1f %12d %12d %8.1f%%\n' % (
+            adapter.__name__, elapsed * 1000, stats['misses'], stats['hits'],
+            stats['hit_rate'] * 100))
+
+
+def bench_attributes(args, out):
+    """
+    Measure looking up attributes of elements by name, as with
+    ``element['id']``, including lookups of attributes an element lacks.
+    """
+    out.write('Attribute lookups, %d records, best of %d\n'
+        % (args.records, args.repeat))
+    out.write('%-22s %10s %10s %14s\n'
+        % ('adapter', 'ms', 'lookups', 'us per lookup'))
+    xml_bytes = make_sample_xml(args.records)
+    for adapter in available_adapters():
+        doc = xml4h.parse(xml_bytes, adapter=adapter)
+        elements = [(record, record.Value) for record in doc.find('Record')]
+
+        def look_up():
+            for record, value in elements:
+                record['id']
+                record['type']
+                value['units']
+                'missing' in record.attributes
+
+        elapsed = best_time(look_up, args.repeat)
+        lookups = len(elements) * 4
+        out.write('%-22s %10.1f %10d %14.2f\n' % (
+            adapter.__name__, elapsed * 1000, lookups,
+            elapsed * 1000000 / lookups))
+
+
+def bench_stream(args, out):
+    """
+    Compare parsing a stream of one-line documents with
+    :func:`xml4h.parse_stream_of_documents` against splitting the stream
+    into lines and calling :func:`xml4h.parse` for each line.
+    """
+    xml_bytes = make_sample_stream(args.records)
+    out.write('Stream of documents, %d documents (%d bytes), best of %d\n'
+        % (args.records, len(xml_bytes), args.repeat))
+
+    def split():
+        for xml_data in xml4h.streaming.split_documents(
+                six.BytesIO(xml_bytes)):
+            pass
+
+    out.write('%-22s %10.1f ms\n'
+        % ('split_documents', best_time(split, args.repeat) * 1000))
+    out.write('%-22s %10s %10s %9s\n'
+        % ('adapter', 'per-line', 'stream', 'speedup'))
+    for adapter in available_adapters():
+        def per_line():
+            for line in xml_bytes.splitlines():
+                xml4h.parse(line, adapter=adapter)
+
+        def stream():
+            for doc in xml4h.parse_stream_of_documents(
+                    xml_bytes, adapter=adapter):
+                pass
+
+        before = best_time(per_line, args.repeat)
+        after = best_time(stream, args.repeat)
+        out.write('%-22s %8.1fms %8.1fms %8.2fx\n' % (
+            adapter.__name__, before * 1000, after * 1000, before / after))
+
+
+def wrapped_node_memory(adapter, records=1000):
+    """
+    :return: the memory in bytes allocated by Python, as traced by
+        :mod:`tracemalloc`, to hold a wrapper for every node in a sample
+        document with the given number of records, and the number of nodes.
+        This includes any objects the adapter makes to represent nodes its
+        XML library has no objects for, such as text nodes.
+    """
+    import tracemalloc
+    doc = xml4h.parse(make_sample_xml(records), adapter=adapter)
+    tracemalloc.start()
+    try:
+        wrappers = list(doc.root.iter_descendants())
+        return tracemalloc.get_traced_memory()[0], len(wrappers)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args, out):
+    """
+    Measure the memory used to hold a wrapper for every node of a document.
+    """
+    out.write('Wrapped node memory, %d records\n' % args.records)
+    out.write('%-22s %10s %10s %14s\n'
+        % ('adapter', 'nodes', 'MB', 'bytes per node'))
+    for adapter in available_adapters():
+        size, count = wrapped_node_memory(adapter, args.records)
+        out.write('%-22s %10d %10.1f %14.1f\n' % (
+            adapter.__name__, count, size / (1024.0 * 1024),
+            float(size) / count))
+
+
+# Modules that are slow to import, which `import xml4h` should leave to be
+# imported when they are first needed
+SLOW_IMPORT_MODULES = [
+    'asyncio',
+    'distutils',
+    'lxml.etree',
+    'multiprocessing',
+    'xml.dom.minidom',
+    'xml.etree.ElementTree',
+    'xml.sax.saxutils',
+    ]
+
+_IMPORT_TIMER = """
+import json, sys, time
+start = time.time()
+%s
+elapsed = time.time() - start
+sys.stdout.write(json.dumps([elapsed, sorted(sys.modules)]))
+"""
+
+
+def import_time(statement='import xml4h'):
+    """
+    :return: the wall-clock time in seconds to run the given statement in a
+        new Python process, where nothing has been imported yet, and the
+        names of the modules imported in that process.
+    """
+    package_dir = os.path.dirname(os.path.dirname(
+        os.path.abspath(xml4h.__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [package_dir] + [p for p in [env.get('PYTHONPATH')] if p])
+    output = subprocess.check_output(
+        [sys.executable, '-c', _IMPORT_TIMER % statement], env=env)
+    elapsed, modules = json.loads(output.decode('utf-8'))
+    return elapsed, modules
+
+
+def bench_import(args, out):
+    """
+    Measure the time to import *xml4h*, and to then use it for the first
+    time, which imports the XML library of the adapter used.
+    """
+    out.write('Import time, best of %d\n' % args.repeat)
+    out.write('%-66s %8s  %s\n' % ('statement', 'ms', 'slow imports'))
+    statements = ['import xml4h', 'import xml4h; xml4h.best_adapter'] + [
+        'import xml4h; xml4h.parse(b"<a/>", adapter=xml4h.%s)'
+        % adapter.__name__ for adapter in available_adapters()]
+    for statement in statements:
+        results = [import_time(statement) for _ in range(args.repeat)]
+        modules = results[0][1]
+        out.write('%-66s %8.1f  %s\n' % (
+            statement, min(r[0] for r in results) * 1000,
+            ', '.join(m for m in SLOW_IMPORT_MODULES if m in modules)
+            or '-'))
+
+
+def main(argv=None, out=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m xml4h.bench',
+        description='Benchmark xml4h operations on the available adapters.')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    whitespace_parser = subparsers.add_parser('whitespace',
+        help='parse with whitespace text nodes stripped')
+    whitespace_parser.add_argument('--records', type=int, default=5000,
+        help='number of records in the sample document')
+    whitespace_parser.add_argument('--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is reported')
+    whitespace_parser.set_defaults(func=bench_whitespace)
+
+    decompress_parser = subparsers.add_parser('decompress',
+        help='parse gzip, bz2 and xz compressed files')
+    decompress_parser.add_argument('--records', type=int, default=20000,
+        help='number of records in the sample document')
+    decompress_parser.add_argument('--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is reported')
+    decompress_parser.set_defaults(func=bench_decompress)
+
+    import_parser = subparsers.add_parser('import',
+        help='import xml4h and use it for the first time')
+    import_parser.add_argument('--repeat', type=int, default=5,
+        help='number of timed runs, of which the best is reported')
+    import_parser.set_defaults(func=bench_import)
+
+    adapters_parser = subparsers.add_parser('adapters',
+        help='rank adapters for parse, find, write and build workloads')
+    adapters_parser.add_argument('--records', type=int, default=2000,
+        help='number of records in the sample document')
+    adapters_parser.add_argument('--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is reported')
+    adapters_parser.add_argument('--save', metavar='PATH',
+        default='xml4h-adapters.json',
+        help='file to save the adapter profile to, or an empty string to'
+             ' not save it (default: %(default)s)')
+    adapters_parser.set_defaults(func=bench_adapters)
+
+    navigate_parser = subparsers.add_parser('navigate',
+        help='navigate around nodes, reusing their wrappers')
+    navigate_parser.add_argument('--records', type=int, default=2000,
+        help='number of records in the sample document')
+    navigate_parser.add_argument('--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is reported')
+    navigate_parser.set_defaults(func=bench_navigate)
+
+    memory_parser = subparsers.add_parser('memory',
+        help='hold a wrapper for every node of a document')
+    memory_parser.add_argument('--records', type=int, default=20000,
+        help='number of records in the sample document')
+    memory_parser.set_defaults(func=bench_memory)
+
+    attributes_parser = subparsers.add_parser('attributes',
+        help='look up attributes of elements by name')
+    attributes_parser.add_argument('--records', type=int, default=2000,
+        help='number of records in the sample document')
+    attributes_parser.add_argument('--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is reported')
+    attributes_parser.set_defaults(func=bench_attributes)
+
+    stream_parser = subparsers.add_parser('stream',
+        help='parse a stream of one-line documents')
+    stream_parser.add_argument('--records', type=int, default=30000,
+        help='number of documents in the sample stream')
+    stream_parser.add_argument('--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is reported')
+    stream_parser.set_defaults(func=bench_stream)
+
+    args = parser.parse_args(argv)
+    args.func(args, out or sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import collections
+import hashlib
+import os
+import threading
+
+import six
+
+import xml4h
+
+
+class ParseCache(object):
+    """
+    Cache of parsed documents, for applications that parse the same XML
+    documents over and over. Pass a cache to :func:`xml4h.parse` to use it::
+
+        cache = xml4h.ParseCache(max_entries=100, max_bytes=50 * 1024 * 1024)
+        doc = xml4h.parse('config.xml', cache=cache)
+
+    Documents given as bytes, text or buffers are cached by a hash of their
+    content, while documents given as file paths are cached by the path
+    along with the file's modification time and size so changes to the file
+    are noticed. Documents given as file-like objects are never cached.
+
+    Every document returned from the cache is a new copy of the cached
+    document, so you can change it without affecting the cache or other
+    copies.
+
+    The least-recently used documents are evicted when the cache holds more
+    than ``max_entries`` documents, or when the total size of the source XML
+    data of the cached documents exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        """
+        :param int max_entries: the maximum number of documents to cache.
+        :param max_bytes: the maximum total size in bytes of the source XML
+            data of the cached documents, or *None* for no limit. A document
+            larger than this is never cached.
+        :type max_bytes: int or None
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Discard all cached documents and reset the hit and miss counts.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        """
+        The total size in bytes of the source XML data of the cached
+        documents.
+        """
+        return self._total_bytes
+
+    @property
+    def stats(self):
+        """
+        :return: a dictionary of the cache's ``hits``, ``misses``,
+            ``hit_rate``, number of ``entries`` and ``total_bytes``.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                }
+
+    def parse(self, to_parse, ignore_whitespace_text_nodes=True,
+            adapter=None, source_type=None, keep=None, limits=None):
+        """
+        Return a copy of the cached document for the given data if there is
+        one, otherwise parse and cache the document. Arguments are as for
+        :func:`xml4h.parse`.
+        """
+        if adapter is None:
+            adapter = xml4h.best_adapter
+        key_and_size = self._key_and_size(to_parse, source_type)
+        if key_and_size is None:
+            return xml4h.parse(to_parse, ignore_whitespace_text_nodes,
+                adapter=adapter, source_type=source_type, keep=keep,
+                limits=limits)
+        key, size = key_and_size
+        # Limits are part of the key, so a document is never returned from
+        # the cache when it would exceed the limits it is requested with
+        key = (key, adapter, ignore_whitespace_text_nodes,
+               None if keep is None else tuple(keep), limits)
+        with self._lock:
+            doc = self._entries.get(key, (None, None))[0]
+            if doc is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                # Mark as most recently used
+                del self._entries[key]
+                self._entries[key] = (doc, size)
+        if doc is None:
+            doc = xml4h.parse(to_parse, ignore_whitespace_text_nodes,
+                adapter=adapter, source_type=source_type, keep=keep,
+                limits=limits)
+            self._add(key, doc, size)
+        return self._copy(doc)
+
+    def _add(self, key, doc, size):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (doc, size)
+            self._total_bytes += size
+            # Evict least-recently used documents
+            while (len(self._entries) > self.max_entries
+                    or (self.max_bytes is not None
+                        and self._total_bytes > self.max_bytes)):
+                self._total_bytes -= self._entries.popitem(last=False)[1][1]
+
+    def _copy(self, doc):
+        """
+        Return a deep copy of the given document, made natively by the
+        underlying XML library.
+        """
+        adapter = doc.adapter
+        return adapter.wrap_document(
+            adapter.clone_node(doc.impl_document))
+
+    def _key_and_size(self, to_parse, source_type):
+        """
+        Return a cache key and the data size in bytes for the given document
+        source, or None if the source cannot be cached.
+        """
+        if source_type is None:
+            source_type = xml4h._detect_source_type(to_parse)
+        if source_type == 'file':
+            if not isinstance(to_parse, (six.string_types, six.binary_type)):
+                return None
+            stat = os.stat(to_parse)
+            return ((os.path.abspath(to_parse), stat.st_mtime, stat.st_size),
+                    stat.st_size)
+        if isinstance(to_parse, six.text_type):
+            to_parse = to_parse.encode('utf-8')
+        return (hashlib.sha1(to_parse).hexdigest(),
+                memoryview(to_parse).nbytes)
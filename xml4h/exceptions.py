@@ -43,3 +43,40 @@ class UnknownNamespaceException(ValueError, Xml4hException):
     prefix or URI.
     """
     pass
+
+
+class ParseLimitExceededException(Xml4hException):
+    """
+    Parsing was stopped because the document exceeded one of the
+    :class:`~xml4h.ParseLimits` it was parsed with.
+    """
+
+    def __init__(self, limit_name, limit):
+        # Keep the constructor arguments as args, so the exception can be
+        # pickled when raised in a worker process
+        super(ParseLimitExceededException, self).__init__(limit_name, limit)
+        self.limit_name = limit_name
+        self.limit = limit
+
+    def __str__(self):
+        return 'Document exceeds the %s limit of %s' % (
+            self.limit_name, self.limit)
+
+
+class DocumentTooLargeException(Xml4hException):
+    """
+    Input is larger than the ``max_dom_bytes`` allowed for building a whole
+    document in memory.
+    """
+
+    def __init__(self, size, max_dom_bytes):
+        super(DocumentTooLargeException, self).__init__(size, max_dom_bytes)
+        self.size = size
+        self.max_dom_bytes = max_dom_bytes
+
+    def __str__(self):
+        return ('Document of %d bytes is larger than max_dom_bytes of %d.'
+                ' Process it in a single pass with xml4h.iterparse(), parse'
+                ' only the parts you need with the keep option, or pass'
+                ' on_oversize=\'stream\' to get a streaming document'
+                % (self.size, self.max_dom_bytes))
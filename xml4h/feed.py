@@ -0,0 +1,92 @@
+import xml4h
+
+
+class FeedParser(object):
+    """
+    Parse an XML document from chunks of data as they arrive, for example
+    from a socket or message queue, so parsing overlaps with the transfer
+    instead of waiting for the whole payload.
+
+    Feed each chunk of XML bytes or text to :meth:`feed` then call
+    :meth:`close` to get the parsed document::
+
+        parser = xml4h.FeedParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        doc = parser.close()
+
+    If ``emit_elements`` is set, elements are also made available from
+    :meth:`read_elements` as soon as they are complete.
+    """
+
+    def __init__(self, tag=None, ns_uri=None, emit_elements=False,
+            ignore_whitespace_text_nodes=True, adapter=None, limits=None):
+        """
+        :param tag: only emit elements with this local name.
+            If *None* all element names are matched.
+        :type tag: string or None
+        :param ns_uri: only emit elements within this namespace URI.
+            If *None* all elements are matched, regardless of namespace.
+        :type ns_uri: string or None
+        :param bool emit_elements: if ``True`` completed elements are
+            available from :meth:`read_elements` while parsing continues.
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from the parsed document.
+        :param adapter: the *xml4h* implementation adapter class used to parse
+            the document and to interact with the resulting nodes.
+            If None, :attr:`xml4h.best_adapter` will be used.
+        :type adapter: adapter class or None
+        :param limits: resource limits to enforce while parsing, raising
+            :class:`~xml4h.exceptions.ParseLimitExceededException` from
+            :meth:`feed` or :meth:`close` as soon as the document exceeds one.
+        :type limits: :class:`~xml4h.ParseLimits` or None
+
+        :raise: :class:`~xml4h.exceptions.FeatureUnavailableException` if the
+            adapter does not support feed parsing.
+
+        Delegates to an adapter's
+        :meth:`~xml4h.impls.interface.new_feed_parser` implementation.
+        """
+        if adapter is None:
+            adapter = xml4h.best_adapter
+        if not adapter.has_feature('feed_parser'):
+            raise xml4h.exceptions.FeatureUnavailableException('feed_parser')
+        self._adapter_class = adapter
+        self._impl_parser = adapter.new_feed_parser(
+            tag=tag, ns_uri=ns_uri, emit_elements=emit_elements,
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            limits=limits)
+
+    @property
+    def adapter_class(self):
+        """
+        The *xml4h* adapter class used by this parser.
+        """
+        return self._adapter_class
+
+    def feed(self, data):
+        """
+        Parse the next chunk of the document.
+
+        :param data: XML bytes or text, which may end part-way through
+            any markup.
+        """
+        self._impl_parser.feed(data)
+
+    def read_elements(self):
+        """
+        :return: a generator of the :class:`~xml4h.nodes.Element` nodes
+            completed since this method was last called, in order of
+            completion. Nothing is returned unless the parser was created
+            with ``emit_elements`` set.
+        """
+        return self._impl_parser.read_elements()
+
+    def close(self):
+        """
+        Finish parsing the document.
+
+        :return: an :class:`xml4h.nodes.Document` node representing the
+            parsed document.
+        """
+        return self._impl_parser.close()
@@ -1,4 +1,6 @@
 import abc
+import weakref
+
 import six
 
 from xml4h import nodes, exceptions
@@ -20,6 +22,8 @@ class XmlImplAdapter(object):
     # List of extra features supported (or not) by an adapter implementation
     SUPPORTED_FEATURES = {
         'xpath': False,
+        'iterparse': False,
+        'feed_parser': False,
         }
 
     @classmethod
@@ -36,13 +40,13 @@ class XmlImplAdapter(object):
         in the given node and its descendents.
 
         This is useful for cleaning up excess low-value text nodes in a
-        document DOM after parsing a pretty-printed XML document.
+        document DOM after parsing a pretty-printed XML document, though
+        adapters' parse methods now strip these nodes more efficiently
+        within the parser itself.
         """
-        for child in wrapped_node.children:
-            if child.is_text and child.value.strip() == '':
-                child.delete()
-            else:
-                cls.ignore_whitespace_text_nodes(child)
+        for node in wrapped_node.iter_descendants():
+            if node.is_text and node.value.strip() == '':
+                node.delete()
 
     @classmethod
     def create_document(cls, root_tagname, ns_uri=None, **kwargs):
@@ -67,8 +71,18 @@ class XmlImplAdapter(object):
             return None
         if adapter is None:
             adapter = cls(document)
+        # Return the existing wrapper for the node, if it is still in use
+        wrapper_ref = adapter._wrapper_cache.get(node)
+        if wrapper_ref is not None:
+            wrapper = wrapper_ref()
+            if wrapper is not None:
+                adapter._wrapper_cache_hits += 1
+                return wrapper
+        adapter._wrapper_cache_misses += 1
         impl_class = adapter.map_node_to_class(node)
-        return impl_class(node, adapter)
+        wrapper = impl_class(node, adapter)
+        adapter._wrapper_cache.store(node, wrapper)
+        return wrapper
 
     @classmethod
     @abc.abstractmethod
@@ -81,35 +95,201 @@ class XmlImplAdapter(object):
 
     @classmethod
     @abc.abstractmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True, keep=None,
+            limits=None):
         raise NotImplementedError("Implementation missing for %s" % cls)
 
     @classmethod
     @abc.abstractmethod
-    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True):
+    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True, keep=None,
+            limits=None):
         raise NotImplementedError("Implementation missing for %s" % cls)
 
     @classmethod
     @abc.abstractmethod
-    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True):
+    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True, keep=None,
+            limits=None):
         raise NotImplementedError("Implementation missing for %s" % cls)
 
+    @classmethod
+    def parse_buffer(cls, xml_buffer, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        """
+        Parse XML data held in an object that supports the buffer protocol,
+        such as a ``bytearray``, ``memoryview`` or ``mmap.mmap``.
+
+        Adapters should override this to parse directly from the buffer's
+        memory. This default implementation copies the data to bytes for
+        :meth:`parse_bytes`.
+        """
+        return cls.parse_bytes(
+            memoryview(xml_buffer).tobytes(), ignore_whitespace_text_nodes,
+            keep=keep, limits=limits)
+
+    @classmethod
+    def parse_documents(cls, xml_datas, ignore_whitespace_text_nodes=True,
+            limits=None):
+        """
+        Parse each of a sequence of XML documents, yielding each parsed
+        document as an :class:`xml4h.nodes.Document` node.
+
+        :param xml_datas: an iterable of XML documents as bytes or text.
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from the parsed documents.
+        :param limits: resource limits to enforce for each document.
+        :type limits: :class:`~xml4h.ParseLimits` or None
+
+        Adapters should override this to reuse one parser for all the
+        documents where the underlying library allows it, rather than
+        setting up a new parser for each. This default implementation
+        parses each document with :meth:`parse_string` or
+        :meth:`parse_bytes`.
+        """
+        for xml_data in xml_datas:
+            if isinstance(xml_data, six.text_type):
+                yield cls.parse_string(
+                    xml_data, ignore_whitespace_text_nodes, limits=limits)
+            else:
+                yield cls.parse_bytes(
+                    xml_data, ignore_whitespace_text_nodes, limits=limits)
+
+    @classmethod
+    def iterparse(cls, xml_file, tag=None, ns_uri=None,
+            ignore_whitespace_text_nodes=True, limits=None):
+        """
+        Incrementally parse an XML document, yielding each completed element
+        that matches the given constraints as an :class:`xml4h.nodes.Element`
+        node. Once a yielded element has been processed it is cleared, along
+        with its preceding siblings, so memory use stays flat even for huge
+        documents.
+
+        :param xml_file: a file path, or a file-like object of XML bytes or
+            text.
+        :param tag: only yield elements with this local name.
+            If *None* all element names are matched.
+        :type tag: string or None
+        :param ns_uri: only yield elements within this namespace URI.
+            If *None* all elements are matched, regardless of namespace.
+        :type ns_uri: string or None
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from each yielded element.
+        :param limits: resource limits to enforce across the whole document.
+        :type limits: :class:`~xml4h.ParseLimits` or None
+
+        This is an optional feature, adapters that support it should
+        report the ``iterparse`` feature as available.
+        """
+        raise exceptions.FeatureUnavailableException('iterparse')
+
+    @classmethod
+    def new_feed_parser(cls, tag=None, ns_uri=None, emit_elements=False,
+            ignore_whitespace_text_nodes=True, limits=None):
+        """
+        Return a parser object to which an XML document is fed in chunks
+        as they arrive. The object has the methods:
+
+        - ``feed(data)`` to parse the next chunk of XML bytes or text.
+        - ``read_elements()`` to return a generator of the elements completed
+          since it was last called, as :class:`xml4h.nodes.Element` nodes.
+        - ``close()`` to finish parsing and return the whole document as an
+          :class:`xml4h.nodes.Document` node.
+
+        :param tag: only emit elements with this local name.
+            If *None* all element names are matched.
+        :type tag: string or None
+        :param ns_uri: only emit elements within this namespace URI.
+            If *None* all elements are matched, regardless of namespace.
+        :type ns_uri: string or None
+        :param bool emit_elements: if ``True`` completed elements are made
+            available from ``read_elements()``, otherwise nothing is emitted.
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from the parsed document.
+        :param limits: resource limits to enforce while parsing.
+        :type limits: :class:`~xml4h.ParseLimits` or None
+
+        This is an optional feature, adapters that support it should
+        report the ``feed_parser`` feature as available.
+        """
+        raise exceptions.FeatureUnavailableException('feed_parser')
+
     def __init__(self, document):
         if not isinstance(document, object):
             raise exceptions.IncorrectArgumentTypeException(
                 document, [object])
         self._impl_document = document
         self._auto_ns_prefix_count = 0
-        self.clear_caches()
-
-    def clear_caches(cls):
+        # Index of the document's elements, only built on request by
+        # Document.build_index()
+        self.element_index = None
+        # Indexes of the document's elements by attribute value, keyed by
+        # attribute name and namespace URI
+        self.attribute_indexes = {}
+        self._reset_wrapper_cache()
+
+    def _reset_wrapper_cache(self):
+        # Wrapper nodes in use for implementation nodes, so navigating to the
+        # same node again returns the same wrapper instead of a new one
+        self._wrapper_cache = _WeakValueCache()
+        self._wrapper_cache_hits = 0
+        self._wrapper_cache_misses = 0
+        # Text nodes made to represent the text of elements, for adapters
+        # whose underlying library has no text nodes
+        self._text_node_cache = _WeakValueCache()
+
+    def clear_caches(self):
         """
         Clear any in-adapter cached data, for cases where cached data could
         become outdated e.g. by making DOM changes directly outside of *xml4h*.
+        """
+        self._reset_wrapper_cache()
+        self.invalidate_indexes()
+
+    def invalidate_indexes(self):
+        """
+        Mark any index of the document's elements as outdated after the
+        document has changed, so it is rebuilt when it is next used.
+        """
+        if self.element_index is not None:
+            self.element_index.invalidate()
+        self.invalidate_attribute_indexes()
 
-        This is a no-op if the implementing adapter has no cached data.
+    def invalidate_attribute_indexes(self):
         """
-        pass
+        Mark any index of the document's elements by attribute value as
+        outdated after attributes have changed, so it is rebuilt when it is
+        next used.
+        """
+        for index in self.attribute_indexes.values():
+            index.invalidate()
+
+    @property
+    def wrapper_cache_stats(self):
+        """
+        :return: a dictionary of the ``hits``, ``misses`` and ``hit_rate``
+            of lookups of the wrapper nodes this adapter has made, and the
+            number of wrappers still in use as ``entries``. A hit returns
+            the existing wrapper for a node instead of making a new one.
+        """
+        lookups = self._wrapper_cache_hits + self._wrapper_cache_misses
+        return {
+            'hits': self._wrapper_cache_hits,
+            'misses': self._wrapper_cache_misses,
+            'hit_rate': (float(self._wrapper_cache_hits) / lookups
+                         if lookups else 0.0),
+            'entries': len(self._wrapper_cache),
+            }
+
+    def _text_node_for(self, element, text_class):
+        """
+        Return a text node of the given class representing the text of the
+        given element, reusing the text node made previously for the element
+        if its text is unchanged so it keeps the same wrapper.
+        """
+        text_node = self._text_node_cache.lookup(element)
+        if text_node is None or text_node.text != element.text:
+            text_node = text_class(element.text, parent=element)
+            self._text_node_cache.store(element, text_node)
+        return text_node
 
     @property
     def impl_document(self):
@@ -217,6 +397,18 @@ class XmlImplAdapter(object):
         """
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        """
+        :return: an iterator of the element node descendents of the given
+            node that match the search constraints, in document order, as for
+            :meth:`find_node_elements`.
+
+        Adapters should override this to find each element only as it is
+        needed, so a search can stop early. This default implementation
+        iterates over the complete results of :meth:`find_node_elements`.
+        """
+        return iter(self.find_node_elements(node, name=name, ns_uri=ns_uri))
+
     def xpath_on_node(self, node, xpath, **kwargs):
         if not self.has_feature('xpath'):
             raise exceptions.FeatureUnavailableException('xpath')
@@ -247,6 +439,18 @@ class XmlImplAdapter(object):
     def get_node_local_name(self, node):
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def get_node_name_key(self, node):
+        """
+        :return: a tuple of the namespace URI and local name of the given
+            element, as matched by :meth:`find_node_elements`.
+
+        Adapters whose elements' names can be unpacked more directly than by
+        :meth:`get_node_namespace_uri` and :meth:`get_node_local_name`
+        should override this, for faster element indexing.
+        """
+        return (self.get_node_namespace_uri(node),
+                self.get_node_local_name(node))
+
     @abc.abstractmethod
     def get_node_name_prefix(self, node):
         raise NotImplementedError("Implementation missing for %s" % self)
@@ -271,6 +475,28 @@ class XmlImplAdapter(object):
     def get_node_attributes(self, element, ns_uri=None):
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def iter_node_attributes(self, element):
+        """
+        :return: an iterator of the implementation attribute nodes of the
+            given element, in the order they are stored by the underlying
+            implementation.
+
+        Adapters whose attribute nodes are built by *xml4h* rather than kept
+        by the underlying implementation should override this to build each
+        attribute node only as it is needed.
+        """
+        return iter(self.get_node_attributes(element))
+
+    def get_node_attribute_count(self, element):
+        """
+        :return: the number of attributes of the given element, as would be
+            returned by :meth:`get_node_attributes`.
+
+        Adapters should override this to count the attributes kept by the
+        underlying implementation without making attribute nodes.
+        """
+        return sum(1 for a in self.iter_node_attributes(element))
+
     @abc.abstractmethod
     def has_node_attribute(self, element, name, ns_uri=None):
         raise NotImplementedError("Implementation missing for %s" % self)
@@ -314,3 +540,141 @@ class XmlImplAdapter(object):
     @abc.abstractmethod
     def lookup_ns_prefix_for_uri(self, node, uri):
         raise NotImplementedError("Implementation missing for %s" % self)
+
+
+class _KeyedRef(weakref.ref):
+    """
+    Weak reference that knows the cache key of its referent.
+    """
+    __slots__ = ('key', )
+
+
+class _WeakValueCache(dict):
+    """
+    Dictionary of weak references to values, whose entries are removed when
+    their values are garbage collected. This is quicker and smaller than a
+    :class:`weakref.WeakValueDictionary` for values that die young.
+    """
+    __slots__ = ('_remove', '__weakref__')
+
+    def __init__(self):
+        super(_WeakValueCache, self).__init__()
+        self_ref = weakref.ref(self)
+
+        def remove(value_ref):
+            cache = self_ref()
+            if cache is not None:
+                cache.pop(value_ref.key, None)
+
+        self._remove = remove
+
+    def lookup(self, key):
+        """
+        Return the value for the given key, or None if there is none.
+        """
+        value_ref = self.get(key)
+        if value_ref is None:
+            return None
+        return value_ref()
+
+    def store(self, key, value):
+        # Replacing a reference discards it along with its callback, so the
+        # callback only removes the entry it was made for
+        value_ref = _KeyedRef(value, self._remove)
+        value_ref.key = key
+        self[key] = value_ref
+
+
+class KeepFilter(object):
+    """
+    Decide which elements to keep while parsing a document, given the
+    ``keep`` argument to :func:`xml4h.parse`: a list of element paths or
+    ``(name, ns_uri)`` tuples.
+
+    - A path starting with ``/``, such as ``'/catalog/product/price'``, is
+      matched by local element names from the root element.
+    - Any other path, such as ``'product/price'`` or ``'price'``, is matched
+      by local element names at any depth.
+    - A ``(name, ns_uri)`` tuple is matched by local name and namespace URI
+      at any depth. A *None* namespace URI matches any namespace.
+
+    Matching elements are kept with all their content, as are their
+    ancestors so the document structure stays intact. All other elements are
+    discarded.
+
+    Adapters call :meth:`start` and :meth:`end` as the parser starts and
+    finishes each element.
+    """
+
+    KEEP = 'keep'  # Element matches, or is within a matching element
+    MAYBE = 'maybe'  # Element may contain matching elements
+    REJECT = 'reject'  # Element cannot contain matching elements
+
+    def __init__(self, keep):
+        self.absolute_paths = []
+        self.relative_paths = []
+        for item in keep:
+            if isinstance(item, tuple):
+                self.relative_paths.append([item])
+            elif item.startswith('/'):
+                self.absolute_paths.append(
+                    [(name, None) for name in item[1:].split('/')])
+            else:
+                self.relative_paths.append(
+                    [(name, None) for name in item.split('/')])
+        self._path = []
+        self._states = []
+
+    def _is_match(self, names, pattern):
+        for (name, ns_uri), (pattern_name, pattern_ns_uri) in zip(
+                names, pattern):
+            if name != pattern_name:
+                return False
+            if pattern_ns_uri is not None and ns_uri != pattern_ns_uri:
+                return False
+        return True
+
+    def start(self, local_name, ns_uri):
+        """
+        Record the start of an element.
+
+        :return: the element's state: :attr:`KEEP`, :attr:`MAYBE` or
+            :attr:`REJECT`. Parsers may skip the content of a rejected
+            element entirely, provided they don't call :meth:`start` or
+            :meth:`end` for its descendants.
+        """
+        self._path.append((local_name, ns_uri))
+        parent_state = self._states[-1] if self._states else None
+        if parent_state in (self.KEEP, self.REJECT):
+            state = parent_state
+        elif any(len(self._path) == len(pattern)
+                 and self._is_match(self._path, pattern)
+                 for pattern in self.absolute_paths):
+            state = self.KEEP
+        elif any(len(self._path) >= len(pattern)
+                 and self._is_match(self._path[-len(pattern):], pattern)
+                 for pattern in self.relative_paths):
+            state = self.KEEP
+        elif self.relative_paths or any(
+                len(self._path) < len(pattern)
+                and self._is_match(self._path, pattern)
+                for pattern in self.absolute_paths):
+            state = self.MAYBE
+        else:
+            state = self.REJECT
+        self._states.append(state)
+        return state
+
+    def end(self, has_child_elements):
+        """
+        Record the end of the current element.
+
+        :param bool has_child_elements: whether the element has any child
+            elements left after discarding those not kept.
+        :return: *True* if the element should be kept, or *False* if it
+            should be discarded.
+        """
+        self._path.pop()
+        state = self._states.pop()
+        return state == self.KEEP or (
+            state == self.MAYBE and has_child_elements)
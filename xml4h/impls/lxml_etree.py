@@ -1,7 +1,10 @@
 import re
 import copy
+import collections
 
-from xml4h.impls.interface import XmlImplAdapter
+import six
+
+from xml4h.impls.interface import XmlImplAdapter, KeepFilter
 from xml4h import nodes, exceptions
 
 try:
@@ -17,6 +20,8 @@ class LXMLAdapter(XmlImplAdapter):
 
     SUPPORTED_FEATURES = {
         'xpath': True,
+        'iterparse': True,
+        'feed_parser': True,
         }
 
     @classmethod
@@ -28,24 +33,229 @@ class LXMLAdapter(XmlImplAdapter):
             return False
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
-        impl_root_elem = etree.fromstring(xml_str)
-        wrapped_doc = LXMLAdapter.wrap_document(impl_root_elem.getroottree())
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        if keep is not None or limits is not None:
+            tracker = None if limits is None else limits.tracker()
+            if isinstance(xml_str, six.text_type):
+                if tracker is not None:
+                    tracker.add_bytes(len(xml_str))
+                xml_file = six.StringIO(xml_str)
+            else:
+                if tracker is not None:
+                    tracker.add_bytes(memoryview(xml_str).nbytes)
+                xml_file = six.BytesIO(memoryview(xml_str).tobytes())
+            return cls._parse_with_events(
+                xml_file, ignore_whitespace_text_nodes, keep, tracker)
+        parser = cls._new_parser(ignore_whitespace_text_nodes)
+        impl_root_elem = etree.fromstring(xml_str, parser)
         if ignore_whitespace_text_nodes:
-            cls.ignore_whitespace_text_nodes(wrapped_doc)
-        return wrapped_doc
+            cls._strip_whitespace_text(impl_root_elem)
+        return LXMLAdapter.wrap_document(impl_root_elem.getroottree())
+
+    @classmethod
+    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        return LXMLAdapter.parse_string(
+            xml_bytes, ignore_whitespace_text_nodes, keep=keep, limits=limits)
+
+    @classmethod
+    def parse_buffer(cls, xml_buffer, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        # lxml parses directly from any object supporting the buffer protocol
+        return LXMLAdapter.parse_string(
+            xml_buffer, ignore_whitespace_text_nodes, keep=keep,
+            limits=limits)
+
+    @classmethod
+    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        if keep is not None or limits is not None:
+            tracker = None
+            if limits is not None:
+                tracker = limits.tracker()
+                xml_file = tracker.wrap_file(xml_file)
+            return cls._parse_with_events(
+                xml_file, ignore_whitespace_text_nodes, keep, tracker)
+        parser = cls._new_parser(ignore_whitespace_text_nodes)
+        impl_doc = etree.parse(xml_file, parser)
+        if ignore_whitespace_text_nodes:
+            cls._strip_whitespace_text(impl_doc.getroot())
+        return LXMLAdapter.wrap_document(impl_doc)
+
+    @classmethod
+    def parse_documents(cls, xml_datas, ignore_whitespace_text_nodes=True,
+            limits=None):
+        if limits is not None:
+            return super(LXMLAdapter, cls).parse_documents(
+                xml_datas, ignore_whitespace_text_nodes, limits=limits)
+        return cls._parse_documents_with_one_parser(
+            xml_datas, ignore_whitespace_text_nodes)
+    parse_documents.__func__.__doc__ = XmlImplAdapter.parse_documents.__doc__
 
     @classmethod
-    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True):
-        return LXMLAdapter.parse_string(xml_bytes, ignore_whitespace_text_nodes)
+    def _parse_documents_with_one_parser(cls, xml_datas,
+            ignore_whitespace_text_nodes):
+        # libxml2 reuses the parser's context for each document it parses,
+        # instead of setting up a new one per document
+        parser = cls._new_parser(ignore_whitespace_text_nodes)
+        for xml_data in xml_datas:
+            impl_root_elem = etree.fromstring(xml_data, parser)
+            if ignore_whitespace_text_nodes:
+                cls._strip_whitespace_text(impl_root_elem)
+            yield LXMLAdapter.wrap_document(impl_root_elem.getroottree())
 
     @classmethod
-    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True):
-        impl_doc = etree.parse(xml_file)
-        wrapped_doc = LXMLAdapter.wrap_document(impl_doc)
+    def iterparse(cls, xml_file, tag=None, ns_uri=None,
+            ignore_whitespace_text_nodes=True, limits=None):
+        if limits is None:
+            tracker = None
+            events = ('end',)
+            tag_filter = cls._tag_filter(tag, ns_uri)
+        else:
+            # Count every element, matching tags ourselves
+            tracker = limits.tracker()
+            xml_file = tracker.wrap_file(xml_file)
+            events = ('start', 'end')
+            tag_filter = None
+        adapter = None
+        for event, impl_elem in cls._iterparse_events(
+                xml_file, events, tag_filter, ignore_whitespace_text_nodes):
+            if tracker is not None:
+                if event == 'start':
+                    tracker.start_element(len(impl_elem.attrib))
+                    continue
+                tracker.end_element()
+                if not cls._is_tag_match(impl_elem, tag, ns_uri):
+                    continue
+            if adapter is None:
+                adapter = cls(impl_elem.getroottree())
+            if ignore_whitespace_text_nodes:
+                cls._strip_whitespace_text(impl_elem)
+            yield cls.wrap_node(impl_elem, adapter.impl_document, adapter)
+            # Free the processed element and any preceding siblings
+            impl_elem.clear()
+            while impl_elem.getprevious() is not None:
+                del impl_elem.getparent()[0]
+    iterparse.__func__.__doc__ = XmlImplAdapter.iterparse.__doc__
+
+    @classmethod
+    def _parse_with_events(cls, xml_file, ignore_whitespace_text_nodes,
+            keep=None, limits_tracker=None):
+        """
+        Parse a document from the iterative parser's events, keeping only
+        the elements matched by a :class:`~xml4h.impls.interface.KeepFilter`
+        if ``keep`` is given and discarding others as soon as they are
+        complete, and counting elements against the limits of
+        ``limits_tracker`` if it is given.
+        """
+        keep_filter = None if keep is None else KeepFilter(keep)
+        impl_root = None
+        for event, impl_elem in cls._iterparse_events(
+                xml_file, ('start', 'end'), None,
+                ignore_whitespace_text_nodes):
+            if event == 'start':
+                if impl_root is None:
+                    impl_root = impl_elem
+                if limits_tracker is not None:
+                    limits_tracker.start_element(len(impl_elem.attrib))
+                if keep_filter is not None:
+                    qname = etree.QName(impl_elem)
+                    keep_filter.start(qname.localname, qname.namespace)
+                continue
+            if limits_tracker is not None:
+                limits_tracker.end_element()
+            if (keep_filter is not None
+                    and not keep_filter.end(impl_elem.find('*') is not None)
+                    and impl_elem is not impl_root):
+                impl_elem.getparent().remove(impl_elem)
         if ignore_whitespace_text_nodes:
-            cls.ignore_whitespace_text_nodes(wrapped_doc)
-        return wrapped_doc
+            cls._strip_whitespace_text(impl_root)
+        return LXMLAdapter.wrap_document(impl_root.getroottree())
+
+    @classmethod
+    def new_feed_parser(cls, tag=None, ns_uri=None, emit_elements=False,
+            ignore_whitespace_text_nodes=True, limits=None):
+        return LXMLFeedParser(cls, tag, ns_uri, emit_elements,
+            ignore_whitespace_text_nodes,
+            limits_tracker=None if limits is None else limits.tracker())
+    new_feed_parser.__func__.__doc__ = XmlImplAdapter.new_feed_parser.__doc__
+
+    @classmethod
+    def _is_tag_match(cls, impl_elem, tag, ns_uri):
+        """
+        Return True if the given element has the given local name and
+        namespace URI, where a *None* constraint matches anything, as for
+        :meth:`_tag_filter`.
+        """
+        qname = etree.QName(impl_elem)
+        if tag is not None and qname.localname != tag:
+            return False
+        if ns_uri is not None and (qname.namespace or '') != ns_uri:
+            return False
+        return True
+
+    @classmethod
+    def _tag_filter(cls, tag, ns_uri):
+        """
+        Return a tag filter for lxml to match elements natively, where '{*}'
+        matches elements in any (or no) namespace.
+        """
+        if tag is None and ns_uri is None:
+            return None
+        return '{%s}%s' % (
+            '*' if ns_uri is None else ns_uri,
+            '*' if tag is None else tag)
+
+    @classmethod
+    def _iterparse_events(cls, xml_file, events, tag_filter,
+            ignore_whitespace_text_nodes):
+        """
+        Yield (event, element) pairs for the given events from lxml's
+        iterative parser.
+
+        lxml's ``iterparse`` only reads bytes, so file-like objects are fed
+        to a pull parser instead which also accepts decoded text, in which
+        case any encoding the document declares is ignored as it is for
+        ``parse_string`` with the other adapters.
+        """
+        if not hasattr(xml_file, 'read'):
+            for event_and_elem in etree.iterparse(
+                    xml_file, events=events, tag=tag_filter,
+                    remove_blank_text=ignore_whitespace_text_nodes):
+                yield event_and_elem
+            return
+        parser = etree.XMLPullParser(
+            events=events, tag=tag_filter,
+            remove_blank_text=ignore_whitespace_text_nodes)
+        while True:
+            data = xml_file.read(64 * 1024)
+            if not data:
+                break
+            parser.feed(data)
+            for event_and_elem in parser.read_events():
+                yield event_and_elem
+        parser.close()
+        for event_and_elem in parser.read_events():
+            yield event_and_elem
+
+    @classmethod
+    def _new_parser(cls, ignore_whitespace_text_nodes):
+        # Have libxml2 discard ignorable whitespace between elements as it
+        # parses, rather than building text we would only throw away
+        return etree.XMLParser(
+            remove_blank_text=ignore_whitespace_text_nodes)
+
+    @classmethod
+    def _strip_whitespace_text(cls, impl_elem):
+        """
+        Discard any whitespace-only text in the given element and its
+        descendants that the parser retained, such as the content of
+        elements with nothing but whitespace inside.
+        """
+        for n in impl_elem.iter(etree.Element):
+            if n.text is not None and n.text.strip() == '':
+                n.text = None
 
     @classmethod
     def new_impl_document(cls, root_tagname, ns_uri=None, **kwargs):
@@ -115,25 +325,23 @@ class LXMLAdapter(XmlImplAdapter):
         return LXMLText(text, is_cdata=True)
 
     def find_node_elements(self, node, name='*', ns_uri='*'):
-        # TODO Any proper way to find namespaced elements by name?
-        name_match_nodes = node.getiterator()
-        # Filter nodes by name and ns_uri if necessary
-        results = []
-        for n in name_match_nodes:
-            # Ignore the current node
-            if n == node:
-                continue
-            # Ignore non-Elements
-            if not n.__class__ == etree._Element:
-                continue
-            if ns_uri != '*' and self.get_node_namespace_uri(n) != ns_uri:
-                continue
-            if name != '*' and self.get_node_local_name(n) != name:
-                continue
-            results.append(n)
-        return results
+        return list(self.iter_node_elements(node, name=name, ns_uri=ns_uri))
     find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
 
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        if ns_uri == '':
+            # lxml would match elements in no namespace for an empty URI,
+            # but no element has an empty namespace URI
+            return
+        # Let lxml match elements natively
+        tag_filter = self._tag_filter(
+            None if name == '*' else name, None if ns_uri == '*' else ns_uri)
+        for n in node.iter(etree.Element if tag_filter is None else tag_filter):
+            # Ignore the current node
+            if n is not node:
+                yield n
+    iter_node_elements.__doc__ = XmlImplAdapter.iter_node_elements.__doc__
+
     def xpath_on_node(self, node, xpath, **kwargs):
         """
         Return result of performing the given XPath query on the given node.
@@ -199,7 +407,7 @@ class LXMLAdapter(XmlImplAdapter):
             children = node.getchildren()
             # Hack to treat text attribute as child text nodes
             if node.text is not None:
-                children.insert(0, LXMLText(node.text, parent=node))
+                children.insert(0, self._text_node_for(node, LXMLText))
         return children
 
     def get_node_name(self, node):
@@ -217,6 +425,12 @@ class LXMLAdapter(XmlImplAdapter):
     def get_node_local_name(self, node):
         return re.sub('{.*}', '', node.tag)
 
+    def get_node_name_key(self, node):
+        # lxml only matches names by the namespace URI in the tag
+        ns_part, brace, local_name = node.tag.rpartition('}')
+        return (ns_part[1:] if brace else None, local_name)
+    get_node_name_key.__doc__ = XmlImplAdapter.get_node_name_key.__doc__
+
     def get_node_name_prefix(self, node):
         # Believe non-Element nodes that have a prefix set (e.g. LXMLAttribute)
         if node.prefix and not isinstance(node, etree._Element):
@@ -259,48 +473,101 @@ class LXMLAdapter(XmlImplAdapter):
 
     def get_node_attributes(self, element, ns_uri=None):
         # TODO: Filter by ns_uri
-        attribs_by_qname = {}
-        for n, v in list(element.attrib.items()):
+        return list(self.iter_node_attributes(element))
+
+    def iter_node_attributes(self, element):
+        qnames = set()
+        for n, v in element.attrib.items():
             qname, ns_uri, prefix, local_name = self._unpack_name(n, element)
-            attribs_by_qname[qname] = LXMLAttribute(
-                qname, ns_uri, prefix, local_name, v, element)
+            qnames.add(qname)
+            yield LXMLAttribute(qname, ns_uri, prefix, local_name, v, element)
         # Include namespace declarations, which we also treat as attributes
-        if element.nsmap:
-            for n, v in list(element.nsmap.items()):
-                # Only add namespace as attribute if not defined in ancestors
-                # and not the global xmlns namespace
-                if (self._is_ns_in_ancestor(element, n, v)
-                        or v == nodes.Node.XMLNS_URI):
-                    continue
-                if n is None:
-                    ns_attr_name = 'xmlns'
-                else:
-                    ns_attr_name = 'xmlns:%s' % n
-                qname, ns_uri, prefix, local_name = self._unpack_name(
-                    ns_attr_name, element)
-                attribs_by_qname[qname] = LXMLAttribute(
+        for (qname, ns_uri, prefix, local_name), v in (
+                self._iter_ns_declarations(element)):
+            if qname not in qnames:
+                yield LXMLAttribute(
                     qname, ns_uri, prefix, local_name, v, element)
-        return list(attribs_by_qname.values())
+    iter_node_attributes.__doc__ = XmlImplAdapter.iter_node_attributes.__doc__
+
+    def get_node_attribute_count(self, element):
+        count = len(element.attrib)
+        qnames = None
+        for (qname, ns_uri, prefix, local_name), v in (
+                self._iter_ns_declarations(element)):
+            if qnames is None:
+                qnames = set(self._unpack_name(n, element)[0]
+                             for n in element.attrib.keys())
+            if qname not in qnames:
+                count += 1
+        return count
+    get_node_attribute_count.__doc__ = (
+        XmlImplAdapter.get_node_attribute_count.__doc__)
+
+    def _iter_ns_declarations(self, element):
+        """
+        Generate the unpacked attribute name and the URI of each namespace
+        declared by the given element, which lxml keeps in the element's
+        ``nsmap`` along with the namespaces declared by its ancestors.
+        """
+        if not element.nsmap:
+            return
+        for n, v in list(element.nsmap.items()):
+            # Only add namespace as attribute if not defined in ancestors
+            # and not the global xmlns namespace
+            if (self._is_ns_in_ancestor(element, n, v)
+                    or v == nodes.Node.XMLNS_URI):
+                continue
+            if n is None:
+                ns_attr_name = 'xmlns'
+            else:
+                ns_attr_name = 'xmlns:%s' % n
+            yield self._unpack_name(ns_attr_name, element), v
+
+    def _attribute_key(self, name, ns_uri):
+        """
+        Return the key of the named attribute in an element's ``attrib``
+        dictionary, or *None* for namespace declarations and prefixed names
+        which can only be found in the context of the element's ancestors.
+        """
+        if (':' in name or '}' in name or name == 'xmlns'
+                or ns_uri == nodes.Node.XMLNS_URI):
+            return None
+        elif ns_uri is None:
+            return name
+        return '{%s}%s' % (ns_uri, name)
 
     def has_node_attribute(self, element, name, ns_uri=None):
-        return name in [a.qname for a
-                        in self.get_node_attributes(element, ns_uri)]
+        return self.get_node_attribute_value(element, name, ns_uri) is not None
 
     def get_node_attribute_node(self, element, name, ns_uri=None):
-        for attr in self.get_node_attributes(element, ns_uri):
-            if attr.qname == name:
-                return attr
-        return None
-
-    def get_node_attribute_value(self, element, name, ns_uri=None):
+        key = self._attribute_key(name, ns_uri)
+        if key is not None:
+            value = element.get(key)
+            if value is None:
+                return None
+            qname, ns_uri, prefix, local_name = self._unpack_name(
+                key, element)
+            return LXMLAttribute(
+                qname, ns_uri, prefix, local_name, value, element)
         if ns_uri is not None:
             prefix = self.lookup_ns_prefix_for_uri(element, ns_uri)
             name = '%s:%s' % (prefix, name)
         for attr in self.get_node_attributes(element, ns_uri):
             if attr.qname == name:
-                return attr.value
+                return attr
         return None
 
+    def get_node_attribute_value(self, element, name, ns_uri=None):
+        key = self._attribute_key(name, ns_uri)
+        if key is not None:
+            # Look up the attribute directly, rather than among every
+            # attribute and namespace declaration of the element
+            return element.get(key)
+        attr = self.get_node_attribute_node(element, name, ns_uri)
+        if attr is None:
+            return None
+        return attr.value
+
     def set_node_attribute_value(self, element, name, value, ns_uri=None):
         prefix = None
         if ':' in name:
@@ -412,6 +679,9 @@ class LXMLAdapter(XmlImplAdapter):
     def lookup_ns_prefix_for_uri(self, node, uri):
         if uri == nodes.Node.XMLNS_URI:
             return 'xmlns'
+        elif uri == nodes.Node.XML_URI:
+            # The xml prefix is bound implicitly, so is never in an nsmap
+            return 'xml'
         result = None
         if hasattr(node, 'nsmap') and uri in list(node.nsmap.values()):
             for n, v in list(node.nsmap.items()):
@@ -479,8 +749,91 @@ class LXMLAdapter(XmlImplAdapter):
         return False
 
 
+class LXMLFeedParser(object):
+    """
+    Parser for XML data fed in chunks, as returned by
+    :meth:`LXMLAdapter.new_feed_parser`.
+    """
+
+    def __init__(self, adapter_class, tag, ns_uri, emit_elements,
+            ignore_whitespace_text_nodes, limits_tracker=None):
+        self._adapter_class = adapter_class
+        self._adapter = None
+        self._tag = tag
+        self._ns_uri = ns_uri
+        self._emit_elements = emit_elements
+        self._ignore_whitespace_text_nodes = ignore_whitespace_text_nodes
+        self._limits_tracker = limits_tracker
+        if limits_tracker is not None:
+            # Count every element from the parser's events, which must be
+            # read as each chunk is fed
+            self._parser = etree.XMLPullParser(
+                events=('start', 'end'),
+                remove_blank_text=ignore_whitespace_text_nodes)
+            self._completed_elements = collections.deque()
+        elif emit_elements:
+            self._parser = etree.XMLPullParser(
+                events=('end',), tag=adapter_class._tag_filter(tag, ns_uri),
+                remove_blank_text=ignore_whitespace_text_nodes)
+        else:
+            self._parser = adapter_class._new_parser(
+                ignore_whitespace_text_nodes)
+
+    def _get_adapter(self, impl_elem):
+        if self._adapter is None:
+            self._adapter = self._adapter_class(impl_elem.getroottree())
+        return self._adapter
+
+    def _process_events(self):
+        for event, impl_elem in self._parser.read_events():
+            if event == 'start':
+                self._limits_tracker.start_element(len(impl_elem.attrib))
+                continue
+            self._limits_tracker.end_element()
+            if (self._emit_elements and self._adapter_class._is_tag_match(
+                    impl_elem, self._tag, self._ns_uri)):
+                self._completed_elements.append(impl_elem)
+
+    def _read_impl_elements(self):
+        if self._limits_tracker is not None:
+            while self._completed_elements:
+                yield self._completed_elements.popleft()
+        else:
+            for event, impl_elem in self._parser.read_events():
+                yield impl_elem
+
+    def feed(self, data):
+        if self._limits_tracker is not None:
+            self._limits_tracker.add_bytes(len(data))
+            self._parser.feed(data)
+            self._process_events()
+        else:
+            self._parser.feed(data)
+
+    def read_elements(self):
+        if not self._emit_elements:
+            return
+        for impl_elem in self._read_impl_elements():
+            adapter = self._get_adapter(impl_elem)
+            if self._ignore_whitespace_text_nodes:
+                self._adapter_class._strip_whitespace_text(impl_elem)
+            yield self._adapter_class.wrap_node(
+                impl_elem, adapter.impl_document, adapter)
+
+    def close(self):
+        impl_root = self._parser.close()
+        if self._limits_tracker is not None:
+            self._process_events()
+        if self._ignore_whitespace_text_nodes:
+            self._adapter_class._strip_whitespace_text(impl_root)
+        adapter = self._get_adapter(impl_root)
+        return nodes.Document(adapter.impl_document, adapter)
+
+
 class LXMLText(object):
 
+    __slots__ = ('_text', '_parent', '_is_cdata', '__weakref__')
+
     def __init__(self, text, parent=None, is_cdata=False):
         self._text = text
         self._parent = parent
@@ -513,6 +866,9 @@ class LXMLText(object):
 
 class LXMLAttribute(object):
 
+    __slots__ = ('_qname', '_ns_uri', '_prefix', '_local_name', '_value',
+                 '_element')
+
     def __init__(self, qname, ns_uri, prefix, local_name, value, element):
         self._qname, self._ns_uri, self._prefix, self._local_name = (
             qname, ns_uri, prefix, local_name)
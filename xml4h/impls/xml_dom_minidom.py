@@ -1,10 +1,13 @@
-from six import StringIO, BytesIO
+from six import StringIO
 
-from xml4h.impls.interface import XmlImplAdapter
+from xml4h.impls.interface import XmlImplAdapter, KeepFilter
 from xml4h import nodes, exceptions
 
 import xml.dom
+import xml.dom.expatbuilder
 import xml.dom.minidom
+import xml.dom.NodeFilter
+import xml.dom.xmlbuilder
 
 
 class XmlDomImplAdapter(XmlImplAdapter):
@@ -23,20 +26,79 @@ class XmlDomImplAdapter(XmlImplAdapter):
             return False
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
-        return cls.parse_file(StringIO(xml_str), ignore_whitespace_text_nodes)
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        return cls.parse_file(
+            StringIO(xml_str), ignore_whitespace_text_nodes, keep=keep,
+            limits=limits)
 
     @classmethod
-    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True):
-        return cls.parse_file(BytesIO(xml_bytes), ignore_whitespace_text_nodes)
+    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        return cls.parse_buffer(
+            xml_bytes, ignore_whitespace_text_nodes, keep=keep, limits=limits)
 
     @classmethod
-    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True):
-        impl_doc = xml.dom.minidom.parse(xml_file)
-        wrapped_doc = XmlDomImplAdapter.wrap_document(impl_doc)
+    def parse_buffer(cls, xml_buffer, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        tracker = None
+        if limits is not None:
+            tracker = limits.tracker()
+            tracker.add_bytes(memoryview(xml_buffer).nbytes)
+        # The expat parser reads directly from any object supporting the
+        # buffer protocol, so there is no need to copy data into a file
+        impl_doc = cls._new_builder(keep, tracker).parseString(xml_buffer)
         if ignore_whitespace_text_nodes:
-            cls.ignore_whitespace_text_nodes(wrapped_doc)
-        return wrapped_doc
+            cls._strip_whitespace_text(impl_doc)
+        return XmlDomImplAdapter.wrap_document(impl_doc)
+
+    @classmethod
+    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        tracker = None
+        if limits is not None:
+            tracker = limits.tracker()
+            xml_file = tracker.wrap_file(xml_file)
+        if hasattr(xml_file, 'read'):
+            impl_doc = cls._new_builder(keep, tracker).parseFile(xml_file)
+        else:
+            with open(xml_file, 'rb') as f:
+                impl_doc = cls._new_builder(keep, tracker).parseFile(f)
+        if ignore_whitespace_text_nodes:
+            cls._strip_whitespace_text(impl_doc)
+        return XmlDomImplAdapter.wrap_document(impl_doc)
+
+    @classmethod
+    def _new_builder(cls, keep=None, limits_tracker=None):
+        """
+        Return the expat-based builder minidom uses to parse documents, with
+        a filter to skip elements not matched by ``keep`` if it is given,
+        and enforcing the limits of ``limits_tracker`` if it is given.
+        """
+        if keep is None and limits_tracker is None:
+            return xml.dom.expatbuilder.ExpatBuilderNS()
+        options = xml.dom.xmlbuilder.Options()
+        if keep is not None:
+            options.filter = KeepDOMBuilderFilter(KeepFilter(keep))
+        return FilteringExpatBuilderNS(options, limits_tracker)
+
+    @classmethod
+    def _strip_whitespace_text(cls, impl_node):
+        """
+        Remove whitespace-only text nodes from the given node and its
+        descendants, working directly on minidom nodes since minidom's
+        parser has no option to skip these as it goes.
+        """
+        pending = [impl_node]
+        while pending:
+            node = pending.pop()
+            for child in list(node.childNodes):
+                if child.nodeType == xml.dom.Node.TEXT_NODE:
+                    if child.data.strip() == '':
+                        node.removeChild(child)
+                        child.unlink()
+                elif child.childNodes:
+                    pending.append(child)
 
     @classmethod
     def new_impl_document(cls, root_tagname, ns_uri=None,
@@ -92,6 +154,20 @@ class XmlDomImplAdapter(XmlImplAdapter):
     def find_node_elements(self, node, name='*', ns_uri='*'):
         return node.getElementsByTagNameNS(ns_uri, name)
 
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        # Walk the DOM lazily, matching elements as getElementsByTagNameNS
+        # does
+        pending = list(reversed(node.childNodes))
+        while pending:
+            n = pending.pop()
+            if n.nodeType != xml.dom.Node.ELEMENT_NODE:
+                continue
+            if ((name == '*' or n.localName == name)
+                    and (ns_uri == '*' or n.namespaceURI == ns_uri)):
+                yield n
+            pending.extend(reversed(n.childNodes))
+    iter_node_elements.__doc__ = XmlImplAdapter.iter_node_elements.__doc__
+
     def get_node_namespace_uri(self, node):
         return node.namespaceURI
 
@@ -162,6 +238,8 @@ class XmlDomImplAdapter(XmlImplAdapter):
             self.add_node_child(node, text_node)
 
     def get_node_attributes(self, element, ns_uri=None):
+        if ns_uri is None:
+            return list(self.iter_node_attributes(element))
         attr_nodes = []
         if not element.attributes:
             return attr_nodes
@@ -171,6 +249,21 @@ class XmlDomImplAdapter(XmlImplAdapter):
                     self.get_node_attribute_node(element, attr_name, ns_uri))
         return attr_nodes
 
+    def iter_node_attributes(self, element):
+        if not element.attributes:
+            return iter(())
+        # Copy the attribute nodes, which minidom keeps in a dictionary that
+        # changes size as attributes are added or removed
+        return iter(list(element.attributes.values()))
+    iter_node_attributes.__doc__ = XmlImplAdapter.iter_node_attributes.__doc__
+
+    def get_node_attribute_count(self, element):
+        if not element.attributes:
+            return 0
+        return len(element.attributes)
+    get_node_attribute_count.__doc__ = (
+        XmlImplAdapter.get_node_attribute_count.__doc__)
+
     def has_node_attribute(self, element, name, ns_uri=None):
         if ns_uri is not None:
             return element.hasAttributeNS(ns_uri, name)
@@ -186,14 +279,15 @@ class XmlDomImplAdapter(XmlImplAdapter):
     def get_node_attribute_value(self, element, name, ns_uri=None):
         if isinstance(element, xml.dom.minidom.Document):
             return None
+        # Look up the attribute node, since minidom returns an empty string
+        # for the value of a non-existent attribute
         if ns_uri is not None:
-            result = element.getAttributeNS(ns_uri, name)
+            attr = element.getAttributeNodeNS(ns_uri, name)
         else:
-            result = element.getAttribute(name)
-        # Minidom returns empty string for non-existent nodes, correct this
-        if result == '' and not name in list(element.attributes.keys()):
+            attr = element.getAttributeNode(name)
+        if attr is None:
             return None
-        return result
+        return attr.value
 
     def set_node_attribute_value(self, element, name, value, ns_uri=None):
         element.setAttributeNS(ns_uri, name, value)
@@ -247,3 +341,72 @@ class XmlDomImplAdapter(XmlImplAdapter):
                         return attr.name
             curr_node = self.get_node_parent(curr_node)
         return None
+
+
+class KeepDOMBuilderFilter(xml.dom.xmlbuilder.DOMBuilderFilter):
+    """
+    Filter for minidom's expat-based builder that skips elements not matched
+    by a :class:`~xml4h.impls.interface.KeepFilter`. Elements that cannot
+    contain matches are rejected as soon as they start, so they are never
+    built at all.
+    """
+
+    whatToShow = xml.dom.NodeFilter.NodeFilter.SHOW_ELEMENT
+
+    def __init__(self, keep_filter):
+        self._keep_filter = keep_filter
+        self._root_started = False
+
+    def startContainer(self, element):
+        # The builder never passes the root element to its filter
+        if not self._root_started:
+            root = element.ownerDocument.documentElement
+            self._keep_filter.start(root.localName, root.namespaceURI)
+            self._root_started = True
+        state = self._keep_filter.start(
+            element.localName, element.namespaceURI)
+        if state == KeepFilter.REJECT:
+            self._keep_filter.end(False)
+            return self.FILTER_REJECT
+        return self.FILTER_ACCEPT
+
+    def acceptNode(self, element):
+        has_child_elements = any(
+            n.nodeType == xml.dom.Node.ELEMENT_NODE
+            for n in element.childNodes)
+        if self._keep_filter.end(has_child_elements):
+            return self.FILTER_ACCEPT
+        return self.FILTER_REJECT
+
+
+class FilteringExpatBuilderNS(xml.dom.expatbuilder.ExpatBuilderNS):
+    """
+    Namespace-aware expat builder that consults its filter when elements
+    start, which the standard builder neglects to do so it cannot skip
+    elements before building them. It also counts elements against the
+    limits of a :class:`~xml4h.limits.ParseLimitsTracker`, if given one.
+    """
+
+    def __init__(self, options=None, limits_tracker=None):
+        xml.dom.expatbuilder.ExpatBuilderNS.__init__(self, options)
+        self._limits_tracker = limits_tracker
+
+    def start_element_handler(self, name, attributes):
+        if self._limits_tracker is not None:
+            # Attributes are a flat list of alternating names and values
+            self._limits_tracker.start_element(len(attributes) // 2)
+        xml.dom.expatbuilder.ExpatBuilderNS.start_element_handler(
+            self, name, attributes)
+        node = self.curNode
+        if node is not self.document.documentElement:
+            self._finish_start_element(node)
+            if (self._limits_tracker is not None
+                    and self.curNode is not node):
+                # The filter rejected the element, so the builder won't see
+                # its end
+                self._limits_tracker.end_element()
+
+    def end_element_handler(self, name):
+        xml.dom.expatbuilder.ExpatBuilderNS.end_element_handler(self, name)
+        if self._limits_tracker is not None:
+            self._limits_tracker.end_element()
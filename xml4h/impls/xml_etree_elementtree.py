@@ -1,9 +1,11 @@
 import re
 import copy
+import collections
+import weakref
 
 import six
 
-from xml4h.impls.interface import XmlImplAdapter
+from xml4h.impls.interface import XmlImplAdapter, KeepFilter
 from xml4h import nodes, exceptions
 
 # Import the pure-Python ElementTree implementation, if possible
@@ -22,6 +24,14 @@ except ImportError:
     pass
 
 
+def _version_tuple(version):
+    """
+    Return a tuple of the numbers in a version string like '1.3.0', for
+    comparing versions.
+    """
+    return tuple(int(n) for n in re.findall(r'\d+', version))
+
+
 class ElementTreeAdapter(XmlImplAdapter):
     """
     Adapter to the
@@ -35,8 +45,13 @@ class ElementTreeAdapter(XmlImplAdapter):
 
     ET = PythonET  # Use the pure-Python implementation
 
+    # Size of the chunks of a buffer that are fed to the parser at a time
+    BUFFER_CHUNK_SIZE = 64 * 1024
+
     SUPPORTED_FEATURES = {
         'xpath': True,
+        'iterparse': True,
+        'feed_parser': True,
         }
 
     @classmethod
@@ -47,38 +62,196 @@ class ElementTreeAdapter(XmlImplAdapter):
         except:
             return False
         # We only support ElementTree version 1.3+
-        from distutils.version import StrictVersion
-        return StrictVersion(BaseET.VERSION) >= StrictVersion('1.3')
+        return _version_tuple(BaseET.VERSION) >= (1, 3)
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
         return cls.parse_file(
             six.StringIO(xml_str),
-            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes)
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            keep=keep, limits=limits)
 
     @classmethod
-    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True):
-        return cls.parse_file(
-            six.BytesIO(xml_bytes),
-            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes)
+    def parse_bytes(cls, xml_bytes, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        return cls.parse_buffer(
+            xml_bytes,
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            keep=keep, limits=limits)
+
+    @classmethod
+    def parse_buffer(cls, xml_buffer, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        parser = ElementTreeFeedParser(cls, None, None, False,
+            ignore_whitespace_text_nodes, keep=keep,
+            limits_tracker=None if limits is None else limits.tracker())
+        # Feed the parser slices of a memory view, which share the buffer's
+        # memory instead of copying it
+        view = memoryview(xml_buffer)
+        for offset in range(0, len(view), cls.BUFFER_CHUNK_SIZE):
+            parser.feed(view[offset:offset + cls.BUFFER_CHUNK_SIZE])
+        return parser.close()
 
     @classmethod
-    def parse_file(cls, xml_file_path, ignore_whitespace_text_nodes=True):
-        # To retain explicit xmlns namespace definition attributes, we need to
-        # manually add these elements to the parsed DOM as we go using
-        # iterative parsing per:
-        # effbot.org/zone/element-namespaces.htm#preserving-existing-namespace-attributes
-        events = ('start', 'start-ns')
+    def parse_file(cls, xml_file_path, ignore_whitespace_text_nodes=True,
+            keep=None, limits=None):
+        tracker = None if limits is None else limits.tracker()
+        if keep is not None:
+            return cls._parse_file_and_keep(
+                xml_file_path, ignore_whitespace_text_nodes, keep, tracker)
+        if tracker is not None:
+            xml_file_path = tracker.wrap_file(xml_file_path)
         impl_root = None
-        ns_list = []
-        for event, node in cls.ET.iterparse(xml_file_path, events):
+        for event, node in cls._iterparse_with_xmlns_attributes(
+                xml_file_path, ('start',), ignore_whitespace_text_nodes,
+                tracker):
+            # Recognise and retain root node
+            if impl_root is None:
+                impl_root = node
+        impl_doc = cls.ET.ElementTree(impl_root)
+        return cls.wrap_document(impl_doc)
+
+    @classmethod
+    def _parse_file_and_keep(cls, xml_file, ignore_whitespace_text_nodes,
+            keep, limits_tracker=None):
+        """
+        Parse a document keeping only the elements matched by a
+        :class:`~xml4h.impls.interface.KeepFilter`, discarding others as
+        soon as they are complete.
+        """
+        if not hasattr(xml_file, 'read'):
+            with open(xml_file, 'rb') as f:
+                return cls._parse_file_and_keep(
+                    f, ignore_whitespace_text_nodes, keep, limits_tracker)
+        parser = ElementTreeFeedParser(cls, None, None, False,
+            ignore_whitespace_text_nodes, keep=keep,
+            limits_tracker=limits_tracker)
+        while True:
+            data = xml_file.read(cls.BUFFER_CHUNK_SIZE)
+            if not data:
+                break
+            parser.feed(data)
+        return parser.close()
+
+    @classmethod
+    def iterparse(cls, xml_file, tag=None, ns_uri=None,
+            ignore_whitespace_text_nodes=True, limits=None):
+        tracker = None
+        if limits is not None:
+            tracker = limits.tracker()
+            xml_file = tracker.wrap_file(xml_file)
+        adapter = None
+        # ElementTree nodes don't know their parents, so track the stack of
+        # open elements to find the parent of each completed element
+        open_elements = []
+        for event, node in cls._iterparse_with_xmlns_attributes(
+                xml_file, ('start', 'end'), ignore_whitespace_text_nodes,
+                tracker):
+            if event == 'start':
+                if adapter is None:
+                    adapter = cls(cls.ET.ElementTree(node))
+                open_elements.append(node)
+                continue
+            open_elements.pop()
+            if not cls._is_tag_match(node, tag, ns_uri):
+                continue
+            # Answer parent lookups from the open elements and the completed
+            # element's own subtree, rather than the whole partial document
+            ancestry = _ParentIndex.from_parents(
+                zip(open_elements[1:], open_elements[:-1]))
+            if open_elements:
+                ancestry[node] = open_elements[-1]
+            ancestry.add_descendants(node)
+            adapter.CACHED_ANCESTRY_DICT = ancestry
+            yield cls.wrap_node(node, adapter.impl_document, adapter)
+            # Free the processed element and any preceding siblings
+            node.clear()
+            if open_elements:
+                parent = open_elements[-1]
+                for i, sibling in enumerate(parent):
+                    if sibling is node:
+                        del parent[:i]
+                        break
+    iterparse.__func__.__doc__ = XmlImplAdapter.iterparse.__doc__
+
+    @classmethod
+    def new_feed_parser(cls, tag=None, ns_uri=None, emit_elements=False,
+            ignore_whitespace_text_nodes=True, limits=None):
+        return ElementTreeFeedParser(cls, tag, ns_uri, emit_elements,
+            ignore_whitespace_text_nodes,
+            limits_tracker=None if limits is None else limits.tracker())
+    new_feed_parser.__func__.__doc__ = XmlImplAdapter.new_feed_parser.__doc__
+
+    @classmethod
+    def _is_tag_match(cls, node, tag, ns_uri):
+        """
+        Return True if the given element node has the given local name and
+        namespace URI, where a *None* constraint matches anything.
+        """
+        if not isinstance(node.tag, six.string_types):
+            return False
+        node_ns_uri, local_name = cls._split_clark_name(node.tag)
+        if tag is not None and local_name != tag:
+            return False
+        if ns_uri is not None and node_ns_uri != ns_uri:
+            return False
+        return True
+
+    @classmethod
+    def _split_clark_name(cls, tag):
+        """
+        Return the namespace URI, or None, and local name of the given
+        '{ns_uri}local_name' element tag.
+        """
+        if '}' in tag:
+            return tuple(tag[1:].split('}'))
+        return None, tag
+
+    @classmethod
+    def _iterparse_with_xmlns_attributes(cls, xml_file, events,
+            ignore_whitespace_text_nodes=False, limits_tracker=None):
+        """
+        Yield (event, node) pairs for the given 'start' and/or 'end' events
+        from the implementation's iterative parser, per
+        :meth:`_with_xmlns_attributes`.
+        """
+        return cls._with_xmlns_attributes(
+            cls.ET.iterparse(xml_file, ('start', 'start-ns', 'end')),
+            events, ignore_whitespace_text_nodes,
+            limits_tracker=limits_tracker)
+
+    @classmethod
+    def _with_xmlns_attributes(cls, impl_events, events,
+            ignore_whitespace_text_nodes=False, ns_list=None,
+            limits_tracker=None):
+        """
+        Yield (event, node) pairs for the given 'start' and/or 'end' events
+        from the 'start', 'start-ns' and 'end' events of the implementation's
+        iterative or pull parser.
+
+        To retain explicit xmlns namespace definition attributes, we need to
+        manually add these elements to the parsed DOM as we go using
+        iterative parsing per:
+        effbot.org/zone/element-namespaces.htm#preserving-existing-namespace-attributes
+
+        If ``ignore_whitespace_text_nodes`` is set, whitespace-only text is
+        discarded from each element as soon as the element is complete.
+
+        Pass in an ``ns_list`` to keep track of declared namespaces across
+        several batches of events, and a ``limits_tracker`` to count elements
+        against :class:`~xml4h.ParseLimits`.
+        """
+        if ns_list is None:
+            ns_list = []
+        for event, node in impl_events:
             if event == 'start-ns':
                 # Track namespaces as nodes declared
                 ns_list.append(node)
+                continue
             elif event == 'start':
-                # Recognise and retain root node
-                if impl_root is None:
-                    impl_root = node
+                if limits_tracker is not None:
+                    limits_tracker.start_element(len(node.attrib))
                 # Add xmlns attributes for each namespace declared
                 for ns_prefix, ns_uri in ns_list:
                     if ns_prefix:
@@ -87,13 +260,21 @@ class ElementTreeAdapter(XmlImplAdapter):
                         attr_name = 'xmlns'
                     node.set(attr_name, ns_uri)
                 # Reset namespace list now the corresponding attributes exist
-                ns_list = []
-
-        impl_doc = cls.ET.ElementTree(impl_root)
-        wrapped_doc = cls.wrap_document(impl_doc)
-        if ignore_whitespace_text_nodes:
-            cls.ignore_whitespace_text_nodes(wrapped_doc)
-        return wrapped_doc
+                del ns_list[:]
+            else:
+                if limits_tracker is not None:
+                    limits_tracker.end_element()
+                if ignore_whitespace_text_nodes:
+                    # An element's text, and the tails of its children, are
+                    # final by the time we see its 'end' event
+                    if node.text is not None and node.text.strip() == '':
+                        node.text = None
+                    for child in node:
+                        if (child.tail is not None
+                                and child.tail.strip() == ''):
+                            child.tail = None
+            if event in events:
+                yield event, node
 
     @classmethod
     def new_impl_document(cls, root_tagname, ns_uri=None, **kwargs):
@@ -107,23 +288,26 @@ class ElementTreeAdapter(XmlImplAdapter):
         doc = cls.ET.ElementTree(root_elem)
         return doc
 
-    # This method is called by interface super-class's __init__
+    def __init__(self, document):
+        super(ElementTreeAdapter, self).__init__(document)
+        # Adapters for the same document share its parent index, so changes
+        # made through any of them are seen by all
+        self.CACHED_ANCESTRY_DICT = _ParentIndex.for_document(document)
+
     def clear_caches(self):
-        self.CACHED_ANCESTRY_DICT = {}
+        super(ElementTreeAdapter, self).clear_caches()
+        self.CACHED_ANCESTRY_DICT = _ParentIndex.for_document(
+            self._impl_document)
+        self.CACHED_ANCESTRY_DICT.clear()
 
     def _lookup_node_parent(self, node):
         """
-        Return the parent of the given node, based on an internal dictionary
+        Return the parent of the given node, based on an internal index
         mapping of child nodes to the child's parent required since
         ElementTree doesn't make info about node ancestry/parentage available.
+        Returns None for a node that is not in the document.
         """
-        # Basic caching of our internal ancestry dict to help performance
-        if not node in self.CACHED_ANCESTRY_DICT:
-            # Given node isn't in cached ancestry dictionary, rebuild this now
-            ancestry_dict = dict(
-                (c, p) for p in self._impl_document.getiterator() for c in p)
-            self.CACHED_ANCESTRY_DICT = ancestry_dict
-        return self.CACHED_ANCESTRY_DICT[node]
+        return self.CACHED_ANCESTRY_DICT.get(node)
 
     def _is_node_an_element(self, node):
         """
@@ -185,24 +369,37 @@ class ElementTreeAdapter(XmlImplAdapter):
         return ElementTreeText(text, is_cdata=True)
 
     def find_node_elements(self, node, name='*', ns_uri='*'):
-        # TODO Any proper way to find namespaced elements by name?
-        name_match_nodes = node.getiterator()
-        # Filter nodes by name and ns_uri if necessary
-        results = []
-        for n in name_match_nodes:
+        return list(self.iter_node_elements(node, name=name, ns_uri=ns_uri))
+    find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
+
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        if name != '*' and ns_uri != '*':
+            # Let ElementTree match the fully-qualified tag natively
+            for n in node.iter('{%s}%s' % (ns_uri, name)):
+                # Ignore the current node
+                if n is not node:
+                    yield n
+            return
+        name_suffix = '}%s' % name
+        ns_prefix = '{%s}' % ns_uri
+        for n in node.iter():
             # Ignore the current node
-            if n == node:
+            if n is node:
                 continue
+            tag = n.tag
             # Ignore non-Elements
-            if not isinstance(n.tag, six.string_types):
-                continue
-            if ns_uri != '*' and self.get_node_namespace_uri(n) != ns_uri:
+            if not isinstance(tag, six.string_types):
                 continue
-            if name != '*' and self.get_node_local_name(n) != name:
+            if name != '*' and tag != name and not tag.endswith(name_suffix):
                 continue
-            results.append(n)
-        return results
-    find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
+            if ns_uri != '*' and not tag.startswith(ns_prefix):
+                # Only a tag with a prefix rather than a namespace URI can
+                # still be in the namespace, found by looking up the prefix
+                if ('}' in tag or ':' not in tag
+                        or self.get_node_namespace_uri(n) != ns_uri):
+                    continue
+            yield n
+    iter_node_elements.__doc__ = XmlImplAdapter.iter_node_elements.__doc__
 
     def xpath_on_node(self, node, xpath, **kwargs):
         """
@@ -270,12 +467,12 @@ class ElementTreeAdapter(XmlImplAdapter):
         if isinstance(node, BaseET.ElementTree):
             children = [node.getroot()]
         else:
-            if not hasattr(node, 'getchildren'):
+            if not hasattr(node, 'iter'):
                 return []
-            children = list(node.getchildren())
+            children = list(node)
             # Hack to treat text attribute as child text nodes
             if node.text is not None:
-                children.insert(0, ElementTreeText(node.text, parent=node))
+                children.insert(0, self._text_node_for(node, ElementTreeText))
         return children
 
     def get_node_name(self, node):
@@ -293,6 +490,18 @@ class ElementTreeAdapter(XmlImplAdapter):
     def get_node_local_name(self, node):
         return re.sub('{.*}', '', node.tag)
 
+    def get_node_name_key(self, node):
+        tag = node.tag
+        ns_part, brace, local_name = tag.rpartition('}')
+        if brace:
+            return (ns_part[1:], local_name)
+        elif ':' in tag:
+            # Only a prefixed tag's namespace is looked up, as for
+            # iter_node_elements
+            return (self.get_node_namespace_uri(node), local_name)
+        return (None, local_name)
+    get_node_name_key.__doc__ = XmlImplAdapter.get_node_name_key.__doc__
+
     def get_node_name_prefix(self, node):
         # Ignore non-elements
         if not isinstance(node.tag, six.string_types):
@@ -341,32 +550,64 @@ class ElementTreeAdapter(XmlImplAdapter):
 
     def get_node_attributes(self, element, ns_uri=None):
         # TODO: Filter by ns_uri
-        attribs_by_qname = {}
+        return list(self.iter_node_attributes(element))
+
+    def iter_node_attributes(self, element):
         for n, v in list(element.attrib.items()):
             qname, ns_uri, prefix, local_name = self._unpack_name(n, element)
-            attribs_by_qname[qname] = ETAttribute(
-                qname, ns_uri, prefix, local_name, v, element)
-        return list(attribs_by_qname.values())
+            yield ETAttribute(qname, ns_uri, prefix, local_name, v, element)
+    iter_node_attributes.__doc__ = XmlImplAdapter.iter_node_attributes.__doc__
+
+    def get_node_attribute_count(self, element):
+        return len(element.attrib)
+    get_node_attribute_count.__doc__ = (
+        XmlImplAdapter.get_node_attribute_count.__doc__)
+
+    def _attribute_key(self, name, ns_uri):
+        """
+        Return the key of the named attribute in an element's ``attrib``
+        dictionary, or *None* for namespace declarations and prefixed names
+        which can only be found in the context of the element's ancestors.
+        """
+        if (':' in name or '}' in name or name == 'xmlns'
+                or ns_uri == nodes.Node.XMLNS_URI):
+            return None
+        elif ns_uri is None:
+            return name
+        return '{%s}%s' % (ns_uri, name)
 
     def has_node_attribute(self, element, name, ns_uri=None):
-        return name in [a.qname for a
-                        in self.get_node_attributes(element, ns_uri)]
+        return self.get_node_attribute_value(element, name, ns_uri) is not None
 
     def get_node_attribute_node(self, element, name, ns_uri=None):
-        for attr in self.get_node_attributes(element, ns_uri):
-            if attr.qname == name:
-                return attr
-        return None
-
-    def get_node_attribute_value(self, element, name, ns_uri=None):
+        key = self._attribute_key(name, ns_uri)
+        if key is not None:
+            value = element.get(key)
+            if value is None:
+                return None
+            qname, ns_uri, prefix, local_name = self._unpack_name(
+                key, element)
+            return ETAttribute(
+                qname, ns_uri, prefix, local_name, value, element)
         if ns_uri is not None:
             prefix = self.lookup_ns_prefix_for_uri(element, ns_uri)
             name = '%s:%s' % (prefix, name)
         for attr in self.get_node_attributes(element, ns_uri):
             if attr.qname == name:
-                return attr.value
+                return attr
         return None
 
+    def get_node_attribute_value(self, element, name, ns_uri=None):
+        key = self._attribute_key(name, ns_uri)
+        if key is not None:
+            # Look up the attribute directly, rather than among every
+            # attribute and namespace declaration of the element
+            return element.get(key)
+        attr = self.get_node_attribute_node(element, name, ns_uri)
+        if attr is None:
+            return None
+        return attr.value
+
     def set_node_attribute_value(self, element, name, value, ns_uri=None):
         prefix = None
         if ':' in name:
@@ -403,19 +644,18 @@ class ElementTreeAdapter(XmlImplAdapter):
                 parent.text = parent.text + child.text
             else:
                 parent.text = child.text
-            self.CACHED_ANCESTRY_DICT[child] = parent
             return None
         else:
             if before_sibling is not None:
                 offset = 0
-                for c in parent.getchildren():
+                for c in parent:
                     if c == before_sibling:
                         break
                     offset += 1
                 parent.insert(offset, child)
             else:
                 parent.append(child)
-            self.CACHED_ANCESTRY_DICT[child] = parent
+            self.CACHED_ANCESTRY_DICT.add_subtree(parent, child)
             return child
 
     def import_node(self, parent, node, original_parent=None, clone=False):
@@ -438,6 +678,7 @@ class ElementTreeAdapter(XmlImplAdapter):
                         original_parent.text.replace(original_node.text, '', 1)
             else:
                 original_parent.remove(original_node)
+                self.CACHED_ANCESTRY_DICT.discard(original_node)
 
     def clone_node(self, node, deep=True):
         if deep:
@@ -451,9 +692,12 @@ class ElementTreeAdapter(XmlImplAdapter):
             return
         parent.remove(child)
         if destroy_node:
+            for node in child.iter():
+                self.CACHED_ANCESTRY_DICT.discard(node)
             child.clear()
             return None
         else:
+            self.CACHED_ANCESTRY_DICT.discard(child)
             return child
 
     def lookup_ns_uri_by_attr_name(self, node, name):
@@ -523,8 +767,238 @@ class ElementTreeAdapter(XmlImplAdapter):
         return (qname, ns_uri, prefix, local_name)
 
 
+class ElementTreeFeedParser(object):
+    """
+    Parser for XML data fed in chunks, as returned by
+    :meth:`ElementTreeAdapter.new_feed_parser`.
+    """
+
+    def __init__(self, adapter_class, tag, ns_uri, emit_elements,
+            ignore_whitespace_text_nodes, keep=None, limits_tracker=None):
+        self._adapter_class = adapter_class
+        self._adapter = None
+        self._tag = tag
+        self._ns_uri = ns_uri
+        self._emit_elements = emit_elements
+        self._ignore_whitespace_text_nodes = ignore_whitespace_text_nodes
+        self._parser = adapter_class.ET.XMLPullParser(
+            events=('start', 'start-ns', 'end'))
+        self._ns_list = []
+        # ElementTree nodes don't know their parents, so track the stack of
+        # open elements to record the parent of each new element
+        self._open_elements = []
+        self._completed_elements = collections.deque()
+        self._keep_filter = None if keep is None else KeepFilter(keep)
+        self._limits_tracker = limits_tracker
+
+    def _process_events(self):
+        for event, node in self._adapter_class._with_xmlns_attributes(
+                self._parser.read_events(), ('start', 'end'),
+                self._ignore_whitespace_text_nodes, self._ns_list,
+                self._limits_tracker):
+            if event == 'start':
+                if self._adapter is None:
+                    self._adapter = self._adapter_class(
+                        self._adapter_class.ET.ElementTree(node))
+                elif self._emit_elements:
+                    # Record parents for lookups from emitted elements
+                    self._adapter.CACHED_ANCESTRY_DICT[node] = (
+                        self._open_elements[-1])
+                self._open_elements.append(node)
+                if self._keep_filter is not None:
+                    ns_uri, local_name = (
+                        self._adapter_class._split_clark_name(node.tag))
+                    self._keep_filter.start(local_name, ns_uri)
+                continue
+            self._open_elements.pop()
+            if (self._keep_filter is not None
+                    and not self._keep_filter.end(node.find('*') is not None)
+                    and self._open_elements):
+                # Discard the element, searching from the end of its parent
+                # where it was most recently added
+                parent = self._open_elements[-1]
+                for i in range(len(parent) - 1, -1, -1):
+                    if parent[i] is node:
+                        del parent[i]
+                        break
+                continue
+            if (self._emit_elements and self._adapter_class._is_tag_match(
+                    node, self._tag, self._ns_uri)):
+                self._completed_elements.append(node)
+
+    def feed(self, data):
+        if self._limits_tracker is not None:
+            self._limits_tracker.add_bytes(len(data))
+        self._parser.feed(data)
+        self._process_events()
+
+    def read_elements(self):
+        while self._completed_elements:
+            node = self._completed_elements.popleft()
+            yield self._adapter_class.wrap_node(
+                node, self._adapter.impl_document, self._adapter)
+
+    def close(self):
+        self._parser.close()
+        self._process_events()
+        return nodes.Document(self._adapter.impl_document, self._adapter)
+
+
+class _ParentIndex(object):
+    """
+    Index of the parent of each element in an ElementTree document, since
+    ElementTree elements don't know their parents.
+
+    The index is built from the whole document when it is first needed, then
+    kept up to date by the adapter as nodes are added, moved and removed, so
+    it is never rebuilt just to find the parent of a new node. Changes made
+    directly to the document outside of *xml4h* are only seen after the
+    adapter's caches are cleared.
+
+    Elements are referenced weakly where the ElementTree implementation
+    allows, so the index doesn't keep removed subtrees alive.
+    """
+
+    # Indexes of the documents in use, shared by all adapters for a document
+    _DOCUMENT_INDEXES = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_document(cls, impl_document):
+        """
+        Return the shared parent index for the given document.
+        """
+        index = cls._DOCUMENT_INDEXES.get(impl_document)
+        if index is None:
+            index = cls(impl_document)
+            cls._DOCUMENT_INDEXES[impl_document] = index
+        return index
+
+    @classmethod
+    def from_parents(cls, child_parent_pairs):
+        """
+        Return an index of only the given children and their parents,
+        independent of any document.
+        """
+        index = cls(None)
+        index._start()
+        for child, parent in child_parent_pairs:
+            index[child] = parent
+        return index
+
+    def __init__(self, impl_document):
+        if impl_document is None:
+            self._document_ref = lambda: None
+        else:
+            self._document_ref = weakref.ref(impl_document)
+        self._parents = None  # Built when first needed
+
+    def _start(self):
+        """
+        Start an empty index, and return the document's root element if any.
+        """
+        self._parents = parents = {}
+        root = self._document_ref()
+        if root is not None:
+            root = root.getroot()
+        try:
+            weakref.ref(root if root is not None else BaseET.Element('test'))
+        except TypeError:
+            # Older C implementations of ElementTree don't support weak
+            # references, so removed nodes are only dropped when discarded
+            self._key = self._ref = self._deref = lambda node: node
+            self._discard_dead = None
+            return root
+
+        def discard_dead(node_ref):
+            parents.pop(node_ref, None)
+
+        self._discard_dead = discard_dead
+        self._key = lambda node: weakref.ref(node, discard_dead)
+        self._ref = weakref.ref
+        self._deref = lambda node_ref: node_ref()
+        return root
+
+    def _build(self):
+        root = self._start()
+        if root is not None:
+            self.add_descendants(root)
+
+    def clear(self):
+        """
+        Discard the index, to be rebuilt from the document when next needed.
+        """
+        self._parents = None
+
+    def get(self, node):
+        """
+        Return the parent of the given node, or None if the node is not in
+        the document.
+        """
+        if self._parents is None:
+            self._build()
+        parent_ref = self._parents.get(self._ref(node))
+        if parent_ref is None:
+            return None
+        return self._deref(parent_ref)
+
+    def __getitem__(self, node):
+        parent = self.get(node)
+        if parent is None:
+            raise KeyError(node)
+        return parent
+
+    def __setitem__(self, child, parent):
+        # An index that isn't built yet will find the child in the document
+        if self._parents is not None:
+            self._parents[self._key(child)] = self._ref(parent)
+
+    def __contains__(self, node):
+        return (self._parents is not None
+                and self._ref(node) in self._parents)
+
+    def __len__(self):
+        return 0 if self._parents is None else len(self._parents)
+
+    def add_descendants(self, node):
+        """
+        Index the parent of every descendant of the given node.
+        """
+        if self._parents is None:
+            return
+        discard_dead = self._discard_dead
+        if discard_dead is None:
+            self._parents.update((c, p) for p in node.iter() for c in p)
+        else:
+            # Make the weak references inline, without a function call for
+            # each node, since the index of a whole document is built here
+            ref = weakref.ref
+            self._parents.update(
+                (ref(c, discard_dead), parent_ref)
+                for p in node.iter() if len(p)
+                for parent_ref in (ref(p), )
+                for c in p)
+
+    def add_subtree(self, parent, child):
+        """
+        Index a child newly added to the given parent, and the child's
+        descendants.
+        """
+        self[child] = parent
+        if len(child):
+            self.add_descendants(child)
+
+    def discard(self, node):
+        """
+        Remove the given node from the index, if it is there.
+        """
+        if self._parents is not None:
+            self._parents.pop(self._ref(node), None)
+
+
 class ElementTreeText(object):
 
+    __slots__ = ('_text', '_parent', '_is_cdata', '__weakref__')
+
     def __init__(self, text, parent=None, is_cdata=False):
         self._text = text
         self._parent = parent
@@ -557,6 +1031,9 @@ class ElementTreeText(object):
 
 class ETAttribute(object):
 
+    __slots__ = ('_qname', '_ns_uri', '_prefix', '_local_name', '_value',
+                 '_element')
+
     def __init__(self, qname, ns_uri, prefix, local_name, value, element):
         self._qname, self._ns_uri, self._prefix, self._local_name = (
             qname, ns_uri, prefix, local_name)
@@ -602,5 +1079,4 @@ class cElementTreeAdapter(ElementTreeAdapter):
         if not super(cElementTreeAdapter, cls).is_available():
             return False
         # We only support cElementTree version 1.0.6+
-        from distutils.version import StrictVersion
-        return StrictVersion(cls.ET.VERSION) >= StrictVersion('1.0.6')
+        return _version_tuple(cls.ET.VERSION) >= (1, 0, 6)
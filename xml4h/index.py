@@ -0,0 +1,304 @@
+import bisect
+
+
+class _DocumentOrderIndex(object):
+    """
+    Base for indexes of the elements in a document, which number each
+    element by its position in document order. The descendants of an
+    element are the elements numbered after it up to the end of its
+    subtree, so only the indexed elements within that range are looked up
+    when searching an element's descendants.
+
+    Changes made to the document by *xml4h* nodes mark the index as
+    outdated so it is rebuilt by the next lookup.
+    """
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self._elements = None
+
+    @property
+    def is_current(self):
+        """
+        *True* if the index is up to date, or *False* if it will be rebuilt
+        by the next lookup.
+        """
+        return self._elements is not None
+
+    def __len__(self):
+        if self._elements is None:
+            self.build()
+        return len(self._elements)
+
+    def invalidate(self):
+        """
+        Mark the index as outdated, so it is rebuilt by the next lookup.
+        """
+        self._elements = None
+        self._positions = None
+        self._subtree_ends = None
+
+    def build(self):
+        """
+        Index every element in the document.
+        """
+        adapter = self.adapter
+        get_parent = adapter.get_node_parent
+        elements = list(adapter.iter_node_elements(adapter.impl_document))
+        positions = {}
+        # The position after the last descendant of each element
+        subtree_ends = [len(elements)] * len(elements)
+        open_positions = []  # Positions of the ancestors of each element
+        for position, element in enumerate(elements):
+            parent = get_parent(element)
+            while (open_positions
+                    and elements[open_positions[-1]] is not parent):
+                subtree_ends[open_positions.pop()] = position
+            open_positions.append(position)
+            positions[element] = position
+        self._index_elements(elements)
+        self._elements = elements
+        self._positions = positions
+        self._subtree_ends = subtree_ends
+
+    def _index_elements(self, elements):
+        """
+        Index the given elements, which are in document order.
+        """
+        raise NotImplementedError()
+
+    def _descendant_range(self, node):
+        """
+        Return the range of positions of the given implementation node's
+        descendant elements, or *None* if the node is not indexed.
+        """
+        if self._elements is None:
+            self.build()
+        if node is self.adapter.impl_document:
+            return 0, len(self._elements)
+        position = self._positions.get(node)
+        if position is None:
+            return None  # Not an indexed element
+        return position + 1, self._subtree_ends[position]
+
+    def _elements_within(self, element_positions, node_range):
+        """
+        Return the elements at the given sorted positions that fall within
+        a node's range of descendants.
+        """
+        elements = self._elements
+        start, end = node_range
+        return [elements[element_positions[i]] for i in range(
+            bisect.bisect_left(element_positions, start),
+            bisect.bisect_left(element_positions, end))]
+
+
+class ElementIndex(_DocumentOrderIndex):
+    """
+    Index of the elements in a document by name and namespace, for
+    documents that are searched over and over. Build an index with
+    :meth:`xml4h.nodes.Document.build_index`::
+
+        doc = xml4h.parse('catalog.xml')
+        doc.build_index()
+        for product in doc.find('Product'):
+            product.find_first('Price')
+
+    While a document is indexed, :meth:`~xml4h.nodes.Node.find`,
+    :meth:`~xml4h.nodes.Node.iter_find`, :meth:`~xml4h.nodes.Node.find_first`
+    and :meth:`~xml4h.nodes.Node.find_doc` look up matching elements in the
+    index instead of searching the document, for the document and any of its
+    elements.
+
+    Each element is numbered by its position in document order, so the
+    descendants of an element are the elements numbered after it up to the
+    end of its subtree, and only the matching elements within that range are
+    looked up.
+
+    Changes made to the document by *xml4h* nodes, such as adding, deleting
+    or transplanting elements, mark the index as outdated so it is rebuilt
+    by the next search. If you change the document directly with the
+    underlying XML library, call
+    :meth:`~xml4h.nodes.Document.build_index` again.
+    """
+
+    def __init__(self, adapter):
+        """
+        Indexes are created by :meth:`xml4h.nodes.Document.build_index`
+        rather than directly.
+        """
+        super(ElementIndex, self).__init__(adapter)
+
+    def invalidate(self):
+        super(ElementIndex, self).invalidate()
+        self._positions_by_key = None
+    invalidate.__doc__ = _DocumentOrderIndex.invalidate.__doc__
+
+    def _index_elements(self, elements):
+        get_name_key = self.adapter.get_node_name_key
+        # Positions of the elements with each namespace and local name, and
+        # with each of those on its own for searches constrained by one
+        positions_by_key = {}
+        for position, element in enumerate(elements):
+            ns_uri, local_name = get_name_key(element)
+            for key in ((ns_uri, local_name), ('*', local_name),
+                        (ns_uri, '*')):
+                key_positions = positions_by_key.get(key)
+                if key_positions is None:
+                    positions_by_key[key] = [position]
+                else:
+                    key_positions.append(position)
+        self._positions_by_key = positions_by_key
+
+    def _match_range(self, node, name, ns_uri):
+        """
+        Return the positions of the elements matching the constraints, and
+        the range within them of the given node's descendants, or *None*.
+        """
+        if (ns_uri == '' or '{' in name or '}' in name or ':' in name):
+            # Leave names and namespaces that adapters match in their own
+            # ways to the adapter
+            return None
+        node_range = self._descendant_range(node)
+        if node_range is None:
+            return None
+        start, end = node_range
+        if name == '*' and ns_uri == '*':
+            return None, start, end
+        key_positions = self._positions_by_key.get((ns_uri, name), ())
+        return (key_positions,
+                bisect.bisect_left(key_positions, start),
+                bisect.bisect_left(key_positions, end))
+
+    def find_node_elements(self, node, name='*', ns_uri='*'):
+        """
+        :return: a list of the implementation element descendants of the
+            given implementation node that match the constraints, in document
+            order, or *None* if the index cannot answer the search so the
+            document must be searched instead.
+        """
+        match_range = self._match_range(node, name, ns_uri)
+        if match_range is None:
+            return None
+        key_positions, start, end = match_range
+        elements = self._elements
+        if key_positions is None:
+            return elements[start:end]
+        return [elements[key_positions[i]] for i in range(start, end)]
+
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        """
+        :return: an iterator of the results of :meth:`find_node_elements`,
+            which looks up each element only as it is needed, or *None* if
+            the index cannot answer the search.
+        """
+        match_range = self._match_range(node, name, ns_uri)
+        if match_range is None:
+            return None
+        key_positions, start, end = match_range
+        elements = self._elements
+        if key_positions is None:
+            return (elements[i] for i in range(start, end))
+        return (elements[key_positions[i]] for i in range(start, end))
+
+
+class AttributeIndex(_DocumentOrderIndex):
+    """
+    Index of the elements in a document by the value of an attribute, for
+    looking up elements by an identifier or other key attribute. Build an
+    index with :meth:`xml4h.nodes.Document.index_attribute`::
+
+        doc = xml4h.parse('catalog.xml')
+        doc.index_attribute('sku')
+        product = doc.find_by_attr('sku', 'SKU-1234', first_only=True)
+
+    While an attribute is indexed, :meth:`~xml4h.nodes.Node.find_by_attr`
+    looks up elements with a given value of the attribute in the index
+    instead of searching the document.
+
+    A numeric index also keeps the elements whose attribute values are
+    numbers sorted by value, so :meth:`~xml4h.nodes.Node.find_by_attr_range`
+    can look up the elements with values in a range.
+
+    Changes made to the document by *xml4h* nodes, including changes to
+    attributes, mark the index as outdated so it is rebuilt by the next
+    lookup. If you change the document directly with the underlying XML
+    library, call :meth:`~xml4h.nodes.Document.index_attribute` again.
+    """
+
+    def __init__(self, adapter, name, ns_uri=None, numeric=False):
+        """
+        Indexes are created by :meth:`xml4h.nodes.Document.index_attribute`
+        rather than directly.
+        """
+        super(AttributeIndex, self).__init__(adapter)
+        self.name = name
+        self.ns_uri = ns_uri
+        self.numeric = numeric
+
+    def invalidate(self):
+        super(AttributeIndex, self).invalidate()
+        self._positions_by_value = None
+        self._numbers = None
+        self._number_positions = None
+    invalidate.__doc__ = _DocumentOrderIndex.invalidate.__doc__
+
+    def _index_elements(self, elements):
+        get_value = self.adapter.get_node_attribute_value
+        name, ns_uri = self.name, self.ns_uri
+        positions_by_value = {}
+        numbered_positions = []
+        for position, element in enumerate(elements):
+            value = get_value(element, name, ns_uri)
+            if value is None:
+                continue
+            value_positions = positions_by_value.get(value)
+            if value_positions is None:
+                positions_by_value[value] = [position]
+            else:
+                value_positions.append(position)
+            if self.numeric:
+                try:
+                    number = float(value)
+                except ValueError:
+                    continue
+                if number == number:  # Not NaN, which cannot be ordered
+                    numbered_positions.append((number, position))
+        numbered_positions.sort()
+        self._positions_by_value = positions_by_value
+        self._numbers = [number for number, position in numbered_positions]
+        self._number_positions = [
+            position for number, position in numbered_positions]
+
+    def find_node_elements(self, node, value):
+        """
+        :return: a list of the implementation element descendants of the
+            given implementation node whose attribute has the given value,
+            in document order, or *None* if the node is not indexed.
+        """
+        node_range = self._descendant_range(node)
+        if node_range is None:
+            return None
+        return self._elements_within(
+            self._positions_by_value.get(value, ()), node_range)
+
+    def find_node_elements_in_range(self, node, min_value=None,
+            max_value=None):
+        """
+        :return: a list of the implementation element descendants of the
+            given implementation node whose attribute is a number between
+            the given inclusive bounds, in document order, or *None* if the
+            index is not numeric or the node is not indexed.
+        """
+        if not self.numeric:
+            return None
+        node_range = self._descendant_range(node)
+        if node_range is None:
+            return None
+        numbers = self._numbers
+        start = (0 if min_value is None
+                 else bisect.bisect_left(numbers, min_value))
+        end = (len(numbers) if max_value is None
+               else bisect.bisect_right(numbers, max_value))
+        positions = sorted(self._number_positions[start:end])
+        return self._elements_within(positions, node_range)
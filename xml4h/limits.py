@@ -0,0 +1,155 @@
+import os
+import time
+
+from xml4h import exceptions
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class ParseLimits(object):
+    """
+    Resource budget for parsing a document, to fail fast on pathological
+    input such as deeply nested or huge documents instead of stalling.
+    Pass limits to :func:`xml4h.parse` or the streaming parsers::
+
+        limits = xml4h.ParseLimits(max_depth=100, max_nodes=1000000,
+                                   max_bytes=10 * 1024 * 1024, max_seconds=5)
+        doc = xml4h.parse(untrusted_xml, limits=limits)
+
+    When a limit is exceeded parsing stops with a
+    :class:`~xml4h.exceptions.ParseLimitExceededException`.
+
+    Limits are checked as the underlying parser reports elements, which
+    for some adapters happens after each chunk of input is parsed rather
+    than as each element is seen, so a limit may be overshot by up to a
+    chunk's worth of nodes before parsing stops. Elements skipped by the
+    ``keep`` option of :func:`xml4h.parse` may not be counted.
+    """
+
+    def __init__(self, max_depth=None, max_nodes=None, max_bytes=None,
+            max_seconds=None):
+        """
+        :param max_depth: the deepest nesting of elements allowed, where
+            the root element is at depth 1.
+        :type max_depth: int or None
+        :param max_nodes: the largest number of element and attribute
+            nodes allowed in the document.
+        :type max_nodes: int or None
+        :param max_bytes: the largest amount of input allowed, in bytes,
+            or in characters for text input. Compressed input is measured
+            after it is decompressed.
+        :type max_bytes: int or None
+        :param max_seconds: the longest time parsing may take.
+        :type max_seconds: int, float or None
+
+        A limit of *None* is not enforced.
+        """
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+    def _values(self):
+        return (self.max_depth, self.max_nodes, self.max_bytes,
+                self.max_seconds)
+
+    def __eq__(self, other):
+        return (isinstance(other, ParseLimits)
+                and self._values() == other._values())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return ('%s(max_depth=%r, max_nodes=%r, max_bytes=%r, max_seconds=%r)'
+                % ((self.__class__.__name__, ) + self._values()))
+
+    def tracker(self):
+        """
+        :return: a new :class:`ParseLimitsTracker` to enforce these limits
+            on a single parse.
+        """
+        return ParseLimitsTracker(self)
+
+
+class ParseLimitsTracker(object):
+    """
+    Running count of the resources used while parsing one document, which
+    adapters update as they parse to enforce :class:`ParseLimits`.
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.depth = 0
+        self.node_count = 0
+        self.byte_count = 0
+        if limits.max_seconds is None:
+            self._deadline = None
+        else:
+            self._deadline = _clock() + limits.max_seconds
+
+    def _exceeded(self, limit_name):
+        raise exceptions.ParseLimitExceededException(
+            limit_name, getattr(self.limits, limit_name))
+
+    def check_time(self):
+        if self._deadline is not None and _clock() > self._deadline:
+            self._exceeded('max_seconds')
+
+    def start_element(self, attribute_count=0):
+        """
+        Count an element, and its attributes, as parsing reaches its start.
+        """
+        self.depth += 1
+        self.node_count += 1 + attribute_count
+        limits = self.limits
+        if limits.max_depth is not None and self.depth > limits.max_depth:
+            self._exceeded('max_depth')
+        if limits.max_nodes is not None and self.node_count > limits.max_nodes:
+            self._exceeded('max_nodes')
+        self.check_time()
+
+    def end_element(self):
+        self.depth -= 1
+
+    def add_bytes(self, count):
+        """
+        Count input as it is read, or all at once when its size is known.
+        """
+        self.byte_count += count
+        if (self.limits.max_bytes is not None
+                and self.byte_count > self.limits.max_bytes):
+            self._exceeded('max_bytes')
+        self.check_time()
+
+    def wrap_file(self, xml_file):
+        """
+        :return: the given file-like object wrapped to count the input read
+            from it, or a given file path after checking the file's size.
+        """
+        if hasattr(xml_file, 'read'):
+            return _TrackedReader(xml_file, self)
+        self.add_bytes(os.path.getsize(xml_file))
+        return xml_file
+
+
+class _TrackedReader(object):
+    """
+    File-like wrapper that counts the data read against a tracker's limits.
+    """
+
+    def __init__(self, xml_file, tracker):
+        self._file = xml_file
+        self._tracker = tracker
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._tracker.add_bytes(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
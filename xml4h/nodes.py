@@ -3,6 +3,7 @@ import collections
 import functools
 
 import xml4h
+from xml4h.index import AttributeIndex, ElementIndex
 
 
 ELEMENT_NODE = 1
@@ -18,16 +19,26 @@ DOCUMENT_TYPE_NODE = 10
 DOCUMENT_FRAGMENT_NODE = 11
 NOTATION_NODE = 12
 
+# Types of node whose children are visited when walking a DOM
+_PARENT_NODE_TYPES = (
+    DOCUMENT_NODE, DOCUMENT_TYPE_NODE, DOCUMENT_FRAGMENT_NODE, ELEMENT_NODE)
+
 
 class Node(object):
     """
     Base class for *xml4h* DOM nodes that represent and interact with a
     node in the underlying XML implementation.
     """
+    # Wrappers are made for every node navigated to, so keep them compact.
+    # They are weakly referenced by their adapter's wrapper cache.
+    __slots__ = ('_impl_node', '_adapter', '__weakref__')
 
     XMLNS_URI = 'http://www.w3.org/2000/xmlns/'
     """URI constant for XMLNS"""
 
+    XML_URI = 'http://www.w3.org/XML/1998/namespace'
+    """URI constant for the ``xml`` prefix, as in ``xml:id``"""
+
     def __init__(self, node, adapter):
         """
         Construct an object that represents and wraps a DOM node in the
@@ -108,7 +119,10 @@ class Node(object):
         """
         if self.is_document:
             return self
-        return self.adapter.wrap_document(self.adapter.impl_document)
+        # Share this node's adapter, and so its caches and index
+        impl_document = self.adapter.impl_document
+        return self.adapter.wrap_node(
+            impl_document, impl_document, self.adapter)
 
     @property
     def root(self):
@@ -230,9 +244,10 @@ class Node(object):
         Convert a list of underlying implementation nodes into a list of
         *xml4h* wrapper nodes.
         """
-        nodelist = [
-            self.adapter.wrap_node(n, self.adapter.impl_document, self.adapter)
-            for n in impl_nodelist]
+        adapter = self.adapter
+        impl_document = adapter.impl_document
+        nodelist = [adapter.wrap_node(n, impl_document, adapter)
+                    for n in impl_nodelist]
         return NodeList(nodelist)
 
     @property
@@ -276,6 +291,50 @@ class Node(object):
         return self.children(name=name, local_name=local_name, ns_uri=ns_uri,
             node_type=node_type, filter_fn=filter_fn, first_only=True)
 
+    def iter_descendants(self):
+        """
+        Generate this node's descendant nodes in document order, that is
+        depth-first with each node preceding its own descendants.
+
+        Unlike walking the DOM recursively via :attr:`children`, this
+        generator works for documents of any depth.
+        """
+        walker = self._walk()
+        next(walker)  # Skip this node's own 'start' event
+        for event, node, children in walker:
+            if event == 'start':
+                yield node
+
+    def _walk(self):
+        """
+        Generate ``(event, node, children)`` tuples for a depth-first walk
+        of this node and its descendants in document order. A ``'start'``
+        event is generated when a node is reached and an ``'end'`` event once
+        all its descendants have been walked, where ``children`` is the
+        :class:`NodeList` of the node's child nodes that are walked.
+
+        The walk uses an explicit stack instead of recursion, so it is not
+        limited by Python's recursion limit when walking deep documents.
+        """
+        def children_of(node):
+            if node.node_type in _PARENT_NODE_TYPES:
+                return node.children
+            return NodeList()
+
+        children = children_of(self)
+        yield 'start', self, children
+        stack = [(self, children, iter(children))]
+        while stack:
+            node, children, remaining = stack[-1]
+            for child in remaining:
+                grandchildren = children_of(child)
+                yield 'start', child, grandchildren
+                stack.append((child, grandchildren, iter(grandchildren)))
+                break
+            else:
+                stack.pop()
+                yield 'end', node, children
+
     @property
     def attributes(self):
         return None
@@ -346,6 +405,10 @@ class Node(object):
         removed_child = self.adapter.remove_node_child(
             self.adapter.get_node_parent(self.impl_node), self.impl_node,
             destroy_node=destroy)
+        if self.is_element:
+            self.adapter.invalidate_indexes()
+        elif self.is_attribute:
+            self.adapter.invalidate_attribute_indexes()
         if removed_child is not None:
             return self.adapter.wrap_node(removed_child, None, self.adapter)
         else:
@@ -367,6 +430,7 @@ class Node(object):
         else:
             child_impl_node = node  # Assume it's a valid impl node
         self.adapter.import_node(self.impl_node, child_impl_node, clone=True)
+        self.adapter.invalidate_indexes()
 
     def transplant_node(self, node):
         """
@@ -386,6 +450,7 @@ class Node(object):
             original_parent_impl_node = self.adapter.get_node_parent(node)
         self.adapter.import_node(self.impl_node, child_impl_node,
             original_parent_impl_node, clone=False)
+        self.adapter.invalidate_indexes()
 
     def find(self, name=None, ns_uri=None, first_only=False):
         """
@@ -404,20 +469,58 @@ class Node(object):
         :returns: a list of :class:`Element` nodes matching any given
             constraints, or a single node if ``first_only=True``.
         """
+        if first_only:
+            # Stop at the first match
+            for node in self.iter_find(name=name, ns_uri=ns_uri):
+                return node
+            return None
         if name is None:
             name = '*'  # Match all element names
         if ns_uri is None:
             ns_uri = '*'  # Match all namespaces
-        impl_nodelist = self.adapter.find_node_elements(
-            self.impl_node, name=name, ns_uri=ns_uri)
-        if first_only:
-            if impl_nodelist:
-                return self.adapter.wrap_node(
-                    impl_nodelist[0], self.adapter.impl_document, self.adapter)
-            else:
-                return None
+        impl_nodelist = None
+        index = self.adapter.element_index
+        if index is not None:
+            impl_nodelist = index.find_node_elements(
+                self.impl_node, name=name, ns_uri=ns_uri)
+        if impl_nodelist is None:
+            impl_nodelist = self.adapter.find_node_elements(
+                self.impl_node, name=name, ns_uri=ns_uri)
         return self._convert_nodelist(impl_nodelist)
 
+    def iter_find(self, name=None, ns_uri=None):
+        """
+        Generate :class:`Element` node descendants of this node in document
+        order, with optional constraints to limit the results, as for
+        :meth:`find`.
+
+        Each node is found only as you iterate, without first finding every
+        match, so you can stop as soon as you have the nodes you need.
+        Don't change the document until you have finished iterating.
+
+        :param name: limit results to elements with this name.
+            If *None* or ``'*'`` all element names are matched.
+        :type name: string or None
+        :param ns_uri: limit results to elements within this namespace URI.
+            If *None* all elements are matched, regardless of namespace.
+        :type ns_uri: string or None
+        """
+        if name is None:
+            name = '*'  # Match all element names
+        if ns_uri is None:
+            ns_uri = '*'  # Match all namespaces
+        adapter = self.adapter
+        impl_document = adapter.impl_document
+        impl_nodes = None
+        if adapter.element_index is not None:
+            impl_nodes = adapter.element_index.iter_node_elements(
+                self.impl_node, name=name, ns_uri=ns_uri)
+        if impl_nodes is None:
+            impl_nodes = adapter.iter_node_elements(
+                self.impl_node, name=name, ns_uri=ns_uri)
+        for impl_node in impl_nodes:
+            yield adapter.wrap_node(impl_node, impl_document, adapter)
+
     def find_first(self, name=None, ns_uri=None):
         """
         Find the first :class:`Element` node descendant of this node that
@@ -438,10 +541,90 @@ class Node(object):
         return self.document.find(name=name, ns_uri=ns_uri,
             first_only=first_only)
 
+    def find_by_attr(self, name, value, ns_uri=None, first_only=False):
+        """
+        Find :class:`Element` node descendants of this node with an attribute
+        of the given value.
+
+        If the attribute is indexed by :meth:`Document.index_attribute` the
+        elements are looked up in the index, otherwise this node's
+        descendants are searched.
+
+        :param string name: the name of the attribute.
+        :param string value: the attribute value to match.
+        :param ns_uri: the namespace URI of the attribute.
+        :type ns_uri: string or None
+        :param bool first_only: if *True* only return the first result node
+            or *None* if there is no matching node.
+
+        :returns: a list of :class:`Element` nodes in document order, or a
+            single node if ``first_only=True``.
+        """
+        adapter = self.adapter
+        impl_nodes = None
+        index = adapter.attribute_indexes.get((name, ns_uri))
+        if index is not None:
+            impl_nodes = index.find_node_elements(self.impl_node, value)
+        if impl_nodes is None:
+            get_value = adapter.get_node_attribute_value
+            impl_nodes = (n for n in adapter.iter_node_elements(self.impl_node)
+                          if get_value(n, name, ns_uri) == value)
+        if first_only:
+            for impl_node in impl_nodes:
+                return adapter.wrap_node(
+                    impl_node, adapter.impl_document, adapter)
+            return None
+        return self._convert_nodelist(impl_nodes)
+
+    def find_by_attr_range(self, name, min_value=None, max_value=None,
+            ns_uri=None):
+        """
+        Find :class:`Element` node descendants of this node with an attribute
+        whose value is a number within the given inclusive bounds.
+
+        If the attribute has a numeric index made by
+        :meth:`Document.index_attribute` the elements are looked up in the
+        index, otherwise this node's descendants are searched.
+
+        :param string name: the name of the attribute.
+        :param min_value: the smallest value to match, or *None* for no
+            lower bound.
+        :type min_value: int, float or None
+        :param max_value: the largest value to match, or *None* for no
+            upper bound.
+        :type max_value: int, float or None
+        :param ns_uri: the namespace URI of the attribute.
+        :type ns_uri: string or None
+
+        :returns: a list of :class:`Element` nodes in document order.
+        """
+        adapter = self.adapter
+        impl_nodes = None
+        index = adapter.attribute_indexes.get((name, ns_uri))
+        if index is not None:
+            impl_nodes = index.find_node_elements_in_range(
+                self.impl_node, min_value, max_value)
+        if impl_nodes is None:
+            impl_nodes = []
+            get_value = adapter.get_node_attribute_value
+            for n in adapter.iter_node_elements(self.impl_node):
+                value = get_value(n, name, ns_uri)
+                if value is None:
+                    continue
+                try:
+                    number = float(value)
+                except ValueError:
+                    continue
+                if ((min_value is None or number >= min_value)
+                        and (max_value is None or number <= max_value)):
+                    impl_nodes.append(n)
+        return self._convert_nodelist(impl_nodes)
+
     # Methods that operate on this Node implementation adapter
 
     def write(self, writer, encoding='utf-8', indent=0, newline='',
-            omit_declaration=False, node_depth=0, quote_char='"'):
+            omit_declaration=False, node_depth=0, quote_char='"',
+            preserve_attribute_order=False):
         """
         Serialize this node and its descendants to text, writing
         the output to the given *writer*.
@@ -475,13 +658,38 @@ class Node(object):
             has no effect unless indentation is applied.
         :param string quote_char: the character that delimits quoted content.
             You should never need to mess with this.
+        :param bool preserve_attribute_order: if *True* each element's
+            attributes are written in the order they are stored by the
+            underlying XML implementation instead of sorted by name.
 
         Delegates to :func:`xml4h.writer.write_node` applied to this node.
         """
         xml4h.write_node(self,
             writer, encoding=encoding, indent=indent,
             newline=newline, omit_declaration=omit_declaration,
-            node_depth=node_depth, quote_char=quote_char)
+            node_depth=node_depth, quote_char=quote_char,
+            preserve_attribute_order=preserve_attribute_order)
+
+    def awrite(self, writer, encoding='utf-8', indent=0, newline='',
+            omit_declaration=False, node_depth=0, quote_char='"', **kwargs):
+        """
+        Coroutine to serialize this node and its descendants to text,
+        writing the output in chunks to the given asynchronous *writer*
+        without blocking the event loop::
+
+            await doc.awrite(stream_writer)
+
+        :param writer: an asynchronous sink for the serialized output, such
+            as an :class:`asyncio.StreamWriter`.
+
+        Other arguments are as for :meth:`write`. Python 3 only.
+
+        Delegates to :func:`xml4h.aio.awrite_node` applied to this node.
+        """
+        return xml4h.awrite_node(self,
+            writer, encoding=encoding, indent=indent,
+            newline=newline, omit_declaration=omit_declaration,
+            node_depth=node_depth, quote_char=quote_char, **kwargs)
 
     def write_doc(self, writer, *args, **kwargs):
         """
@@ -528,6 +736,7 @@ class NodeAttrAndChildElementLookupsMixin(object):
     Perform "magical" lookup of a node's attributes via dict-style keyword
     reference, and child elements via class attribute reference.
     """
+    __slots__ = ()
 
     def __getitem__(self, attr_name):
         """
@@ -587,6 +796,7 @@ class XPathMixin(object):
     """
     Provide :meth:`xpath` method to nodes that support XPath searching.
     """
+    __slots__ = ()
 
     def _maybe_wrap_node(self, node):
         # Don't try and wrap base types (e.g. attribute values or node text)
@@ -619,14 +829,93 @@ class Document(Node, NodeAttrAndChildElementLookupsMixin, XPathMixin):
     """
     Node representing an entire XML document.
     """
+    __slots__ = ()
     _node_type = DOCUMENT_NODE
     # TODO: doc_type, document_element
 
+    def build_index(self):
+        """
+        Index the elements in this document by name and namespace, so
+        searches with :meth:`find`, :meth:`iter_find`, :meth:`find_first`
+        and :meth:`find_doc` look up matching elements instead of searching
+        the document. This is worthwhile for documents that are searched
+        many times.
+
+        After the document is changed through *xml4h* nodes the index is
+        rebuilt by the next search, but call this method again after
+        changing the document directly with the underlying XML library.
+
+        :return: the document's :class:`~xml4h.index.ElementIndex`.
+        """
+        index = self.adapter.element_index
+        if index is None:
+            index = self.adapter.element_index = ElementIndex(self.adapter)
+        index.build()
+        return index
+
+    def drop_index(self):
+        """
+        Discard the indexes made by :meth:`build_index` and
+        :meth:`index_attribute`, so searches go back to searching the
+        document.
+        """
+        self.adapter.element_index = None
+        self.adapter.attribute_indexes.clear()
+
+    def index_attribute(self, name, ns_uri=None, numeric=False):
+        """
+        Index the elements in this document by the value of an attribute,
+        so :meth:`find_by_attr` looks up elements with a given value of the
+        attribute instead of searching the document.
+
+        After the document is changed through *xml4h* nodes the index is
+        rebuilt by the next lookup, but call this method again after
+        changing the document directly with the underlying XML library.
+
+        :param string name: the name of the attribute.
+        :param ns_uri: the namespace URI of the attribute.
+        :type ns_uri: string or None
+        :param bool numeric: if *True* also keep the elements whose values
+            of the attribute are numbers sorted by value, so
+            :meth:`find_by_attr_range` looks them up in the index.
+
+        :return: the attribute's :class:`~xml4h.index.AttributeIndex`.
+        """
+        index = AttributeIndex(self.adapter, name, ns_uri, numeric=numeric)
+        index.build()
+        self.adapter.attribute_indexes[(name, ns_uri)] = index
+        return index
+
+    def get_by_id(self, value):
+        """
+        Get the element with the given identifier, as the value of its
+        ``xml:id`` attribute or otherwise its ``id`` attribute.
+
+        The identifier attributes are indexed by :meth:`index_attribute` the
+        first time this method is used, so later lookups are quick.
+
+        :param string value: the identifier of the element.
+
+        :return: the :class:`Element` with the identifier, or *None* if
+            there is no such element.
+        """
+        adapter = self.adapter
+        for name, ns_uri in (('id', self.XML_URI), ('id', None)):
+            index = adapter.attribute_indexes.get((name, ns_uri))
+            if index is None:
+                index = self.index_attribute(name, ns_uri)
+            impl_nodes = index.find_node_elements(self.impl_node, value)
+            if impl_nodes:
+                return adapter.wrap_node(
+                    impl_nodes[0], adapter.impl_document, adapter)
+        return None
+
 
 class DocumentType(Node):
     """
     Node representing the type of an XML document.
     """
+    __slots__ = ()
     _node_type = DOCUMENT_TYPE_NODE
     # TODO: name, entities, notations, public_id, system_id
 
@@ -635,6 +924,7 @@ class DocumentFragment(Node):
     """
     Node representing an XML document fragment.
     """
+    __slots__ = ()
     _node_type = DOCUMENT_FRAGMENT_NODE
     # TODO
 
@@ -643,6 +933,7 @@ class Notation(Node):
     """
     Node representing a notation in an XML document.
     """
+    __slots__ = ()
     _node_type = NOTATION_NODE
     # TODO: public_id, system_id
 
@@ -651,6 +942,7 @@ class Entity(Node):
     """
     Node representing an entity in an XML document.
     """
+    __slots__ = ()
     _node_type = ENTITY_NODE
     # TODO: public_id, system_id
 
@@ -663,6 +955,7 @@ class EntityReference(Node):
     """
     Node representing an entity reference in an XML document.
     """
+    __slots__ = ()
     _node_type = ENTITY_REFERENCE_NODE
     # TODO
 
@@ -672,6 +965,7 @@ class NameValueNodeMixin(Node):
     Provide methods to access node name and value attributes, where the node
     name may also be composed of "prefix" and "local" components.
     """
+    __slots__ = ()
 
     def __repr__(self):
         return '<%s.%s: "%s">' % (
@@ -719,12 +1013,15 @@ class NameValueNodeMixin(Node):
     @value.setter
     def value(self, value):
         self.adapter.set_node_value(self.impl_node, value)
+        if self.is_attribute:
+            self.adapter.invalidate_attribute_indexes()
 
 
 class Text(NameValueNodeMixin):
     """
     Node representing text content in an XML document.
     """
+    __slots__ = ()
     _node_type = TEXT_NODE
 
 
@@ -732,6 +1029,7 @@ class CDATA(NameValueNodeMixin):
     """
     Node representing character data in an XML document.
     """
+    __slots__ = ()
     _node_type = CDATA_NODE
 
 
@@ -739,6 +1037,7 @@ class Comment(NameValueNodeMixin):
     """
     Node representing a comment in an XML document.
     """
+    __slots__ = ()
     _node_type = COMMENT_NODE
 
 
@@ -747,6 +1046,7 @@ class Attribute(NameValueNodeMixin):
     Node representing an attribute of a :class:`Document` or
     :class:`Element` node.
     """
+    __slots__ = ()
     _node_type = ATTRIBUTE_NODE
 
 
@@ -754,6 +1054,7 @@ class ProcessingInstruction(NameValueNodeMixin):
     """
     Node representing a processing instruction in an XML document.
     """
+    __slots__ = ()
     _node_type = PROCESSING_INSTRUCTION_NODE
 
     target = NameValueNodeMixin.name
@@ -767,6 +1068,7 @@ class Element(NameValueNodeMixin,
     Node representing an element in an XML document, with support for
     manipulating and adding content to the element.
     """
+    __slots__ = ()
     _node_type = ELEMENT_NODE
 
     @property
@@ -852,6 +1154,7 @@ class Element(NameValueNodeMixin,
                 qname = name
             self.adapter.set_node_attribute_value(
                 element, qname, v, ns_uri=my_ns_uri)
+        self.adapter.invalidate_attribute_indexes()
 
     def set_attributes(self, attr_obj=None, ns_uri=None, **attr_dict):
         """
@@ -878,8 +1181,9 @@ class Element(NameValueNodeMixin,
             any existing attributes, as opposed to the :meth:`set_attributes`
             method which only updates and replaces them.
         """
-        attr_impl_nodes = self.adapter.get_node_attributes(self.impl_node)
-        return AttributeDict(attr_impl_nodes, self.impl_node, self.adapter)
+        # The dictionary looks up attributes as they are used, so there is no
+        # need to get every attribute node here
+        return AttributeDict(None, self.impl_node, self.adapter)
 
     @attributes.setter
     def attributes(self, attr_obj):
@@ -932,6 +1236,7 @@ class Element(NameValueNodeMixin,
         if prefix is None:
             ns_name = 'xmlns'
             self.adapter.set_node_namespace_uri(element, ns_uri)
+            self.adapter.invalidate_indexes()
         else:
             ns_name = 'xmlns:%s' % prefix
         self._set_element_attributes(element,
@@ -1019,6 +1324,7 @@ class Element(NameValueNodeMixin,
         # ...or in the default position, appended after existing nodes
         else:
             self.adapter.add_node_child(self.impl_node, child_elem)
+        self.adapter.invalidate_indexes()
         return self.adapter.wrap_node(
             child_elem, self.adapter.impl_document, self.adapter)
 
@@ -1083,14 +1389,19 @@ class AttributeDict(object):
     Dictionary-like object of element attributes that always reflects the
     state of the underlying element node, and that allows for in-place
     modifications that will immediately affect the element.
+
+    The dictionary is a live view rather than a copy of the attributes:
+    attributes are looked up by name in the underlying element as they are
+    needed, and iteration reads the element's attributes one at a time.
     """
+    __slots__ = ('impl_element', 'adapter')
 
     def __init__(self, attr_impl_nodes, impl_element, adapter):
         self.impl_element = impl_element
         self.adapter = adapter
 
     def __len__(self):
-        return len(self.impl_attributes)
+        return self.adapter.get_node_attribute_count(self.impl_element)
 
     def __getitem__(self, attr_name):
         prefix, name, ns_uri = self.adapter.get_ns_info_from_node_name(
@@ -1105,15 +1416,18 @@ class AttributeDict(object):
             value = str(value)
         self.adapter.set_node_attribute_value(
             self.impl_element, name, value, ns_uri)
+        self.adapter.invalidate_attribute_indexes()
 
     def __delitem__(self, name):
         prefix, name, ns_uri = self.adapter.get_ns_info_from_node_name(
             name, self.impl_element)
         self.adapter.remove_node_attribute(self.impl_element, name, ns_uri)
+        self.adapter.invalidate_attribute_indexes()
 
     def __iter__(self):
-        for k in list(self.keys()):
-            yield k
+        get_name = self.adapter.get_node_name
+        for a in self._iter_impl_attributes():
+            yield get_name(a)
 
     iterkeys = __iter__  # Alias, per Python docs recommendation
 
@@ -1131,20 +1445,25 @@ class AttributeDict(object):
         """
         :return: a list of attribute name strings.
         """
-        return [self.adapter.get_node_name(a) for a in self.impl_attributes]
+        return list(self)
 
     def values(self):
         """
         :return: a list of attribute value strings.
         """
-        return [self.adapter.get_node_value(a) for a in self.impl_attributes]
+        get_value = self.adapter.get_node_value
+        return [get_value(a) for a in self._iter_impl_attributes()]
 
     def items(self):
         """
         :return: a list of name/value attribute pairs sorted by attribute name.
         """
-        sorted_keys = sorted(self.keys())
-        return [(k, self[k]) for k in sorted_keys]
+        get_name = self.adapter.get_node_name
+        get_value = self.adapter.get_node_value
+        return sorted(
+            ((get_name(a), get_value(a))
+             for a in self._iter_impl_attributes()),
+            key=lambda item: item[0])
 
     def namespace_uri(self, name):
         """
@@ -1194,6 +1513,9 @@ class AttributeDict(object):
         """
         return self.adapter.get_node_attributes(self.impl_element)
 
+    def _iter_impl_attributes(self):
+        return self.adapter.iter_node_attributes(self.impl_element)
+
 
 class NodeList(list):
     """
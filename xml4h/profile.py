@@ -0,0 +1,104 @@
+import json
+import os
+
+import xml4h
+
+
+class AdapterProfile(object):
+    """
+    Preferred adapters for each kind of workload, ranked by how fast each
+    adapter performed the workload in the Python environment where the
+    profile was made. Make a profile by running::
+
+        python -m xml4h.bench adapters --save xml4h-adapters.json
+
+    Then use the profile for the adapters chosen by :func:`xml4h.parse`,
+    :func:`xml4h.build` and :func:`xml4h.select_adapter` by setting the
+    ``XML4H_ADAPTER_PROFILE`` environment variable to the profile's path, or
+    by loading it in your code::
+
+        xml4h.adapter_profile = xml4h.AdapterProfile.load(
+            'xml4h-adapters.json')
+    """
+
+    WORKLOADS = ('parse', 'find', 'write', 'build')
+    """
+    The kinds of workload adapters are ranked for:
+
+    - ``parse``: parsing documents.
+    - ``find``: finding elements, and navigating from them, in a document.
+    - ``write``: serializing documents.
+    - ``build``: creating documents with a :class:`~xml4h.builder.Builder`.
+    """
+
+    FORMAT_VERSION = 1
+
+    PATH_ENVIRONMENT_VARIABLE = 'XML4H_ADAPTER_PROFILE'
+
+    def __init__(self, timings):
+        """
+        :param dict timings: for each workload, a dictionary of the time in
+            seconds each adapter class name took to perform it.
+        """
+        self.timings = timings
+
+    @classmethod
+    def from_environment(cls):
+        """
+        :return: the profile saved at the path given by the
+            ``XML4H_ADAPTER_PROFILE`` environment variable, or *None* if the
+            variable is not set.
+        """
+        path = os.environ.get(cls.PATH_ENVIRONMENT_VARIABLE)
+        if not path:
+            return None
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return: the profile saved at the given path.
+        :raise: ValueError if the file is not a supported profile.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != cls.FORMAT_VERSION:
+            raise ValueError("Unsupported adapter profile version in %s" % path)
+        return cls(data['timings'])
+
+    def save(self, path):
+        """
+        Write the profile to a file at the given path.
+        """
+        data = {
+            'version': self.FORMAT_VERSION,
+            'timings': self.timings,
+            }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    def ranking(self, workload):
+        """
+        :return: the names of the adapter classes profiled for the given
+            workload, fastest first.
+        """
+        workload_timings = self.timings.get(workload, {})
+        return sorted(workload_timings, key=workload_timings.get)
+
+    def preferred_adapter(self, workload):
+        """
+        :return: the fastest adapter class for the given workload that is
+            available in the Python environment, or *None* if the profile
+            has no available adapter for the workload.
+        """
+        available = dict((adapter.__name__, adapter)
+                         for adapter in xml4h._available_adapters())
+        for name in self.ranking(workload):
+            if name in available:
+                return available[name]
+        return None
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%s' % (workload, (self.ranking(workload) or [None])[0])
+            for workload in self.WORKLOADS))
@@ -0,0 +1,384 @@
+import json
+import os
+import re
+import xml.parsers.expat
+
+import six
+
+import xml4h
+
+
+class RecordIndex(object):
+    """
+    Index of the byte offsets of the record elements in a large XML file,
+    for random access to individual records without parsing the whole file.
+
+    Build an index by scanning the file once, then get records by their
+    position in the file or by a key attribute::
+
+        index = xml4h.RecordIndex.build('products.xml', 'Product',
+                                        key_attr='id')
+        product = index.get(1000)
+        product = index.get('SKU-1234')
+
+    A record element is an element with the given name that is not nested
+    within another record element. The index is stored in a sidecar file
+    next to the XML file, and can be loaded again with :meth:`load` as long
+    as the XML file has not changed.
+
+    Each record is parsed on its own, so records must not refer to entities
+    declared in the document's DTD. Namespace declarations made outside the
+    record are applied to it, so its names resolve as in the whole document.
+    """
+
+    SIDECAR_SUFFIX = '.xml4h-index'
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, path, record_tag, ns_uri=None, key_attr=None,
+            encoding=None, offsets=None, ns_contexts=None,
+            record_ns_contexts=None, keys=None,
+            ignore_whitespace_text_nodes=True, adapter=None):
+        """
+        Indexes are created by :meth:`build` or :meth:`load` rather than
+        directly.
+        """
+        if adapter is None:
+            adapter = xml4h.best_adapter
+        self.path = path
+        self.record_tag = record_tag
+        self.ns_uri = ns_uri
+        self.key_attr = key_attr
+        self.encoding = encoding
+        self.ignore_whitespace_text_nodes = ignore_whitespace_text_nodes
+        self.adapter = adapter
+        self._offsets = offsets or []
+        self._ns_contexts = ns_contexts or [[]]
+        self._record_ns_contexts = record_ns_contexts or []
+        self._keys = keys
+        self._positions_by_key = None
+        if keys is not None:
+            self._positions_by_key = {}
+            # The first record with a key wins
+            for i in range(len(keys) - 1, -1, -1):
+                if keys[i] is not None:
+                    self._positions_by_key[keys[i]] = i
+
+    @classmethod
+    def sidecar_path(cls, path):
+        """
+        :return: the default path of the sidecar index file for the given
+            XML file path.
+        """
+        return path + cls.SIDECAR_SUFFIX
+
+    @classmethod
+    def build(cls, path, record_tag, key_attr=None, ns_uri=None,
+            index_path=None, ignore_whitespace_text_nodes=True, adapter=None):
+        """
+        Scan an XML file for record elements and save the index in a sidecar
+        file.
+
+        :param string path: the path of the XML file.
+        :param string record_tag: the local name of the record elements.
+        :param key_attr: the name of an attribute of the record elements
+            whose value can be given to :meth:`get` to find the record.
+            If *None* records can only be found by their position.
+        :type key_attr: string or None
+        :param ns_uri: only treat elements within this namespace URI as
+            records. If *None* elements are matched regardless of namespace.
+        :type ns_uri: string or None
+        :param index_path: the path of the sidecar file for the index.
+            If *None* the XML file path with a ``.xml4h-index`` suffix is used.
+        :type index_path: string or None
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from the records returned by :meth:`get`.
+        :param adapter: the *xml4h* implementation adapter class used to parse
+            records. If None, :attr:`xml4h.best_adapter` will be used.
+        :type adapter: adapter class or None
+
+        :return: a :class:`RecordIndex` for the file.
+        """
+        scanner = _RecordScanner(record_tag, ns_uri, key_attr)
+        with open(path, 'rb') as f:
+            scanner.scan(f)
+        index = cls(path, record_tag, ns_uri=ns_uri, key_attr=key_attr,
+            encoding=scanner.encoding,
+            offsets=scanner.offsets,
+            ns_contexts=scanner.ns_contexts,
+            record_ns_contexts=scanner.record_ns_contexts,
+            keys=scanner.keys if key_attr is not None else None,
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            adapter=adapter)
+        index.save(index_path)
+        return index
+
+    @classmethod
+    def load(cls, path, index_path=None, ignore_whitespace_text_nodes=True,
+            adapter=None):
+        """
+        Load the index of an XML file from its sidecar file.
+
+        :param string path: the path of the XML file.
+        :param index_path: the path of the sidecar file for the index.
+            If *None* the XML file path with a ``.xml4h-index`` suffix is used.
+        :type index_path: string or None
+
+        Other arguments are as for :meth:`build`.
+
+        :return: a :class:`RecordIndex` for the file.
+        :raise: ValueError if the XML file has changed since the index was
+            built, or the sidecar file is not a usable index.
+        """
+        if index_path is None:
+            index_path = cls.sidecar_path(path)
+        with open(index_path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != cls.FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported record index version in %s" % index_path)
+        if data['source'] != cls._source_signature(path):
+            raise ValueError(
+                "Record index %s is out of date for %s" % (index_path, path))
+        offsets = data['offsets']
+        return cls(path, data['record_tag'], ns_uri=data['ns_uri'],
+            key_attr=data['key_attr'], encoding=data['encoding'],
+            offsets=[(offsets[i], offsets[i + 1])
+                     for i in range(0, len(offsets), 2)],
+            ns_contexts=data['ns_contexts'],
+            record_ns_contexts=data['record_ns_contexts'],
+            keys=data['keys'],
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            adapter=adapter)
+
+    def save(self, index_path=None):
+        """
+        Write the index to a sidecar file.
+
+        :param index_path: the path of the sidecar file.
+            If *None* the XML file path with a ``.xml4h-index`` suffix is used.
+        :type index_path: string or None
+        """
+        if index_path is None:
+            index_path = self.sidecar_path(self.path)
+        data = {
+            'version': self.FORMAT_VERSION,
+            'source': self._source_signature(self.path),
+            'record_tag': self.record_tag,
+            'ns_uri': self.ns_uri,
+            'key_attr': self.key_attr,
+            'encoding': self.encoding,
+            'offsets': [o for start_end in self._offsets for o in start_end],
+            'ns_contexts': self._ns_contexts,
+            'record_ns_contexts': self._record_ns_contexts,
+            'keys': self._keys,
+            }
+        with open(index_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def _source_signature(cls, path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime]
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def keys(self):
+        """
+        :return: the key attribute values of the records in file order,
+            with *None* for records without the attribute.
+        :raise: ValueError if the index was built without a ``key_attr``.
+        """
+        if self._keys is None:
+            raise ValueError("Record index was built without a key_attr")
+        return list(self._keys)
+
+    def position(self, n_or_key):
+        """
+        :param n_or_key: a record's position in the file, counting from zero,
+            or the value of its key attribute.
+        :type n_or_key: int or string
+
+        :return: the position of the record in the file.
+        :raise: IndexError if there is no record at a given position, or
+            KeyError if there is no record with a given key.
+        """
+        if isinstance(n_or_key, six.integer_types):
+            if n_or_key < 0:
+                n_or_key += len(self._offsets)
+            if not 0 <= n_or_key < len(self._offsets):
+                raise IndexError("Record index out of range")
+            return n_or_key
+        if self._positions_by_key is None:
+            raise KeyError(n_or_key)
+        return self._positions_by_key[n_or_key]
+
+    def get_bytes(self, n_or_key):
+        """
+        :param n_or_key: a record's position in the file, counting from zero,
+            or the value of its key attribute.
+        :type n_or_key: int or string
+
+        :return: the source XML bytes of the record, exactly as they appear
+            in the file.
+        """
+        start, end = self._offsets[self.position(n_or_key)]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def get(self, n_or_key):
+        """
+        Read and parse a single record from the XML file.
+
+        :param n_or_key: a record's position in the file, counting from zero,
+            or the value of its key attribute.
+        :type n_or_key: int or string
+
+        :return: an :class:`xml4h.nodes.Element` node for the record, as the
+            root element of a document containing only that record.
+        :raise: IndexError if there is no record at a given position, or
+            KeyError if there is no record with a given key.
+        """
+        position = self.position(n_or_key)
+        record_bytes = self.get_bytes(position)
+        ns_context = self._ns_contexts[self._record_ns_contexts[position]]
+        if ns_context:
+            # Imported here as it is slow to import, pulling in urllib
+            from xml.sax.saxutils import quoteattr
+            # Declare in-scope namespaces on the record element itself,
+            # after its name
+            name_end = _NAME_END_RE.search(record_bytes, 1).start()
+            declarations = ''.join(
+                ' %s=%s' % (prefix and 'xmlns:' + prefix or 'xmlns',
+                            quoteattr(uri))
+                for prefix, uri in ns_context)
+            record_bytes = (record_bytes[:name_end]
+                + declarations.encode(self.encoding or 'utf-8')
+                + record_bytes[name_end:])
+        if self.encoding and self.encoding.lower().replace('-', '') != 'utf8':
+            record_bytes = (
+                ('<?xml version="1.0" encoding="%s"?>' % self.encoding
+                 ).encode('ascii')
+                + record_bytes)
+        doc = xml4h.parse(record_bytes,
+            ignore_whitespace_text_nodes=self.ignore_whitespace_text_nodes,
+            adapter=self.adapter, source_type='bytes')
+        return doc.root
+
+    def __getitem__(self, n_or_key):
+        return self.get(n_or_key)
+
+
+_NAME_END_RE = re.compile(br'[\s/>]')
+
+# Matches a start tag, and whether it is the tag of an empty element
+_START_TAG_RE = re.compile(
+    br'<[^\s/>]+(?:\s+[^\s=]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*(/?)>')
+
+
+class _RecordScanner(object):
+    """
+    Find the byte offsets of record elements in an XML file with a single
+    pass of the expat parser, without building any nodes.
+    """
+
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, record_tag, ns_uri, key_attr):
+        if ns_uri is None:
+            self._names = None
+            self._name_suffix = ' ' + record_tag
+        else:
+            self._names = ('%s %s' % (ns_uri, record_tag), )
+            if not ns_uri:
+                self._names += (record_tag, )
+        self.record_tag = record_tag
+        self.key_attr = key_attr
+        self.encoding = None
+        self.offsets = []
+        self.keys = []
+        # Distinct sets of in-scope namespace declarations, shared by records
+        self.ns_contexts = [[]]
+        self.record_ns_contexts = []
+        self._ns_context_positions = {(): 0}
+        self._ns_stacks = {}
+        self._pending_prefixes = []
+        self._depth = 0
+        self._record_depth = None
+        self._record_start = None
+
+    def scan(self, xml_file):
+        parser = xml.parsers.expat.ParserCreate(namespace_separator=' ')
+        self._parser = parser
+        parser.XmlDeclHandler = self._xml_decl
+        parser.StartNamespaceDeclHandler = self._start_ns_decl
+        parser.EndNamespaceDeclHandler = self._end_ns_decl
+        parser.StartElementHandler = self._start_element
+        parser.EndElementHandler = self._end_element
+        while True:
+            data = xml_file.read(self.READ_SIZE)
+            if not data:
+                break
+            parser.Parse(data, False)
+        parser.Parse(b'', True)
+        self._parser = None
+
+    def _is_record_name(self, name):
+        if self._names is None:
+            return name == self.record_tag or name.endswith(self._name_suffix)
+        return name in self._names
+
+    def _xml_decl(self, version, encoding, standalone):
+        self.encoding = encoding
+
+    def _start_ns_decl(self, prefix, uri):
+        self._ns_stacks.setdefault(prefix, []).append(uri)
+        self._pending_prefixes.append(prefix)
+
+    def _end_ns_decl(self, prefix):
+        self._ns_stacks[prefix].pop()
+
+    def _start_element(self, name, attributes):
+        own_prefixes = self._pending_prefixes
+        if own_prefixes:
+            self._pending_prefixes = []
+        self._depth += 1
+        if self._record_depth is not None or not self._is_record_name(name):
+            return
+        parser = self._parser
+        self._record_depth = self._depth
+        self._record_start = parser.CurrentByteIndex
+        if self.key_attr is not None:
+            self.keys.append(attributes.get(self.key_attr))
+        # Namespaces declared by ancestors, which the record may rely on
+        ns_context = tuple(sorted(
+            (prefix or '', uris[-1])
+            for prefix, uris in self._ns_stacks.items()
+            if uris and uris[-1] and prefix not in own_prefixes))
+        position = self._ns_context_positions.get(ns_context)
+        if position is None:
+            position = len(self.ns_contexts)
+            self._ns_context_positions[ns_context] = position
+            self.ns_contexts.append([list(p_u) for p_u in ns_context])
+        self.record_ns_contexts.append(position)
+        # The end of an empty element is the end of its start tag
+        start_tag = _START_TAG_RE.match(parser.GetInputContext())
+        if start_tag.group(1):
+            self.offsets.append(
+                (self._record_start, self._record_start + start_tag.end()))
+            self._record_depth = -1
+
+    def _end_element(self, name):
+        if self._depth == self._record_depth:
+            parser = self._parser
+            # Find the end of the record's end tag
+            end = parser.CurrentByteIndex + parser.GetInputContext().index(
+                b'>') + 1
+            self.offsets.append((self._record_start, end))
+            self._record_depth = None
+        elif self._record_depth == -1:
+            # End of an empty record element, already recorded
+            self._record_depth = None
+        self._depth -= 1
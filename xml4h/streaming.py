@@ -0,0 +1,592 @@
+import os
+import re
+import time
+
+import six
+
+import xml4h
+
+
+class StreamingDocument(object):
+    """
+    Lazy stand-in for a :class:`xml4h.nodes.Document` that is too large to
+    hold in memory, as returned by :func:`xml4h.parse` for an oversized
+    input when ``on_oversize='stream'``.
+
+    The document is never built. Instead, each call to :meth:`find` or
+    iteration over the document makes a single forward-only pass over the
+    source with :func:`xml4h.iterparse`, so memory use stays bounded::
+
+        doc = xml4h.parse('huge.xml', max_dom_bytes=100 * 1024 * 1024,
+                          on_oversize='stream')
+        for film in doc.find('Film'):
+            print(film.Title.text)
+
+    As for :func:`xml4h.iterparse`, each element is cleared once you move on
+    to the next one, so get any data you need from an element before then.
+    """
+
+    is_streaming = True
+
+    def __init__(self, source, ignore_whitespace_text_nodes=True,
+            adapter=None, limits=None):
+        """
+        :param source: an XML file path, document bytes or buffer, or a
+            file-like object.
+        """
+        if adapter is None:
+            adapter = xml4h.best_adapter
+        if not adapter.has_feature('iterparse'):
+            raise xml4h.exceptions.FeatureUnavailableException('iterparse')
+        self._source = source
+        self._ignore_whitespace_text_nodes = ignore_whitespace_text_nodes
+        self._adapter_class = adapter
+        self._limits = limits
+        # File-like objects are read from their current position on every
+        # pass, if they can be rewound
+        self._start_position = None
+        self._passes = 0
+        if hasattr(source, 'read') and hasattr(source, 'seek'):
+            self._start_position = source.tell()
+
+    @property
+    def adapter_class(self):
+        """
+        The *xml4h* adapter class used to parse the document.
+        """
+        return self._adapter_class
+
+    def _open_pass(self):
+        source = self._source
+        if hasattr(source, 'read'):
+            if self._start_position is not None:
+                source.seek(self._start_position)
+            elif self._passes:
+                raise ValueError(
+                    'The source of this streaming document cannot be'
+                    ' rewound, so it can only be read once')
+        self._passes += 1
+        return source
+
+    def find(self, name=None, ns_uri=None, first_only=False):
+        """
+        Find :class:`~xml4h.nodes.Element` nodes in the document, with
+        optional constraints to limit the results, in a forward-only pass.
+
+        :param name: limit results to elements with this name.
+            If *None* or ``'*'`` all element names are matched.
+        :type name: string or None
+        :param ns_uri: limit results to elements within this namespace URI.
+            If *None* all elements are matched, regardless of namespace.
+        :type ns_uri: string or None
+        :param bool first_only: if *True* only return the first result node
+            or *None* if there is no matching node, stopping as soon as it
+            is found.
+
+        :returns: a generator of :class:`~xml4h.nodes.Element` nodes in the
+            order they are completed, or a single node if
+            ``first_only=True``.
+        """
+        if name == '*':
+            name = None
+        elements = xml4h.iterparse(self._open_pass(), tag=name,
+            ns_uri=ns_uri,
+            ignore_whitespace_text_nodes=self._ignore_whitespace_text_nodes,
+            adapter=self._adapter_class, limits=self._limits)
+        if first_only:
+            for element in elements:
+                # Stop parsing, leaving the element intact since it is only
+                # cleared when the generator advances
+                elements.close()
+                return element
+            return None
+        return elements
+
+    def iter_find(self, name=None, ns_uri=None):
+        """
+        Generate matching :class:`~xml4h.nodes.Element` nodes in a
+        forward-only pass, as for :meth:`find`.
+        """
+        return self.find(name=name, ns_uri=ns_uri)
+
+    def find_first(self, name=None, ns_uri=None):
+        """
+        Find the first :class:`~xml4h.nodes.Element` node in the document
+        that matches any optional constraints, or None if there are no
+        matching elements.
+
+        Delegates to :meth:`find` with ``first_only=True``.
+        """
+        return self.find(name=name, ns_uri=ns_uri, first_only=True)
+
+    def __iter__(self):
+        """
+        Iterate over every element in the document in a forward-only pass,
+        as for :meth:`find` without constraints.
+        """
+        return self.find()
+
+    def __getattr__(self, name):
+        raise AttributeError(
+            "'%s' object has no attribute '%s': the document is too large"
+            " to build in memory, so only forward-only find() and iteration"
+            " are supported" % (self.__class__.__name__, name))
+
+
+# Markup in a stream of concatenated documents, with groups for the kinds of
+# markup that matter for finding where each document ends. Markup that does
+# not open or close an element, like comments, matches none of the groups.
+_MARKUP = r'''<(?:
+    \?.*?\?>
+    | !--.*?-->
+    | !\[CDATA\[.*?\]\]>
+    | !(?!--|\[CDATA\[)(?:[^\[>]*\[[^\]]*\])?[^>]*>
+    | (/)[^>]*>
+    | (?![?!])([^>"'/]*(?:(?:"[^"]*"|'[^']*'|/(?!>))[^>"'/]*)*)(/)?>
+    )'''
+
+_END_TAG, _START_TAG, _EMPTY_TAG = 1, 2, 3
+
+# The start of a document on one line: an optional XML declaration, then the
+# root element's start tag, with groups for the tag and the element's name
+_LINE_ROOT = r'''(?:<\?xml\s[^<>]*\?>\s*)?
+    (<([^\s/>!?"']+)[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>)'''
+
+
+class _SplitPatterns(object):
+    """
+    Patterns for splitting documents, compiled for either bytes or text.
+    """
+
+    def __init__(self, convert):
+        self.newline = convert('\n')
+        self.lt = convert('<')
+        self.gt = convert('>')
+        self.end_tag_start = convert('</')
+        self.empty_tag_end = convert('/>')
+        self.declaration_start = convert('<!')
+        self.instruction_start = convert('<?')
+        self.instruction_end = convert('?>')
+        self.comment_end = convert('-->')
+        self.markup = re.compile(convert(_MARKUP), re.DOTALL | re.VERBOSE)
+        self.line_root = re.compile(convert(_LINE_ROOT), re.VERBOSE)
+        self.non_whitespace = re.compile(convert(r'\S'))
+
+
+_BYTES_SPLIT_PATTERNS = _SplitPatterns(lambda s: s.encode('ascii'))
+_TEXT_SPLIT_PATTERNS = _SplitPatterns(six.text_type)
+
+
+def split_documents(xml_file, read_size=64 * 1024):
+    """
+    Yield the data of each document in a stream of concatenated XML
+    documents, such as a file with one document per line, without parsing
+    the documents.
+
+    Each document's data starts with any XML declaration, comments or
+    processing instructions before its root element, and ends with the end
+    of its root element. Documents must be in an ASCII-compatible encoding
+    such as UTF-8. Malformed data is passed on for the parser to report.
+
+    Each line that holds exactly one document is recognised with a few
+    string searches, without scanning its markup. Other data, such as
+    documents spread over many lines, is scanned markup by markup to find
+    where each root element ends.
+
+    :param xml_file: a file-like object of XML bytes or text.
+    :param int read_size: the amount of data to read from the file at a time.
+    """
+    return _DocumentSplitter(xml_file, read_size).split()
+
+
+def _parse_documents(xml_file, ignore_whitespace_text_nodes=True,
+        adapter=None, limits=None):
+    """
+    Parse each document in a stream of concatenated XML documents read from
+    a file, as for :func:`xml4h.parse_stream_of_documents`.
+
+    Lines are passed to the parser as documents without being checked,
+    since the parser itself finds any line that is not exactly one
+    document. That line is then split by scanning its markup, and parsing
+    resumes from it with a new parser.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    splitter = _DocumentSplitter(xml_file, check_lines=False)
+    while True:
+        documents = adapter.parse_documents(splitter.split(),
+            ignore_whitespace_text_nodes, limits=limits)
+        while True:
+            try:
+                document = next(documents)
+            except StopIteration:
+                return
+            except Exception:
+                if not splitter.rescan_unchecked_line():
+                    raise
+                break
+            yield document
+
+
+class _DocumentSplitter(object):
+    """
+    Splitter of the documents in a stream read from a file, which alternates
+    between splitting lines that each hold one document and scanning markup
+    until it is back at the end of a line between documents.
+
+    If ``check_lines`` is False lines that could be documents are yielded
+    without being checked, for a parser to check instead.
+    """
+
+    def __init__(self, xml_file, read_size=64 * 1024, check_lines=True):
+        self._file = xml_file
+        self._read_size = read_size
+        self._check_lines = check_lines
+        self._data = xml_file.read(read_size)
+        self._position = 0
+        self._file_ended = not self._data
+        self._patterns = (_TEXT_SPLIT_PATTERNS
+            if isinstance(self._data, six.text_type)
+            else _BYTES_SPLIT_PATTERNS)
+        # Start of the unchecked line that was last yielded, while it is
+        # being parsed
+        self._unchecked_line = None
+        self._rescan = False
+
+    def split(self):
+        rescan = self._rescan
+        self._rescan = False
+        while not (self._file_ended
+                   and self._position >= len(self._data)):
+            if not rescan:
+                for xml_data in self._split_lines():
+                    yield xml_data
+            rescan = False
+            for xml_data in self._split_markup():
+                yield xml_data
+
+    def rescan_unchecked_line(self):
+        """
+        Have the next :meth:`split` start by scanning the markup of the
+        unchecked line that was last yielded, if the parser found that it
+        is not one document.
+
+        :return: False if the last data yielded was not an unchecked line.
+        """
+        if self._unchecked_line is None:
+            return False
+        self._position = self._unchecked_line
+        self._unchecked_line = None
+        self._rescan = True
+        return True
+
+    def _read_more(self, keep_from):
+        """
+        Discard the data before ``keep_from``, and read more data after the
+        rest. At least as much is read as is kept, so data carried over from
+        read to read, like a long line, is copied a bounded number of times.
+        """
+        kept = self._data[keep_from:]
+        chunks = [kept]
+        size = 0
+        while not self._file_ended and size < max(self._read_size, len(kept)):
+            chunk = self._file.read(max(self._read_size, len(kept) - size))
+            if not chunk:
+                self._file_ended = True
+            size += len(chunk)
+            chunks.append(chunk)
+        self._data = kept[:0].join(chunks)
+        self._position -= keep_from
+
+    def _split_lines(self):
+        """
+        Yield each line that holds exactly one document, stopping at the
+        first line that does not.
+        """
+        patterns = self._patterns
+        while True:
+            data = self._data
+            position = self._position
+            line_end = data.find(patterns.newline, position)
+            if line_end < 0:
+                if not self._file_ended:
+                    self._read_more(position)
+                    continue
+                line_end = len(data)
+                if position >= line_end:
+                    return
+            xml_data = data[position:line_end].strip()
+            if not xml_data:
+                self._position = line_end + 1
+                continue
+            if self._check_lines:
+                if not self._is_one_document(xml_data):
+                    return
+                self._position = line_end + 1
+                yield xml_data
+                continue
+            # A line that does not end with the end of an element cannot be
+            # a whole document, so is not worth parsing
+            if (not xml_data.endswith(patterns.gt)
+                    or xml_data.endswith(patterns.instruction_end)
+                    or xml_data.endswith(patterns.comment_end)):
+                return
+            self._position = line_end + 1
+            self._unchecked_line = position
+            yield xml_data
+            self._unchecked_line = None
+
+    def _is_one_document(self, xml_data):
+        """
+        Return True if the given line, stripped of surrounding whitespace,
+        is exactly one document with nothing before or after it.
+
+        Without comments, CDATA sections or processing instructions after
+        the root element's start tag, each ``<`` starts a tag. So a root
+        element whose start tag is the only one with its name, and whose end
+        tag is the only one with its name and ends the line, encloses the
+        rest of the line. Any other line is left for the markup to be
+        scanned.
+        """
+        patterns = self._patterns
+        match = patterns.line_root.match(xml_data)
+        if match is None:
+            return False
+        root_end = match.end(1)
+        if xml_data.startswith(patterns.empty_tag_end, root_end - 2):
+            return root_end == len(xml_data)
+        if (xml_data.find(patterns.declaration_start, root_end) >= 0
+                or xml_data.find(patterns.instruction_start, root_end) >= 0):
+            return False
+        name = match.group(2)
+        end_tag_start = patterns.end_tag_start + name
+        return (xml_data.endswith(end_tag_start + patterns.gt)
+                and xml_data.count(end_tag_start, root_end) == 1
+                and xml_data.count(patterns.lt + name, root_end) == 0)
+
+    def _split_markup(self):
+        """
+        Yield each document found by scanning the markup, stopping at the
+        end of a line between documents.
+        """
+        patterns = self._patterns
+        match_markup = patterns.markup.match
+        search_non_whitespace = patterns.non_whitespace.search
+        data = self._data
+        position = self._position
+        start = None  # Start of the current document in data, if any
+        parts = []  # Data of the current document read before data
+        depth = 0
+        # Whether the current document has any element or stray text, rather
+        # than only whitespace and misc markup
+        has_content = False
+        while True:
+            if start is None:
+                # Go back to splitting lines once the rest of a line between
+                # documents is whitespace
+                line_end = data.find(patterns.newline, position)
+                if (line_end >= 0 and search_non_whitespace(
+                        data, position, line_end) is None):
+                    self._position = line_end + 1
+                    return
+            markup_start = data.find(patterns.lt, position)
+            if depth == 0:
+                match = search_non_whitespace(data, position,
+                    len(data) if markup_start < 0 else markup_start)
+                if match is not None:
+                    has_content = True
+                    if start is None:
+                        start = match.start()
+            match = None
+            if markup_start >= 0:
+                if start is None:
+                    start = markup_start
+                match = match_markup(data, markup_start)
+            if match is None:
+                if self._file_ended:
+                    if markup_start >= 0:
+                        has_content = True
+                    break
+                # Read more data to complete the current markup, setting
+                # aside the document's data before it
+                keep_from = len(data) if markup_start < 0 else markup_start
+                if start is not None:
+                    if start < keep_from:
+                        parts.append(data[start:keep_from])
+                    start = 0
+                self._position = keep_from
+                self._read_more(keep_from)
+                data = self._data
+                position = self._position
+                continue
+            position = match.end()
+            kind = match.lastindex
+            if kind is None:
+                # Misc markup
+                continue
+            has_content = True
+            if kind == _START_TAG:
+                depth += 1
+                continue
+            elif kind == _END_TAG:
+                depth -= 1
+            if depth <= 0:
+                parts.append(data[start:position])
+                yield data[:0].join(parts)
+                parts = []
+                start = None
+                depth = 0
+                has_content = False
+        self._position = len(data)
+        if start is not None and (depth > 0 or has_content):
+            parts.append(data[start:])
+            yield data[:0].join(parts)
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+def follow(path, record_tag, ns_uri=None, poll_interval=0.5,
+        idle_timeout=None, ignore_whitespace_text_nodes=True, adapter=None):
+    """
+    Follow an XML log file as it grows, like ``tail -f``, yielding each
+    record element as soon as it is completely written to the file::
+
+        for event in xml4h.follow('/var/log/app/events.xml', 'Event'):
+            print(event['level'], event.Message.text)
+
+    The log is parsed incrementally from where parsing last stopped, so
+    only new data is read as the log grows. Log rotation is survived: when
+    the file at ``path`` is replaced, such as by renaming the log and
+    starting a new one, or is truncated, the rest of the old file is read
+    and then the new file is followed from its start.
+
+    As for :func:`xml4h.iterparse`, each record is cleared once you move on
+    to the next one, so get any data you need from a record before then.
+
+    :param string path: the path of the XML log file, which need not exist
+        yet.
+    :param string record_tag: the local name of the record elements to yield.
+    :param ns_uri: only yield records within this namespace URI.
+        If *None* records in any namespace are yielded.
+    :type ns_uri: string or None
+    :param poll_interval: the number of seconds to wait before checking for
+        new data when none is available.
+    :type poll_interval: int or float
+    :param idle_timeout: stop following once no new data has been written
+        for this many seconds. If *None* follow the log forever.
+    :type idle_timeout: int, float or None
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from each yielded record.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the log and to interact with the resulting nodes.
+        If None, :attr:`xml4h.best_adapter` will be used.
+    :type adapter: adapter class or None
+
+    :return: a generator of :class:`xml4h.nodes.Element` nodes.
+
+    :raise: :class:`~xml4h.exceptions.FeatureUnavailableException` if the
+        adapter does not support iterative parsing.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    if not adapter.has_feature('iterparse'):
+        raise xml4h.exceptions.FeatureUnavailableException('iterparse')
+    return _follow(_FollowedFile(path, poll_interval, idle_timeout),
+        record_tag, ns_uri, ignore_whitespace_text_nodes, adapter)
+
+
+def _follow(log_file, record_tag, ns_uri, ignore_whitespace_text_nodes,
+        adapter):
+    try:
+        while True:
+            records = adapter.iterparse(log_file, tag=record_tag,
+                ns_uri=ns_uri,
+                ignore_whitespace_text_nodes=ignore_whitespace_text_nodes)
+            try:
+                for record in records:
+                    yield record
+            except Exception:
+                # A log's root element is usually left open, which the
+                # parser reports as an error once we end its input
+                if not log_file.ended:
+                    raise
+            if log_file.stopped:
+                return
+            log_file.reopen()
+    finally:
+        log_file.close()
+
+
+class _FollowedFile(object):
+    """
+    File-like reader of a growing log file, whose reads wait for data to be
+    appended to the file. Reads return no data, ending the input, once the
+    file is rotated or nothing has been appended for ``idle_timeout``
+    seconds.
+    """
+
+    def __init__(self, path, poll_interval, idle_timeout):
+        self._path = path
+        self._poll_interval = poll_interval
+        self._idle_timeout = idle_timeout
+        self._file = None
+        self._position = 0
+        self.rotated = False
+        self.stopped = False
+
+    @property
+    def ended(self):
+        return self.rotated or self.stopped
+
+    def read(self, size=-1):
+        if self.ended:
+            return b''
+        idle_since = _clock()
+        while True:
+            if self._file is None:
+                try:
+                    self._file = open(self._path, 'rb')
+                except (IOError, OSError):
+                    pass  # Not created yet
+            if self._file is not None:
+                data = self._file.read(size)
+                if data:
+                    self._position += len(data)
+                    return data
+                if self._is_rotated():
+                    self.rotated = True
+                    return b''
+            if (self._idle_timeout is not None
+                    and _clock() - idle_since >= self._idle_timeout):
+                self.stopped = True
+                return b''
+            time.sleep(self._poll_interval)
+
+    def _is_rotated(self):
+        """
+        Return True if the file at our path is no longer the file we are
+        reading, or has been truncated to less than we have read.
+        """
+        try:
+            path_stat = os.stat(self._path)
+        except (IOError, OSError):
+            # The log has been moved away, and a new one not yet created
+            return False
+        file_stat = os.fstat(self._file.fileno())
+        return ((path_stat.st_ino, path_stat.st_dev)
+                != (file_stat.st_ino, file_stat.st_dev)
+                or path_stat.st_size < self._position)
+
+    def reopen(self):
+        """
+        Start reading the file now at our path from its beginning.
+        """
+        self.close()
+        self._position = 0
+        self.rotated = False
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -11,7 +11,8 @@ from xml4h import exceptions
 
 
 def write_node(node, writer, encoding='utf-8', indent=0, newline='',
-        omit_declaration=False, node_depth=0, quote_char='"'):
+        omit_declaration=False, node_depth=0, quote_char='"',
+        preserve_attribute_order=False):
     """
     Serialize an *xml4h* DOM node and its descendants to text, writing
     the output to the given *writer*.
@@ -48,6 +49,11 @@ def write_node(node, writer, encoding='utf-8', indent=0, newline='',
         has no effect unless indentation is applied.
     :param string quote_char: the character that delimits quoted content.
         You should never need to mess with this.
+    :param bool preserve_attribute_order: if *True* each element's
+        attributes are written in the order they are stored by the
+        underlying XML implementation, which is usually the order they were
+        parsed or added in, without being sorted. Otherwise attributes are
+        written sorted by name.
     """
     def _sanitize_write_value(value):
         """Return XML-encoded value."""
@@ -60,10 +66,10 @@ def write_node(node, writer, encoding='utf-8', indent=0, newline='',
             .replace(">", "&gt;")
             )
 
-    def _write_node_impl(node, node_depth):
+    def _write_node_start(node, node_depth, children):
         """
-        Internal write implementation that does the real work while keeping
-        track of node depth.
+        Write the given node's content up to the point where any child
+        nodes are written, at the given node depth.
         """
         # Output document declaration if we're outputting the whole doc
         if node.is_document:
@@ -74,22 +80,14 @@ def write_node(node, writer, encoding='utf-8', indent=0, newline='',
                     writer.write(' encoding=%s%s%s'
                         % (quote_char, encoding, quote_char))
                 writer.write('?>%s' % newline)
-            for child in node.children:
-                _write_node_impl(child,
-                    node_depth)  # node_depth not incremented
-            writer.write(newline)
         elif node.is_document_type:
             writer.write("<!DOCTYPE %s SYSTEM %s%s%s"
                 % (node.name, quote_char, node.public_id))
             if node.system_id is not None:
                 writer.write(
                     " %s%s%s" % (quote_char, node.system_id, quote_char))
-            if node.children:
+            if children:
                 writer.write("[")
-                for child in node.children:
-                    _write_node_impl(child, node_depth + 1)
-                writer.write("]")
-            writer.write(">")
         elif node.is_text:
             writer.write(
                 _sanitize_write_value(node.value)
@@ -142,26 +140,80 @@ def write_node(node, writer, encoding='utf-8', indent=0, newline='',
             writer.write(indent * node_depth)
             writer.write("<" + node.name)
 
-            for attr in node.attribute_nodes:
-                _write_node_impl(attr, node_depth)
-            if node.children:
-                found_indented_child = False
+            _write_attributes(node)
+            if children:
                 writer.write(">")
-                for child in node.children:
-                    _write_node_impl(child, node_depth + 1)
-                    if not (child.is_text
-                            or child.is_comment
-                            or child.is_cdata):
-                        found_indented_child = True
-                if found_indented_child:
-                    writer.write(newline + indent * node_depth)
-                writer.write('</%s>' % node.name)
             else:
                 writer.write('/>')
         else:
             raise exceptions.Xml4hImplementationBug(
                 'Cannot write node with class: %s' % node.__class__)
 
+    def _write_attributes(element):
+        """
+        Write the given element's attributes, sorted by name unless the
+        attributes' native order is preserved.
+        """
+        if not preserve_attribute_order:
+            for attr in element.attribute_nodes:
+                _write_node_start(attr, None, None)
+            return
+        # Write the underlying attributes directly, without wrapping each
+        # in an attribute node
+        adapter = element.adapter
+        get_name = adapter.get_node_name
+        get_value = adapter.get_node_value
+        for impl_attr in adapter.iter_node_attributes(element.impl_node):
+            writer.write(" %s=%s" % (get_name(impl_attr), quote_char))
+            writer.write(_sanitize_write_value(get_value(impl_attr)))
+            writer.write(quote_char)
+
+    def _write_node_end(node, node_depth, children):
+        """
+        Write the given node's content that follows any child nodes, at the
+        given node depth.
+        """
+        if node.is_document:
+            writer.write(newline)
+        elif node.is_document_type:
+            if children:
+                writer.write("]")
+            writer.write(">")
+        elif node.is_element and children:
+            found_indented_child = False
+            for child in children:
+                if not (child.is_text
+                        or child.is_comment
+                        or child.is_cdata):
+                    found_indented_child = True
+                    break
+            if found_indented_child:
+                writer.write(newline + indent * node_depth)
+            writer.write('</%s>' % node.name)
+
+    def _write_node_impl(node, node_depth):
+        """
+        Internal write implementation that does the real work while keeping
+        track of node depth, walking descendants without recursion so
+        documents of any depth can be written.
+        """
+        # Stack of depths, where the last item is the depth of the node
+        # currently being walked
+        depths = [node_depth]
+        for event, n, children in node._walk():
+            if event == 'start':
+                _write_node_start(n, depths[-1], children)
+                if children:
+                    # Document children are not indented
+                    if n.is_document:
+                        depths.append(depths[-1])
+                    else:
+                        depths.append(depths[-1] + 1)
+            else:
+                if children:
+                    depths.pop()
+                _write_node_end(n, depths[-1], children)
+
     # Sanitize whitespace parameters
     if indent is True:
         indent = ' ' * 4